@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Band plan benchmark.
+
+Times wfdlogger's BandPlan against the if-chain it replaced, for
+frequencies in band and anywhere from DC to 500 mhz. That they give the
+same answers is checked by tests/test_bandplan.py.
+
+    python3 testing/bandplan_benchmark.py --count 1000000
+"""
+
+# pylint: disable=invalid-name, wrong-import-position
+
+import argparse
+import os
+import random
+import sys
+import time
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from legacy_bandplan import legacy_getband, plan_getband
+from wfdlogger.lib.bandplan import PACKAGED_PLAN, BandPlan
+
+parser = argparse.ArgumentParser(description="Time the band plan.")
+parser.add_argument(
+    "-n", "--count", type=int, default=200000, help="Random frequencies to try"
+)
+parser.add_argument(
+    "-p", "--plan", default=PACKAGED_PLAN, help="Band plan file to time"
+)
+parser.add_argument("-s", "--seed", type=int, default=0, help="Random seed")
+
+
+def timed(function, frequencies: list) -> float:
+    """Nanoseconds per call."""
+    begin = time.perf_counter()
+    for frequency in frequencies:
+        function(frequency)
+    return (time.perf_counter() - begin) / len(frequencies) * 1e9
+
+
+def main(args) -> None:
+    """Time the plan against the old chain."""
+    random.seed(args.seed)
+    plan = BandPlan(args.plan)
+    print(f"{plan.name or args.plan}: {len(plan.bands)} bands")
+    in_band = [
+        random.randrange(lower + 1, upper) for lower, upper, _ in plan.edges
+    ] * max(1, args.count // len(plan.bands) // 2)
+    anywhere = [random.randrange(0, 500000000) for _ in range(args.count // 2)]
+    for name, frequencies in (("in band", in_band), ("anywhere", anywhere)):
+        strings = [str(frequency) for frequency in frequencies]
+        print(
+            f"  {name:<8} ns per lookup: "
+            f"if-chain {timed(legacy_getband, strings):7.1f} "
+            f"band plan {timed(partial(plan_getband, plan), strings):7.1f} "
+            f"segment {timed(plan.segment, frequencies):7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main(parser.parse_args())
@@ -0,0 +1,11 @@
+"""
+Statistics shared by the load generator and the benchmarks in testing/.
+"""
+
+
+def percentile(data: list, pct: float) -> float:
+    """Nearest rank percentile of a sorted list."""
+    if not data:
+        return 0.0
+    rank = max(0, min(len(data) - 1, int(round(pct / 100 * len(data))) - 1))
+    return data[rank]
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+CAT latency benchmark.
+
+Drives wfdlogger's CAT class against the simulators in rig_simulators.py
+and reports round trip percentiles for get_vfo, get_mode, get_ptt and
+set_vfo, how many calls came back wrong or raised, and how long it took to
+get going again after the simulator hung up. Run before and after a CAT
+change to see if it got slower:
+
+    python3 testing/cat_benchmark.py --count 500 --latency 5 --disconnect 0.01
+"""
+
+# pylint: disable=invalid-name, wrong-import-position
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchstats import percentile
+from rig_simulators import (
+    FlrigSimulator,
+    RigctldSimulator,
+    add_fault_arguments,
+    faults_from,
+)
+from wfdlogger.lib.cat_interface import CAT
+
+parser = argparse.ArgumentParser(description="Benchmark CAT against simulated rigs.")
+parser.add_argument(
+    "-i",
+    "--interface",
+    choices=("rigctld", "flrig", "both"),
+    default="both",
+    help="Which interface to benchmark",
+)
+parser.add_argument(
+    "-n", "--count", type=int, default=200, help="Calls of each method per run"
+)
+add_fault_arguments(parser)
+
+
+class Results:
+    """Timings and failures of one method."""
+
+    def __init__(self) -> None:
+        self.times = []
+        self.wrong = 0
+        self.raised = 0
+
+    def line(self, name: str) -> str:
+        """One line of the report."""
+        times = sorted(self.times)
+        if not times:
+            return f"  {name:<8} no successful calls, {self.raised} raised"
+        return (
+            f"  {name:<8} ms: "
+            f"p50 {percentile(times, 50) * 1000:7.2f} "
+            f"p90 {percentile(times, 90) * 1000:7.2f} "
+            f"p99 {percentile(times, 99) * 1000:7.2f} "
+            f"max {times[-1] * 1000:7.2f} "
+            f"mean {statistics.mean(times) * 1000:7.2f}  "
+            f"wrong {self.wrong} raised {self.raised}"
+        )
+
+
+def expected(rig, method: str):
+    """What a method should return for the simulated rig."""
+    return {
+        "get_vfo": str(rig.freq),
+        "get_mode": rig.mode,
+        "get_ptt": str(rig.ptt),
+    }.get(method)
+
+
+def benchmark(interface: str, simulator, count: int) -> None:
+    """Run every method 'count' times through a CAT and print the results."""
+    rig = simulator.rig
+    cat = CAT(interface, "127.0.0.1", simulator.port)
+    results = {
+        name: Results() for name in ("get_vfo", "get_mode", "get_ptt", "set_vfo")
+    }
+    reconnects = []
+    down_since = None
+    freqs = (14025000, 7030000, 3530000)
+    start = time.monotonic()
+    for number in range(count):
+        for name, result in results.items():
+            if not cat.online:
+                down_since = down_since or time.perf_counter()
+                cat = CAT(interface, "127.0.0.1", simulator.port)
+                if not cat.online:
+                    result.raised += 1
+                    continue
+            begin = time.perf_counter()
+            try:
+                if name == "set_vfo":
+                    freq = freqs[number % len(freqs)]
+                    answer = cat.set_vfo(str(freq))
+                else:
+                    answer = getattr(cat, name)()
+            except Exception:  # pylint: disable=broad-except
+                down_since = down_since or begin
+                cat.online = False
+                result.raised += 1
+                continue
+            end = time.perf_counter()
+            if name == "set_vfo":
+                good = answer is not False and rig.freq == freq
+            else:
+                good = str(answer) == expected(rig, name)
+            if not good:
+                result.wrong += 1
+                down_since = down_since or begin
+                continue
+            result.times.append(end - begin)
+            if down_since is not None:
+                reconnects.append(end - down_since)
+                down_since = None
+    elapsed = time.monotonic() - start
+    faults = simulator.faults
+    print(
+        f"\n{interface}: {count} rounds in {elapsed:.2f}s, "
+        f"{faults.commands} commands, {faults.disconnects} hang ups"
+    )
+    for name, result in results.items():
+        print(result.line(name))
+    if reconnects:
+        reconnects.sort()
+        print(
+            f"  recovery ms: {len(reconnects)} times, "
+            f"p50 {percentile(reconnects, 50) * 1000:.2f} "
+            f"max {reconnects[-1] * 1000:.2f}"
+        )
+
+
+def main(args) -> None:
+    """Benchmark the interfaces asked for."""
+    interfaces = ("rigctld", "flrig") if args.interface == "both" else (args.interface,)
+    print(
+        f"latency {args.latency}ms jitter {args.jitter}ms split {args.split} "
+        f"disconnect {args.disconnect}"
+    )
+    for interface in interfaces:
+        simulator_class = RigctldSimulator if interface == "rigctld" else FlrigSimulator
+        simulator = simulator_class(faults=faults_from(args)).start()
+        try:
+            benchmark(interface, simulator, args.count)
+        finally:
+            simulator.shutdown()
+            simulator.server_close()
+
+
+if __name__ == "__main__":
+    main(parser.parse_args())
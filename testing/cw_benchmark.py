@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+CW sending benchmark.
+
+Plays a burst of F-key presses into wfdlogger's CW class, against the
+stand-in keyers in cw_standins.py, and reports how long each press held up
+the caller, how long texts took to reach the keyer, how deep the send queue
+got and how far keying fell behind. Then checks that a speed change and an
+abort jump the queue. Run it against a slow XML-RPC keyer to see the GUI
+side stay quick:
+
+    python3 testing/cw_benchmark.py --keyer winkeyer --latency 200 --presses 20
+"""
+
+# pylint: disable=invalid-name, wrong-import-position
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchstats import percentile
+from cw_standins import CwdaemonStandin, WinkeyerStandin, keying_time
+from wfdlogger.lib.cwinterface import CW
+
+parser = argparse.ArgumentParser(description="Benchmark CW against stand-in keyers.")
+parser.add_argument(
+    "-k",
+    "--keyer",
+    choices=("cwdaemon", "winkeyer", "both"),
+    default="both",
+    help="Which keyer to benchmark",
+)
+parser.add_argument(
+    "-n", "--presses", type=int, default=12, help="F-key presses in the burst"
+)
+parser.add_argument(
+    "-g", "--gap", type=float, default=50.0, help="Milliseconds between presses"
+)
+parser.add_argument("--wpm", type=int, default=30, help="Keying speed")
+parser.add_argument(
+    "--latency", type=float, default=0.0, help="XML-RPC keyer answer delay, ms"
+)
+
+MACROS = (
+    "CQ WFD K6GTE K6GTE WFD",
+    "W1AW",
+    "W1AW 1O ORG",
+    "TU K6GTE WFD",
+    "AGN",
+    "RR",
+)
+
+
+def summary(times: list) -> str:
+    """Percentiles of a list of seconds, in milliseconds."""
+    times = sorted(times)
+    if not times:
+        return "none"
+    return (
+        f"p50 {percentile(times, 50) * 1000:8.2f} "
+        f"p90 {percentile(times, 90) * 1000:8.2f} "
+        f"p99 {percentile(times, 99) * 1000:8.2f} "
+        f"max {times[-1] * 1000:8.2f} "
+        f"mean {statistics.mean(times) * 1000:8.2f}"
+    )
+
+
+def wait_for(condition, timeout: float) -> bool:
+    """Poll until condition() is true, False if it never was."""
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return condition()
+
+
+def burst(name: str, cw: CW, keyer, args) -> None:
+    """Press F-keys as fast as an operator might, then see what happened."""
+    blocked = []
+    pressed = []
+    for number in range(args.presses):
+        text = MACROS[number % len(MACROS)]
+        pressed.append(time.monotonic())
+        begin = time.perf_counter()
+        cw.sendcw(text)
+        blocked.append(time.perf_counter() - begin)
+        time.sleep(args.gap / 1000)
+    last_press = time.monotonic()
+    timeout = 5 + args.presses * (args.latency / 1000 + 0.1)
+    arrived = wait_for(lambda: len(keyer.received) >= args.presses, timeout)
+    delivered = [
+        received - sent for sent, (received, _) in zip(pressed, keyer.received)
+    ]
+    metrics = cw.metrics()
+    print(f"\n{name}: {args.presses} presses {args.gap:.0f}ms apart at {args.wpm}wpm")
+    print(f"  sendcw() blocked ms: {summary(blocked)}")
+    print(f"  reached keyer ms:    {summary(delivered)}")
+    print(
+        f"  queue: max depth {metrics['max_depth']}, sent {metrics['sent']}, "
+        f"failed {metrics['failed']}, average latency "
+        f"{metrics['average_latency'] * 1000:.2f}ms"
+        + ("" if arrived else f", only {len(keyer.received)} arrived")
+    )
+    finish = 0.0
+    for received, text in keyer.received[-args.presses :]:
+        finish = max(finish, received) + keying_time(text, args.wpm)
+    if finish:
+        print(f"  keying finishes {finish - last_press:.2f}s after the last press")
+
+
+def jump(cw: CW, keyer, args) -> None:
+    """A speed change and an abort behind a full queue."""
+    for number in range(args.presses):
+        cw.sendcw(MACROS[number % len(MACROS)])
+    if cw.servertype == 1:
+        commands = len(keyer.commands)
+        begin = time.monotonic()
+        cw.set_speed(args.wpm + 5)
+        if wait_for(lambda: len(keyer.commands) > commands, 2):
+            print(
+                f"  speed change reached keyer in "
+                f"{(keyer.commands[-1][0] - begin) * 1000:.2f}ms"
+            )
+    before = cw.metrics()["aborted"]
+    stopped = keyer.aborted
+    begin = time.perf_counter()
+    cw.abort()
+    took = time.perf_counter() - begin
+    report = (
+        f"  abort() took {took * 1000:.2f}ms, "
+        f"dropped {cw.metrics()['aborted'] - before} queued"
+    )
+    if cw.servertype == 1:
+        wait_for(lambda: keyer.commands and keyer.commands[-1][1] == "stop", 2)
+        report += f", keyer threw away {keyer.aborted - stopped}"
+    print(report)
+
+
+def main(args) -> None:
+    """Benchmark the keyers asked for."""
+    keyers = ("cwdaemon", "winkeyer") if args.keyer == "both" else (args.keyer,)
+    for name in keyers:
+        if name == "cwdaemon":
+            standin = CwdaemonStandin(wpm=args.wpm).start()
+            cw = CW(1, "127.0.0.1", standin.port)
+        else:
+            standin = WinkeyerStandin(wpm=args.wpm, latency=args.latency / 1000).start()
+            cw = CW(2, "127.0.0.1", standin.port)
+        try:
+            burst(name, cw, standin.keyer, args)
+            jump(cw, standin.keyer, args)
+        finally:
+            cw.stop()
+            standin.shutdown()
+            standin.server_close()
+
+
+if __name__ == "__main__":
+    main(parser.parse_args())
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Stand-in keyers for testing CW sending without hardware.
+
+CwdaemonStandin listens on UDP like cwdaemon, WinkeyerStandin serves
+k1elsendstring over XML-RPC like PyWinkeyerSerial. Both note when each text
+arrived, then "key" it, taking as long as it would take to send at the
+current speed, and note when it finished. The cwdaemon one also does the
+escapes the logger sends, ESC 4 to stop and ESC 2 nn to change speed.
+The XML-RPC one can be made slow to answer, like a keyer on a busy host.
+
+Run on its own to watch what the logger sends:
+
+    python3 testing/cw_standins.py cwdaemon --port 6789
+"""
+
+# pylint: disable=invalid-name
+
+import argparse
+import queue
+import socketserver
+import threading
+import time
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+# The dots and dashes of each character.
+MORSE = {
+    "A": ".-",
+    "B": "-...",
+    "C": "-.-.",
+    "D": "-..",
+    "E": ".",
+    "F": "..-.",
+    "G": "--.",
+    "H": "....",
+    "I": "..",
+    "J": ".---",
+    "K": "-.-",
+    "L": ".-..",
+    "M": "--",
+    "N": "-.",
+    "O": "---",
+    "P": ".--.",
+    "Q": "--.-",
+    "R": ".-.",
+    "S": "...",
+    "T": "-",
+    "U": "..-",
+    "V": "...-",
+    "W": ".--",
+    "X": "-..-",
+    "Y": "-.--",
+    "Z": "--..",
+    "0": "-----",
+    "1": ".----",
+    "2": "..---",
+    "3": "...--",
+    "4": "....-",
+    "5": ".....",
+    "6": "-....",
+    "7": "--...",
+    "8": "---..",
+    "9": "----.",
+    "/": "-..-.",
+    "?": "..--..",
+    ".": ".-.-.-",
+    ",": "--..--",
+    "=": "-...-",
+}
+
+
+def units(text: str) -> int:
+    """
+    How many dot lengths a text takes to send. A dot is 1, a dash 3, with 1
+    between elements, 3 between characters and 7 between words.
+    """
+    total = 0
+    for word in text.upper().split():
+        if total:
+            total += 7
+        for char in word:
+            elements = MORSE.get(char, "")
+            total += sum(1 if element == "." else 3 for element in elements)
+            total += len(elements) - 1 if elements else 0
+            total += 3
+        total -= 3
+    return max(total, 0)
+
+
+def keying_time(text: str, wpm: int) -> float:
+    """Seconds to send a text, PARIS timing, a dot is 1.2 / wpm seconds."""
+    return units(text) * 1.2 / max(wpm, 1)
+
+
+class Keyer:
+    """
+    Sends texts one after the other at 'wpm', in its own thread.
+
+    received, (time, text) of everything that came in.
+    keyed, (started, finished, text) of everything sent in full.
+    aborted, texts stopped part way or thrown away by stop().
+    """
+
+    def __init__(self, wpm: int = 20) -> None:
+        self.wpm = wpm
+        self.received = []
+        self.keyed = []
+        self.aborted = 0
+        self.commands = []
+        self._queue = queue.Queue()
+        self._abort = threading.Event()
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def send(self, text: str) -> None:
+        """Queue a text to key."""
+        with self._lock:
+            self.received.append((time.monotonic(), text))
+        self._queue.put(text)
+
+    def stop(self) -> None:
+        """Stop sending and throw away anything waiting."""
+        with self._lock:
+            self.commands.append((time.monotonic(), "stop"))
+        self._abort.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+            self.aborted += 1
+
+    def set_speed(self, wpm: int) -> None:
+        """Change speed, from the next text on."""
+        with self._lock:
+            self.commands.append((time.monotonic(), f"speed {wpm}"))
+        self.wpm = wpm
+
+    def idle(self) -> bool:
+        """True once everything received has been keyed or aborted."""
+        return self._queue.unfinished_tasks == 0
+
+    def _run(self) -> None:
+        """The keying thread."""
+        while True:
+            text = self._queue.get()
+            self._abort.clear()
+            started = time.monotonic()
+            if self._abort.wait(keying_time(text, self.wpm)):
+                self.aborted += 1
+            else:
+                with self._lock:
+                    self.keyed.append((started, time.monotonic(), text))
+            self._queue.task_done()
+
+
+class _CwdaemonHandler(socketserver.BaseRequestHandler):
+    """One cwdaemon datagram."""
+
+    def handle(self):
+        text = self.request[0].decode(errors="replace")
+        keyer = self.server.keyer
+        if text.startswith("\x1b"):
+            if text[1:2] == "4":
+                keyer.stop()
+            elif text[1:2] == "2":
+                try:
+                    keyer.set_speed(int(text[2:]))
+                except ValueError:
+                    pass
+            return
+        keyer.send(text)
+
+
+class CwdaemonStandin(socketserver.UDPServer):
+    """A cwdaemon on host:port, port 0 to pick a free one."""
+
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, wpm=20) -> None:
+        self.keyer = Keyer(wpm)
+        super().__init__((host, port), _CwdaemonHandler)
+
+    @property
+    def port(self) -> int:
+        """The port it's listening on."""
+        return self.server_address[1]
+
+    def start(self) -> "CwdaemonStandin":
+        """Serve in a background thread."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _QuietHandler(SimpleXMLRPCRequestHandler):
+    """Keep-alive, and no request log."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+class WinkeyerStandin(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+    """
+    A PyWinkeyerSerial XML-RPC server on host:port, port 0 to pick a free
+    one. 'latency' seconds pass before each call is answered.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, wpm=20, latency=0.0) -> None:
+        self.keyer = Keyer(wpm)
+        self.latency = latency
+        super().__init__((host, port), requestHandler=_QuietHandler, logRequests=False)
+
+        def k1elsendstring(text):
+            if self.latency:
+                time.sleep(self.latency)
+            self.keyer.send(text)
+            return 0
+
+        self.register_function(k1elsendstring)
+
+    @property
+    def port(self) -> int:
+        """The port it's listening on."""
+        return self.server_address[1]
+
+    def start(self) -> "WinkeyerStandin":
+        """Serve in a background thread."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def main() -> None:
+    """Run a stand-in until interrupted, printing what it's sent."""
+    parser = argparse.ArgumentParser(description="Stand-in CW keyer.")
+    parser.add_argument("keyer", choices=("cwdaemon", "winkeyer"))
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=None, help="Port to listen on")
+    parser.add_argument("--wpm", type=int, default=20, help="Starting speed")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="XML-RPC answer delay, ms"
+    )
+    args = parser.parse_args()
+    if args.keyer == "cwdaemon":
+        standin = CwdaemonStandin(args.host, args.port or 6789, args.wpm)
+    else:
+        standin = WinkeyerStandin(
+            args.host, args.port or 8000, args.wpm, args.latency / 1000
+        )
+    standin.start()
+    print(f"{args.keyer} stand-in on {args.host}:{standin.port}")
+    shown = 0
+    try:
+        while True:
+            time.sleep(0.1)
+            keyed = standin.keyer.keyed
+            for started, finished, text in keyed[shown:]:
+                print(f"{finished - started:6.2f}s {standin.keyer.wpm}wpm {text}")
+            shown = len(keyed)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin.shutdown()
+        standin.server_close()
+
+
+if __name__ == "__main__":
+    main()
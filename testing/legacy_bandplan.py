@@ -0,0 +1,81 @@
+"""
+The band lookups wfdlogger had before its band plan, kept so the plan can be
+checked and timed against them: MainWindow's getband if-chain, its fakefreq
+table and its rig mode mapping. Used by tests/test_bandplan.py and
+testing/bandplan_benchmark.py.
+"""
+
+from wfdlogger.lib.bandplan import BandPlan
+
+
+def legacy_getband(freq: str) -> str:
+    """MainWindow.getband as it was."""
+    if freq.isnumeric():
+        frequency = int(float(freq))
+        if 2000000 > frequency > 1800000:
+            return "160"
+        if 4000000 > frequency > 3500000:
+            return "80"
+        if 5406000 > frequency > 5330000:
+            return "60"
+        if 7300000 > frequency > 7000000:
+            return "40"
+        if 10150000 > frequency > 10100000:
+            return "30"
+        if 14350000 > frequency > 14000000:
+            return "20"
+        if 18168000 > frequency > 18068000:
+            return "17"
+        if 21450000 > frequency > 21000000:
+            return "15"
+        if 24990000 > frequency > 24890000:
+            return "12"
+        if 29700000 > frequency > 28000000:
+            return "10"
+        if 54000000 > frequency > 50000000:
+            return "6"
+        if 148000000 > frequency > 144000000:
+            return "2"
+        if 225000000 > frequency > 222000000:
+            return "222"
+        if 450000000 > frequency > 420000000:
+            return "432"
+    else:
+        return "0"
+    return None
+
+
+LEGACY_FAKEFREQS = {
+    "160": ["1830", "1805", "1840"],
+    "80": ["3530", "3559", "3970"],
+    "60": ["5332", "5373", "5405"],
+    "40": ["7030", "7040", "7250"],
+    "30": ["10130", "10130", "0000"],
+    "20": ["14030", "14070", "14250"],
+    "17": ["18080", "18100", "18150"],
+    "15": ["21065", "21070", "21200"],
+    "12": ["24911", "24920", "24970"],
+    "10": ["28065", "28070", "28400"],
+    "6": ["50030", "50300", "50125"],
+    "2": ["144030", "144144", "144250"],
+    "222": ["222100", "222070", "222100"],
+    "432": ["432070", "432200", "432100"],
+    "SAT": ["144144", "144144", "144144"],
+}
+LEGACY_MODES = {"CW": 0, "DG": 1, "PH": 2, "FT8": 1, "SSB": 2}
+
+
+def legacy_getmode(rigmode: str) -> str:
+    """MainWindow.getmode as it was."""
+    if rigmode in ("CW", "CWR"):
+        return "CW"
+    if rigmode in ("USB", "LSB", "FM", "AM"):
+        return "PH"
+    return "DG"
+
+
+def plan_getband(plan: BandPlan, freq: str) -> str:
+    """MainWindow.getband as it is now."""
+    if freq.isnumeric():
+        return plan.band(int(freq))
+    return "0"
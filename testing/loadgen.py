@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Multi-station load generator for the group multicast protocol.
+
+Drives many simulated Field Day participants from a single asyncio process,
+like running simulant.py a few hundred times without the few hundred
+processes. Each station PINGs, logs contacts, and chats at the rates given,
+and the server RESPONSE packets are used to measure the end-to-end
+acknowledgement latency of every POST. Like the logger, each POST carries
+an expire time, and ones not acknowledged by then are sent again with the
+next PING, so injected loss exercises the server's resend handling.
+"""
+
+# pylint: disable=invalid-name
+
+import argparse
+import asyncio
+import random
+import socket
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+from json import dumps, loads, JSONDecodeError
+
+from benchstats import percentile
+
+parser = argparse.ArgumentParser(
+    description="Simulate a club full of Field Day participants."
+)
+parser.add_argument(
+    "-n", "--stations", type=int, default=40, help="Number of simulated stations"
+)
+parser.add_argument(
+    "-r",
+    "--rate",
+    type=float,
+    default=2.0,
+    help="Contacts logged per station per minute",
+)
+parser.add_argument(
+    "--ping", type=float, default=15.0, help="Seconds between PINGs per station"
+)
+parser.add_argument(
+    "--chat", type=float, default=0.2, help="Chat messages per station per minute"
+)
+parser.add_argument(
+    "--expire",
+    type=float,
+    default=30.0,
+    help="Seconds to wait for a POST to be acknowledged before sending it again",
+)
+parser.add_argument(
+    "-l",
+    "--loss",
+    type=float,
+    default=0.0,
+    help="Fraction of outgoing packets to drop, 0.0 - 1.0",
+)
+parser.add_argument(
+    "-d", "--duration", type=float, default=300.0, help="Seconds to run for"
+)
+parser.add_argument("--group", type=str, default="224.1.1.1", help="Multicast group")
+parser.add_argument("--port", type=int, default=2239, help="Multicast port")
+parser.add_argument("--interface", type=str, default="0.0.0.0", help="Interface IP")
+
+BANDS = ("160", "80", "40", "20", "15", "10", "6", "2")
+# In the order of the FAKEFREQS columns.
+MODES = ("CW", "DG", "PH")
+FAKEFREQS = {
+    "160": ["1830", "1805", "1840"],
+    "80": ["3530", "3559", "3970"],
+    "40": ["7030", "7040", "7250"],
+    "20": ["14030", "14070", "14250"],
+    "15": ["21065", "21070", "21200"],
+    "10": ["28065", "28070", "28400"],
+    "6": ["50030", "50300", "50125"],
+    "2": ["144030", "144144", "144250"],
+}
+CHATTER = (
+    "What are the @stats?",
+    "Jim, go to 40",
+    "Who made that 'Chili'... Gawd aweful!",
+    "Why's no one covering 160?",
+    "Yes Jim, you have to DISCONNECT the dummy load.",
+)
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+SECTIONS = "ORG LAX SDG SB SCV EB SF PAC SJV SV EMA WMA CT RI NH VT ME".split()
+
+
+def generate_callsign() -> str:
+    """Generates a plausible US callsign."""
+    callsign = random.choice("KNW")
+    if random.randint(0, 2) == 0:
+        callsign += random.choice(LETTERS)
+    callsign += str(random.randint(0, 9))
+    for _ in range(random.choice((1, 2, 2, 3, 3, 3))):
+        callsign += random.choice(LETTERS)
+    return callsign
+
+
+def unique_callsigns(count: int) -> list:
+    """count different callsigns."""
+    callsigns = set()
+    while len(callsigns) < count:
+        callsigns.add(generate_callsign())
+    return list(callsigns)
+
+
+def generate_class() -> str:
+    """Generates a valid Field Day class"""
+    return str(random.randint(1, 20)) + random.choice("IOHM")
+
+
+class Stats:
+    """Counters shared by all the simulated stations."""
+
+    def __init__(self) -> None:
+        self.sent = {}
+        self.dropped = 0
+        self.received = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.undecodable = 0
+        self.retransmitted = 0
+        self.pending = {}
+        self.latencies = []
+
+    def count_sent(self, cmd: str, size: int) -> None:
+        """Tally a packet put on the wire."""
+        self.sent[cmd] = self.sent.get(cmd, 0) + 1
+        self.bytes_sent += size
+
+    def report(self, elapsed: float) -> None:
+        """Print a summary of the run."""
+        latencies = sorted(self.latencies)
+        total_sent = sum(self.sent.values())
+        print(f"\nRan for {elapsed:.1f}s")
+        for cmd, count in sorted(self.sent.items()):
+            print(f"  sent {cmd:<10} {count}")
+        print(f"  dropped (injected loss) {self.dropped}")
+        print(
+            f"  throughput out: {total_sent / elapsed:.1f} pkt/s "
+            f"{self.bytes_sent / elapsed / 1024:.1f} KiB/s"
+        )
+        print(
+            f"  throughput in:  {self.received / elapsed:.1f} pkt/s "
+            f"{self.bytes_received / elapsed / 1024:.1f} KiB/s"
+        )
+        print(f"  undecodable packets: {self.undecodable}")
+        print(
+            f"  POSTs acknowledged: {len(latencies)}, "
+            f"unacknowledged: {len(self.pending)}, sent again: {self.retransmitted}"
+        )
+        if latencies:
+            print(
+                "  ack latency ms: "
+                f"min {latencies[0] * 1000:.1f} "
+                f"p50 {percentile(latencies, 50) * 1000:.1f} "
+                f"p90 {percentile(latencies, 90) * 1000:.1f} "
+                f"p99 {percentile(latencies, 99) * 1000:.1f} "
+                f"max {latencies[-1] * 1000:.1f} "
+                f"mean {statistics.mean(latencies) * 1000:.1f}"
+            )
+
+
+class GroupProtocol(asyncio.DatagramProtocol):
+    """
+    Receives everything on the multicast group and matches acknowledgements.
+    A POST's latency runs from when it was first sent, resends included.
+    """
+
+    def __init__(self, stats: Stats, stations: dict) -> None:
+        self.stats = stats
+        self.stations = stations
+
+    def datagram_received(self, data, addr):
+        self.stats.received += 1
+        self.stats.bytes_received += len(data)
+        try:
+            json_data = loads(data.decode())
+        except (UnicodeDecodeError, JSONDecodeError):
+            self.stats.undecodable += 1
+            return
+        if json_data.get("cmd") != "RESPONSE":
+            return
+        station = self.stations.get(json_data.get("recipient"))
+        if station is None:
+            return
+        if json_data.get("subject") == "HOSTINFO":
+            station.groupcall = json_data.get("groupcall")
+            return
+        if json_data.get("subject") == "POST":
+            station.unacknowledged.pop(json_data.get("unique_id"), None)
+        sent_at = self.stats.pending.pop(
+            (json_data.get("unique_id"), json_data.get("subject")), None
+        )
+        if sent_at is not None:
+            self.stats.latencies.append(time.monotonic() - sent_at)
+
+
+class Station:
+    """One simulated operating position."""
+
+    def __init__(self, sock, args, stats: Stats, call: str) -> None:
+        self.sock = sock
+        self.args = args
+        self.stats = stats
+        self.call = call
+        self.band = random.choice(BANDS)
+        self.mode = random.choice(MODES)
+        self.power = random.choice((5, 5, 10, 100))
+        self.groupcall = None
+        self.unacknowledged = {}
+
+    def send(self, packet: dict) -> None:
+        """Send a packet to the group, subject to injected loss."""
+        bytes_to_send = bytes(dumps(packet), encoding="ascii")
+        if random.random() < self.args.loss:
+            self.stats.dropped += 1
+            return
+        try:
+            self.sock.sendto(bytes_to_send, (self.args.group, self.args.port))
+        except OSError as err:
+            print(f"{self.call}: {err}")
+            return
+        self.stats.count_sent(packet.get("cmd"), len(bytes_to_send))
+
+    def send_status(self) -> None:
+        """
+        PING, or ask for the group call if we don't know it yet, then send
+        any POST that has expired again, as the logger does.
+        """
+        if self.groupcall is None:
+            self.send({"cmd": "GROUPQUERY", "station": self.call})
+        self.send(
+            {"cmd": "PING", "mode": self.mode, "band": self.band, "station": self.call}
+        )
+        self.check_for_stale_commands()
+
+    def expire(self) -> str:
+        """When a POST sent now should have been acknowledged by."""
+        return (datetime.now() + timedelta(seconds=self.args.expire)).isoformat()
+
+    def check_for_stale_commands(self) -> None:
+        """Send the POSTs that have expired without an acknowledgement again."""
+        now = datetime.now()
+        for contact in self.unacknowledged.values():
+            if now > datetime.fromisoformat(contact["expire"]):
+                contact["expire"] = self.expire()
+                self.stats.retransmitted += 1
+                self.send(contact)
+
+    def log_contact(self) -> None:
+        """POST a made up contact and remember when it went out."""
+        unique_id = uuid.uuid4().hex
+        hiscall = generate_callsign()
+        freq = FAKEFREQS[self.band][MODES.index(self.mode)]
+        contact = {
+            "cmd": "POST",
+            "hiscall": hiscall,
+            "class": generate_class(),
+            "section": random.choice(SECTIONS),
+            "mode": self.mode,
+            "band": self.band,
+            "frequency": int(freq) * 1000,
+            "date_and_time": datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+            "power": self.power,
+            "grid": "DM13at",
+            "opname": "John Doe",
+            "station": self.call,
+            "unique_id": unique_id,
+            "expire": self.expire(),
+        }
+        self.unacknowledged[unique_id] = contact
+        self.stats.pending[(unique_id, "POST")] = time.monotonic()
+        self.send(contact)
+
+    def send_chat(self) -> None:
+        """Say something in the group chat."""
+        self.send(
+            {"cmd": "CHAT", "sender": self.call, "message": random.choice(CHATTER)}
+        )
+
+    async def run(self) -> None:
+        """Poisson arrivals of contacts and chat, fixed interval PINGs."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        next_ping = now + random.uniform(0, self.args.ping)
+        next_qso = now + self.interval(self.args.rate)
+        next_chat = now + self.interval(self.args.chat)
+        self.send_status()
+        while True:
+            await asyncio.sleep(
+                max(0, min(next_ping, next_qso, next_chat) - loop.time())
+            )
+            now = loop.time()
+            if now >= next_ping:
+                self.send_status()
+                next_ping += self.args.ping
+            if now >= next_qso:
+                self.log_contact()
+                next_qso = now + self.interval(self.args.rate)
+            if now >= next_chat:
+                self.send_chat()
+                next_chat = now + self.interval(self.args.chat)
+
+    @staticmethod
+    def interval(per_minute: float) -> float:
+        """Exponentially distributed gap for a rate given per minute."""
+        if per_minute <= 0:
+            return float("inf")
+        return random.expovariate(per_minute / 60)
+
+
+def multicast_socket(args) -> socket.socket:
+    """Socket joined to the multicast group, same as the logger does it."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+    sock.bind(("", args.port))
+    mreq = socket.inet_aton(args.group) + socket.inet_aton(args.interface)
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, bytes(mreq))
+    sock.setblocking(False)
+    return sock
+
+
+async def main(args) -> None:
+    """Start the listener and all the stations, run for the duration."""
+    loop = asyncio.get_running_loop()
+    stats = Stats()
+    stations = {}
+    send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    send_sock.setblocking(False)
+    for call in unique_callsigns(args.stations):
+        stations[call] = Station(send_sock, args, stats, call)
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: GroupProtocol(stats, stations), sock=multicast_socket(args)
+    )
+    print(
+        f"{len(stations)} stations, {args.rate} QSO/min each, "
+        f"{args.loss * 100:.0f}% loss, for {args.duration:.0f}s"
+    )
+    tasks = [asyncio.create_task(station.run()) for station in stations.values()]
+    start = time.monotonic()
+    try:
+        await asyncio.sleep(args.duration)
+    finally:
+        for task in tasks:
+            task.cancel()
+        transport.close()
+        send_sock.close()
+        stats.report(time.monotonic() - start)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
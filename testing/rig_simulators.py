@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Stand-in radios for testing CAT control without a rig.
+
+RigctldSimulator speaks the rigctld TCP line protocol and FlrigSimulator
+the flrig XML-RPC interface, both to a simulated radio. Either can be told
+to answer slowly (latency plus random jitter), to dribble replies out a few
+bytes at a time (split), or to drop the connection now and then
+(disconnect), which is what rigs on a busy USB hub or flaky network do.
+
+Run on its own to leave one up for the logger to talk to:
+
+    python3 testing/rig_simulators.py rigctld --port 4532 --latency 20
+"""
+
+# pylint: disable=invalid-name
+
+import argparse
+import random
+import socket
+import socketserver
+import threading
+import time
+from xmlrpc.server import SimpleXMLRPCRequestHandler, SimpleXMLRPCServer
+
+
+class Rig:
+    """The simulated radio, shared by every connection."""
+
+    def __init__(self, freq: int = 14025000, mode: str = "CW") -> None:
+        self.lock = threading.Lock()
+        self.freq = freq
+        self.mode = mode
+        self.bandwidth = 500
+        self.ptt = 0
+        self.power = 50
+
+
+class Faults:
+    """
+    How badly a simulator behaves.
+
+    latency, seconds added to every reply.
+    jitter, up to this many more seconds, at random.
+    split, send replies this many bytes at a time, a millisecond apart, 0 for
+    all at once.
+    disconnect, chance, 0.0 - 1.0, of hanging up instead of answering.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        split: int = 0,
+        disconnect: float = 0.0,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.split = split
+        self.disconnect = disconnect
+        self.disconnects = 0
+        self.commands = 0
+
+    def delay(self) -> None:
+        """Wait as long as a reply takes."""
+        wait = self.latency + random.uniform(0, self.jitter)
+        if wait > 0:
+            time.sleep(wait)
+
+    def hang_up(self) -> bool:
+        """True if this command should be answered by hanging up."""
+        self.commands += 1
+        if self.disconnect and random.random() < self.disconnect:
+            self.disconnects += 1
+            return True
+        return False
+
+    def write(self, send, data: bytes) -> None:
+        """Send a reply, in pieces if split is set."""
+        if not self.split:
+            send(data)
+            return
+        for start in range(0, len(data), self.split):
+            send(data[start : start + self.split])
+            time.sleep(0.001)
+
+
+class _RigctldHandler(socketserver.BaseRequestHandler):
+    """One rigctld client connection."""
+
+    def handle(self):
+        rig = self.server.rig
+        faults = self.server.faults
+        buffer = b""
+        while True:
+            try:
+                data = self.request.recv(1024)
+            except OSError:
+                return
+            if not data:
+                return
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                command = line.decode(errors="replace").strip()
+                if not command:
+                    continue
+                if faults.hang_up():
+                    self.request.close()
+                    return
+                faults.delay()
+                try:
+                    faults.write(self.request.sendall, self.reply(rig, command))
+                except OSError:
+                    return
+
+    @staticmethod
+    def reply(rig: Rig, command: str) -> bytes:
+        """The rigctld answer to one command."""
+        words = command.split()
+        with rig.lock:
+            if words[0] == "f":
+                return f"{rig.freq}\n".encode()
+            if words[0] == "m":
+                return f"{rig.mode}\n{rig.bandwidth}\n".encode()
+            if words[0] == "t":
+                return f"{rig.ptt}\n".encode()
+            if words[0] == "l" and words[1:] == ["RFPOWER"]:
+                return f"{rig.power / 100:.6f}\n".encode()
+            try:
+                if words[0] == "F":
+                    rig.freq = int(float(words[1]))
+                    return b"RPRT 0\n"
+                if words[0] == "M":
+                    rig.mode = words[1]
+                    return b"RPRT 0\n"
+                if words[0] == "T":
+                    rig.ptt = int(words[1])
+                    return b"RPRT 0\n"
+                if words[0] == "L" and words[1] == "RFPOWER":
+                    rig.power = int(float(words[2]) * 100)
+                    return b"RPRT 0\n"
+            except (IndexError, ValueError):
+                return b"RPRT -1\n"
+        return b"RPRT -11\n"
+
+
+class RigctldSimulator(socketserver.ThreadingTCPServer):
+    """A rigctld on host:port, port 0 to pick a free one."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, rig=None, faults=None) -> None:
+        self.rig = rig or Rig()
+        self.faults = faults or Faults()
+        super().__init__((host, port), _RigctldHandler)
+
+    @property
+    def port(self) -> int:
+        """The port it's listening on."""
+        return self.server_address[1]
+
+    def start(self) -> "RigctldSimulator":
+        """Serve in a background thread."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _SplitWriter:
+    """Stands in for a handler's wfile, writing a few bytes at a time."""
+
+    def __init__(self, wfile, faults: Faults) -> None:
+        self.wfile = wfile
+        self.faults = faults
+
+    def write(self, data) -> int:
+        """Write it all, in pieces."""
+        self.faults.write(self.wfile.write, bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        """Nothing is buffered."""
+        self.wfile.flush()
+
+    def close(self) -> None:
+        """Close the real wfile."""
+        self.wfile.close()
+
+    @property
+    def closed(self) -> bool:
+        """If the real wfile is closed."""
+        return self.wfile.closed
+
+
+class _FlrigHandler(SimpleXMLRPCRequestHandler):
+    """One flrig request, keep-alive like the real thing."""
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        if self.server.faults.split:
+            self.wfile = _SplitWriter(self.wfile, self.server.faults)
+
+    def do_POST(self):
+        faults = self.server.faults
+        if faults.hang_up():
+            self.close_connection = True
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            return
+        faults.delay()
+        super().do_POST()
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+
+class FlrigSimulator(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+    """An flrig XML-RPC server on host:port, port 0 to pick a free one."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0, rig=None, faults=None) -> None:
+        self.rig = rig or Rig()
+        self.faults = faults or Faults()
+        super().__init__(
+            (host, port),
+            requestHandler=_FlrigHandler,
+            logRequests=False,
+            allow_none=True,
+        )
+        rig = self.rig
+
+        def locked(function):
+            def call(*args):
+                with rig.lock:
+                    return function(*args)
+
+            return call
+
+        def set_frequency(freq):
+            rig.freq = int(freq)
+            return 0
+
+        def set_mode(mode):
+            rig.mode = mode
+            return 0
+
+        def set_power(power):
+            rig.power = int(power)
+            return 0
+
+        for name, function in (
+            ("main.get_version", lambda: "2.0.0"),
+            ("rig.get_vfo", lambda: str(rig.freq)),
+            ("rig.get_mode", lambda: rig.mode),
+            ("rig.get_ptt", lambda: rig.ptt),
+            ("rig.get_power", lambda: rig.power),
+            ("rig.set_frequency", set_frequency),
+            ("rig.set_mode", set_mode),
+            ("rig.set_power", set_power),
+        ):
+            self.register_function(locked(function), name)
+
+    @property
+    def port(self) -> int:
+        """The port it's listening on."""
+        return self.server_address[1]
+
+    def start(self) -> "FlrigSimulator":
+        """Serve in a background thread."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser) -> None:
+    """The command line options that make a Faults."""
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Milliseconds added to each reply"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="Up to this many more milliseconds"
+    )
+    parser.add_argument(
+        "--split", type=int, default=0, help="Send replies this many bytes at a time"
+    )
+    parser.add_argument(
+        "--disconnect",
+        type=float,
+        default=0.0,
+        help="Chance of hanging up instead of answering, 0.0 - 1.0",
+    )
+
+
+def faults_from(args) -> Faults:
+    """A Faults from the parsed command line."""
+    return Faults(args.latency / 1000, args.jitter / 1000, args.split, args.disconnect)
+
+
+def main() -> None:
+    """Run a simulator until interrupted."""
+    parser = argparse.ArgumentParser(description="Simulate a radio for CAT testing.")
+    parser.add_argument("interface", choices=("rigctld", "flrig"))
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=None, help="Port to listen on")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+    if args.interface == "rigctld":
+        simulator = RigctldSimulator(
+            args.host, args.port or 4532, faults=faults_from(args)
+        )
+    else:
+        simulator = FlrigSimulator(
+            args.host, args.port or 12345, faults=faults_from(args)
+        )
+    print(f"{args.interface} simulator on {args.host}:{simulator.port}")
+    try:
+        simulator.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        simulator.server_close()
+
+
+if __name__ == "__main__":
+    main()
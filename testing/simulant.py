@@ -53,12 +53,12 @@ if args.band:
 else:
     BAND = bands[random.randint(0, len(bands) - 1)]
 
-modes = ("CW", "PH", "DI")
+modes = ("CW", "PH", "DG")
 if args.mode:
     if args.mode.upper() in modes:
         MODE = args.mode.upper()
     else:
-        print('Allowed modes: "CW", "PH", "DI"')
+        print('Allowed modes: "CW", "PH", "DG"')
         raise SystemExit(1)
 else:
     MODE = modes[random.randint(0, len(modes) - 1)]
@@ -173,7 +173,7 @@ def fakefreq(band, mode):
     This will return a sane value for a frequency mainly for the cabrillo and adif log.
     Takes a band and mode as input and returns freq in khz.
     """
-    _modes = {"CW": 0, "DI": 1, "PH": 2, "FT8": 1, "SSB": 2}
+    _modes = {"CW": 0, "DG": 1, "PH": 2, "FT8": 1, "SSB": 2}
     fakefreqs = {
         "160": ["1830", "1805", "1840"],
         "80": ["3530", "3559", "3970"],
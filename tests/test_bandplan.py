@@ -0,0 +1,110 @@
+"""
+Checks wfdlogger's BandPlan against the if-chain, fakefreq table and rig
+mode mapping it replaced: one hz either side of, and on, every band and
+sub-band edge, then random frequencies from DC to 500 mhz. The old chain
+gave None for an out of band number where the plan gives "0", that's the
+only difference allowed.
+
+    python3 -m pytest tests
+"""
+
+import json
+import random
+
+import pytest
+
+from testing.legacy_bandplan import (
+    LEGACY_FAKEFREQS,
+    LEGACY_MODES,
+    legacy_getband,
+    legacy_getmode,
+    plan_getband,
+)
+from wfdlogger.lib import bandplan
+from wfdlogger.lib.bandplan import PACKAGED_PLAN, BandPlan
+
+
+@pytest.fixture(scope="module", name="plan")
+def fixture_plan() -> BandPlan:
+    """The packaged plan."""
+    return BandPlan(PACKAGED_PLAN)
+
+
+def edge_frequencies(plan: BandPlan) -> list:
+    """Every band and sub-band edge, and one hz either side of it."""
+    edges = set()
+    for lower, upper, _ in plan.edges:
+        edges.update((lower, upper))
+    edges.update(plan.segment_edges)
+    return sorted(
+        frequency for edge in edges for frequency in (edge - 1, edge, edge + 1)
+    )
+
+
+def check_band(plan: BandPlan, frequency: int) -> None:
+    """The plan agrees with the old chain, and segment() with band()."""
+    band = plan.band(frequency)
+    assert band == (legacy_getband(str(frequency)) or "0"), frequency
+    segment_band, subband, mode = plan.segment(frequency)
+    assert segment_band == band, frequency
+    assert (band == "0") == (subband == "0"), frequency
+    assert mode == plan.likely_mode(frequency), frequency
+
+
+def test_edges(plan):
+    """On and either side of every edge."""
+    for frequency in edge_frequencies(plan) + [0, 1, 500000000]:
+        check_band(plan, frequency)
+
+
+def test_random_frequencies(plan):
+    """Random frequencies from DC to 500 mhz."""
+    rng = random.Random(0)
+    for _ in range(20000):
+        check_band(plan, rng.randrange(0, 500000000))
+
+
+@pytest.mark.parametrize("freq", ["", "VFO", "14.074", "-14074000"])
+def test_not_a_frequency(plan, freq):
+    """Anything that isn't a number of hz is band "0"."""
+    assert plan_getband(plan, freq) == legacy_getband(freq)
+
+
+@pytest.mark.parametrize("band", sorted(LEGACY_FAKEFREQS))
+def test_fakefreq(plan, band):
+    """Every band and mode gives the frequency the old table did."""
+    for mode, index in LEGACY_MODES.items():
+        assert plan.fakefreq(band, mode) == LEGACY_FAKEFREQS[band][index], mode
+
+
+@pytest.mark.parametrize(
+    "rigmode", ["CW", "CWR", "USB", "LSB", "FM", "AM", "RTTY", "PKTUSB", ""]
+)
+def test_mode(plan, rigmode):
+    """Rig modes map to CW, PH and DG as they did."""
+    assert plan.mode(rigmode) == legacy_getmode(rigmode)
+
+
+def test_overlapping_bands(tmp_path):
+    """A plan with bands that overlap is refused."""
+    filename = tmp_path / "bandplan.json"
+    filename.write_text(
+        json.dumps(
+            {
+                "bands": [
+                    {"band": "a", "lower": 100, "upper": 200},
+                    {"band": "b", "lower": 150, "upper": 300},
+                ]
+            }
+        ),
+        encoding="utf-8",
+    )
+    with pytest.raises(ValueError):
+        BandPlan(str(filename))
+
+
+def test_bad_plan_falls_back(tmp_path):
+    """load() uses the packaged plan if the one asked for won't load."""
+    filename = tmp_path / "bandplan.json"
+    filename.write_text("not json", encoding="utf-8")
+    assert bandplan.load(str(filename)).filename == PACKAGED_PLAN
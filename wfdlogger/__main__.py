@@ -15,23 +15,23 @@ GPL V3
 # xplanet -body earth -window -longitude -117 -latitude 38 -config Default
 # -projection azmithal -radius 200 -wait 5
 
-from math import radians, sin, cos, atan2, sqrt, asin, pi
 import datetime as dt
 import sys
 import socket
 import os
 import logging
 import re
+import sqlite3
 import threading
 import uuid
 import queue
 import time
 
 # import pkgutil
-from itertools import chain
 
 from json import dumps, loads, JSONDecodeError
 from datetime import datetime, timedelta
+from functools import partial
 from pathlib import Path
 from shutil import copyfile
 
@@ -43,20 +43,44 @@ import requests
 
 try:
     from wfdlogger.lib.settings import Settings
+    from wfdlogger.lib.adif import ADIF
+    from wfdlogger.lib.backup import Backup
+    from wfdlogger.lib.bandplan import BANDPLAN
     from wfdlogger.lib.database import DataBase
+    from wfdlogger.lib import geometry
+    from wfdlogger.lib.importer import Importer
+    from wfdlogger.lib.logexport import LogExport, cabrillo, calcscore, statistics
     from wfdlogger.lib.lookup import HamDBlookup, HamQTH, QRZlookup
-    from wfdlogger.lib.cat_interface import CAT
+    from wfdlogger.lib.markers import Markers
+    from wfdlogger.lib.cat_interface import MultiCAT
+    from wfdlogger.lib.cloudlog import Cloudlog
     from wfdlogger.lib.cwinterface import CW
-    from wfdlogger.lib.n1mm import N1MM
+    from wfdlogger.lib.cwmacros import CWMacros
+    from wfdlogger.lib.n1mm import N1MM, N1MMListener
+    from wfdlogger.lib.ringlog import RingLog
+    from wfdlogger.lib.roster import Roster
     from wfdlogger.lib.version import __version__
+    from wfdlogger.lib.wire import BufferPool, WireFormat, PROTOCOL_VERSION, peek
 except ModuleNotFoundError:
     from lib.settings import Settings
+    from lib.adif import ADIF
+    from lib.backup import Backup
+    from lib.bandplan import BANDPLAN
     from lib.database import DataBase
+    from lib import geometry
+    from lib.importer import Importer
+    from lib.logexport import LogExport, cabrillo, calcscore, statistics
     from lib.lookup import HamDBlookup, HamQTH, QRZlookup
-    from lib.cat_interface import CAT
+    from lib.markers import Markers
+    from lib.cat_interface import MultiCAT
+    from lib.cloudlog import Cloudlog
     from lib.cwinterface import CW
-    from lib.n1mm import N1MM
+    from lib.cwmacros import CWMacros
+    from lib.n1mm import N1MM, N1MMListener
+    from lib.ringlog import RingLog
+    from lib.roster import Roster
     from lib.version import __version__
+    from lib.wire import BufferPool, WireFormat, PROTOCOL_VERSION, peek
 
 
 def load_fonts_from_dir(directory: str) -> set:
@@ -78,6 +102,33 @@ class QSOEdit(QtCore.QObject):
     lineChanged = QtCore.pyqtSignal()
 
 
+class ImportStatus(QtCore.QObject):
+    """
+    Custom qt event signals used to report on a background import.
+    """
+
+    message = QtCore.pyqtSignal(str)
+    finished = QtCore.pyqtSignal()
+
+
+class CloudlogStatus(QtCore.QObject):
+    """
+    Custom qt event signal the Cloudlog uploader reports through.
+    """
+
+    status = QtCore.pyqtSignal(bool, str)
+
+
+class NetworkStatus(QtCore.QObject):
+    """
+    Custom qt event signals the background lookup sign in and Cloudlog auth
+    check report through. Each carries the generation it was started in.
+    """
+
+    lookup = QtCore.pyqtSignal(object, int)
+    cloudlog = QtCore.pyqtSignal(bool, str, int)
+
+
 class MainWindow(QtWidgets.QMainWindow):
     """
     The Main Window with all the clicky bits
@@ -151,10 +202,11 @@ class MainWindow(QtWidgets.QMainWindow):
     powermult = 0
     fkeys = {}
     run_state = False
-    people = {}
     groupcall = None
     server_commands = []
     server_seen = None
+    dirty_batch = 10
+    dirty_interval = 100
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -162,7 +214,38 @@ class MainWindow(QtWidgets.QMainWindow):
         data_path = self.working_path + "/data/main.ui"
         uic.loadUi(data_path, self)
         self.db = DataBase(self.database)
+        self.backup = Backup(self.db)
         self.udp_fifo = queue.Queue()
+        self.wire = WireFormat()
+        self.udp_buffers = BufferPool()
+        self.roster = Roster()
+        self.chat_history = RingLog("chat_history.txt")
+        self.info_history = RingLog("infobox_history.txt")
+        self.infobox_lookup_lines = 0
+        self.adif_log = ADIF("WFD.adi", self.get_state, self.fakefreq)
+        self.cw_macros = CWMacros("./cwmacros.txt")
+        self.log_export = LogExport()
+        self.log_export.progress.connect(self.infobox_append)
+        self.log_export.finished.connect(self.logs_generated)
+        self.import_status = ImportStatus()
+        self.import_status.message.connect(self.infobox_append)
+        self.import_status.finished.connect(self.qsoedited)
+        self._importing = None
+        self.n1mm_listener = None
+        self.n1mm_status = ImportStatus()
+        self.n1mm_status.finished.connect(self.qsoedited)
+        self.scoretimer = QtCore.QTimer()
+        self.scoretimer.timeout.connect(self.send_score)
+        self.dirty_records = []
+        self.dirtytimer = QtCore.QTimer()
+        self.dirtytimer.timeout.connect(self.send_dirty_records)
+        self.markers = Markers(self.db)
+        self.markers.failed.connect(self.marker_failed)
+        self.cloudlog_status = CloudlogStatus()
+        self.cloudlog_status.status.connect(self.cloudlog_changed)
+        self.cloudlog = Cloudlog(
+            self.db, self.adif_log.record, self.cloudlog_status.status.emit
+        )
         self.listWidget.itemDoubleClicked.connect(self.qsoclicked)
         self.run_button.clicked.connect(self.run_button_pressed)
         self.altpowerButton.clicked.connect(self.claim_alt_power)
@@ -203,6 +286,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.frame_10.show()
         self.frame_11.show()
         self.group_call_indicator.hide()
+        self.users_list.setPlainText("Operators")
         self.mycallEntry.show()
         self.settingsbutton.clicked.connect(self.settingspressed)
         self.F1.clicked.connect(self.sendf1)
@@ -244,6 +328,10 @@ class MainWindow(QtWidgets.QMainWindow):
             "useflrig": False,
             "CAT_ip": "localhost",
             "CAT_port": 4532,
+            "userigctld2": False,
+            "useflrig2": False,
+            "CAT2_ip": "localhost",
+            "CAT2_port": 4533,
             "cloudlog": False,
             "cloudlogapi": "c01234567890123456789",
             "cloudlogurl": "https://www.cloudlog.com/Cloudlog/index.php/api",
@@ -262,6 +350,12 @@ class MainWindow(QtWidgets.QMainWindow):
             "multicast_group": "224.1.1.1",
             "multicast_port": 2239,
             "interface_ip": "0.0.0.0",
+            "compact_packets": False,
+            "chat_history_depth": 500,
+            "infobox_history_depth": 200,
+            "backup_interval": 300,
+            "backup_keep": 5,
+            "backup_on_exit": True,
             "send_n1mm_packets": False,
             "n1mm_station_name": "20M CW Tent",
             "n1mm_operator": "Bernie",
@@ -270,9 +364,16 @@ class MainWindow(QtWidgets.QMainWindow):
             "n1mm_contactport": 12061,
             "n1mm_lookupport": 12060,
             "n1mm_scoreport": 12062,
+            "n1mm_score_interval": 15,
+            "n1mm_listen": False,
+            "n1mm_listenport": 12063,
         }
         self.reference_preference = self.preference.copy()
         self.look_up = None
+        self.network_generation = 0
+        self.network_status = NetworkStatus()
+        self.network_status.lookup.connect(self.lookup_ready)
+        self.network_status.cloudlog.connect(self.cloudlog_checked)
         self.cat_control = None
         self.cw = None
         self.connect_to_server = False
@@ -281,34 +382,62 @@ class MainWindow(QtWidgets.QMainWindow):
         self.interface_ip = None
         self._udpwatch = None
         self.readpreferences()
+        self.backup.start()
 
         self.radiochecktimer = QtCore.QTimer()
         self.radiochecktimer.timeout.connect(self.poll_radio)
         self.radiochecktimer.start(1000)
 
-    def show_people(self):
-        """Display operators"""
-        rev_dict = {}
-        for key, value in self.people.items():
-            rev_dict.setdefault(value, set()).add(key)
-        result = set(
-            chain.from_iterable(
-                values for key, values in rev_dict.items() if len(values) > 1
+    def show_people(self, changed: set = None, removed: list = None) -> None:
+        """
+        Update the operators list, redrawing only the rows given.
+        changed, stations whose row needs (re)drawing.
+        removed, (row, station) pairs to take out, highest row first.
+        """
+        document = self.users_list.document()
+        for row, _ in removed or ():
+            block = document.findBlockByNumber(row + 1)
+            cursor = QtGui.QTextCursor(document)
+            cursor.setPosition(block.position() - 1)
+            cursor.setPosition(
+                block.position() + block.length() - 1, QtGui.QTextCursor.KeepAnchor
             )
-        )
-        self.users_list.clear()
-        self.users_list.insertPlainText("Operators\n")
-        for op_callsign in self.people:
-            if op_callsign in result:
-                self.users_list.setTextColor(QtGui.QColor(245, 121, 0))
-                self.users_list.insertPlainText(
-                    f"{op_callsign.rjust(6,' ')} {self.people.get(op_callsign).rjust(6, ' ')}\n"
-                )
-                self.users_list.setTextColor(QtGui.QColor(211, 215, 207))
+            cursor.removeSelectedText()
+        for op_callsign in changed or ():
+            text_format = QtGui.QTextCharFormat()
+            if self.roster.collides(op_callsign):
+                text_format.setForeground(QtGui.QColor(245, 121, 0))
             else:
-                self.users_list.insertPlainText(
-                    f"{op_callsign.rjust(6,' ')} {self.people.get(op_callsign).rjust(6, ' ')}\n"
+                text_format.setForeground(QtGui.QColor(211, 215, 207))
+            line = (
+                f"{op_callsign.rjust(6,' ')} "
+                f"{self.roster.band_mode.get(op_callsign).rjust(6, ' ')}"
+            )
+            block = document.findBlockByNumber(self.roster.row(op_callsign) + 1)
+            cursor = QtGui.QTextCursor(document)
+            if block.isValid():
+                cursor.setPosition(block.position())
+                cursor.movePosition(
+                    QtGui.QTextCursor.EndOfBlock, QtGui.QTextCursor.KeepAnchor
                 )
+                cursor.insertText(line, text_format)
+            else:
+                cursor.movePosition(QtGui.QTextCursor.End)
+                cursor.insertText(f"\n{line}", text_format)
+
+    def update_people(self, station: str, band_mode: str) -> None:
+        """Note a station's band/mode in the roster and redraw what changed."""
+        changed = self.roster.update(station, band_mode)
+        if changed:
+            self.show_people(changed)
+
+    def age_people(self) -> None:
+        """Drop stations we haven't heard a PING from in a while."""
+        removed, changed = self.roster.expire()
+        for _, station in removed:
+            self.wire.forget_peer(station)
+        if removed or changed:
+            self.show_people(changed, removed)
 
     def show_dirty_records(self):
         """Checks for dirty records, Changes Generate Log button to give visual indication."""
@@ -323,42 +452,66 @@ class MainWindow(QtWidgets.QMainWindow):
                 self.genLogButton.setText("Generate Logs")
 
     def resolve_dirty_records(self):
-        """Go through dirty records and submit them to the server."""
+        """
+        Queue the dirty records to go to the server, dirty_batch of them
+        every dirty_interval ms, so a big backlog isn't sent in one burst.
+        Records already waiting on the server, or already queued, are left
+        alone.
+        """
         if self.connect_to_server:
             records = self.db.fetch_all_dirty_contacts()
-            self.infobox.setTextColor(QtGui.QColor(211, 215, 207))
-            self.infobox.insertPlainText(f"Resolving {len(records)} unsent contacts.\n")
-            app.processEvents()
-            if records:
-                for count, dirty_contact in enumerate(records):
-                    contact = {}
-                    contact["cmd"] = "POST"
-                    contact["station"] = self.preference.get("mycallsign")
-                    stale = datetime.now() + timedelta(seconds=30)
-                    contact["expire"] = stale.isoformat()
-                    contact["unique_id"] = dirty_contact.get("unique_id")
-                    contact["hiscall"] = dirty_contact.get("callsign")
-                    contact["class"] = dirty_contact.get("class")
-                    contact["section"] = dirty_contact.get("section")
-                    contact["date_and_time"] = dirty_contact.get("date_time")
-                    contact["frequency"] = dirty_contact.get("frequency")
-                    contact["band"] = dirty_contact.get("band")
-                    contact["mode"] = dirty_contact.get("mode")
-                    contact["power"] = dirty_contact.get("power")
-                    contact["grid"] = dirty_contact.get("grid")
-                    contact["opname"] = dirty_contact.get("opname")
-                    self.server_commands.append(contact)
-                    bytesToSend = bytes(dumps(contact), encoding="ascii")
-                    try:
-                        self.server_udp.sendto(
-                            bytesToSend,
-                            (self.multicast_group, int(self.multicast_port)),
-                        )
-                    except OSError as err:
-                        logger.warning("%s", err)
-                    time.sleep(0.1)  # Do I need this?
-                    self.infobox.insertPlainText(f"Sending {count}\n")
-                    app.processEvents()
+            self.infobox_append(f"Resolving {len(records)} unsent contacts.")
+            waiting = {
+                item.get("unique_id")
+                for item in self.server_commands
+                if item.get("cmd") == "POST"
+            }
+            waiting.update(record.get("unique_id") for record in self.dirty_records)
+            self.dirty_records.extend(
+                record for record in records if record.get("unique_id") not in waiting
+            )
+            if self.dirty_records and not self.dirtytimer.isActive():
+                self.dirtytimer.start(self.dirty_interval)
+
+    def send_dirty_records(self):
+        """
+        Send the next dirty_batch queued dirty records. They go on
+        server_commands like any other POST, so ones the server doesn't
+        confirm are resent by check_for_stale_commands.
+        """
+        batch = self.dirty_records[: self.dirty_batch]
+        del self.dirty_records[: self.dirty_batch]
+        if not self.dirty_records:
+            self.dirtytimer.stop()
+        if not self.connect_to_server:
+            self.dirty_records.clear()
+            return
+        for dirty_contact in batch:
+            contact = {}
+            contact["cmd"] = "POST"
+            contact["station"] = self.preference.get("mycallsign")
+            stale = datetime.now() + timedelta(seconds=30)
+            contact["expire"] = stale.isoformat()
+            contact["unique_id"] = dirty_contact.get("unique_id")
+            contact["hiscall"] = dirty_contact.get("callsign")
+            contact["class"] = dirty_contact.get("class")
+            contact["section"] = dirty_contact.get("section")
+            contact["date_and_time"] = dirty_contact.get("date_time")
+            contact["frequency"] = dirty_contact.get("frequency")
+            contact["band"] = dirty_contact.get("band")
+            contact["mode"] = dirty_contact.get("mode")
+            contact["power"] = dirty_contact.get("power")
+            contact["grid"] = dirty_contact.get("grid")
+            contact["opname"] = dirty_contact.get("opname")
+            self.server_commands.append(contact)
+            bytesToSend = self.wire.encode(contact)
+            try:
+                self.server_udp.sendto(
+                    bytesToSend,
+                    (self.multicast_group, int(self.multicast_port)),
+                )
+            except OSError as err:
+                logger.warning("%s", err)
 
     def clear_dirty_flag(self, unique_id):
         """clear the dirty flag on record once response is returned from server."""
@@ -373,9 +526,7 @@ class MainWindow(QtWidgets.QMainWindow):
             ) == data.get("subject"):
                 self.server_commands.pop(index)
                 self.clear_dirty_flag(data.get("unique_id"))
-                self.infobox.insertPlainText(
-                    f"Server Confirmed {data.get('subject')}\n"
-                )
+                self.infobox_append(f"Server Confirmed {data.get('subject')}")
 
     def check_for_stale_commands(self):
         """
@@ -384,11 +535,11 @@ class MainWindow(QtWidgets.QMainWindow):
         """
         if self.connect_to_server:
             for index, item in enumerate(self.server_commands):
-                expired = datetime.strptime(item.get("expire"), "%Y-%m-%dT%H:%M:%S.%f")
+                expired = datetime.fromisoformat(item.get("expire"))
                 if datetime.now() > expired:
                     newexpire = datetime.now() + timedelta(seconds=30)
                     self.server_commands[index]["expire"] = newexpire.isoformat()
-                    bytesToSend = bytes(dumps(item), encoding="ascii")
+                    bytesToSend = self.wire.encode(item)
                     try:
                         self.server_udp.sendto(
                             bytesToSend,
@@ -403,7 +554,7 @@ class MainWindow(QtWidgets.QMainWindow):
         packet = {"cmd": "CHAT"}
         packet["sender"] = self.preference.get("mycallsign")
         packet["message"] = message
-        bytesToSend = bytes(dumps(packet), encoding="ascii")
+        bytesToSend = self.wire.encode(packet)
         try:
             self.server_udp.sendto(
                 bytesToSend, (self.multicast_group, int(self.multicast_port))
@@ -414,23 +565,94 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def display_chat(self, sender, body):
         """Displays the chat history."""
+        self.chat_history.append(f"{sender}: {body}")
         if self.preference.get("mycallsign") in body.upper():
             self.chatlog.setTextColor(QtGui.QColor(245, 121, 0))
         self.chatlog.insertPlainText(f"\n{sender}: {body}")
         self.chatlog.setTextColor(QtGui.QColor(211, 215, 207))
         self.chatlog.ensureCursorVisible()
 
+    def infobox_clear(self) -> None:
+        """Empty the infobox, ready for a new lookup."""
+        self.infobox.clear()
+        self.infobox_lookup_lines = 0
+
+    def infobox_append(self, text: str, color=None, lookup=False) -> None:
+        """
+        Add a line to the infobox, in color if given. Status lines are kept
+        in the bounded history, and the oldest go once there are more than
+        its depth on screen. Lookup lines, the section, super check and dupe
+        lists shown since the last infobox_clear(), are never cut short.
+        """
+        if color is not None:
+            self.infobox.setTextColor(color)
+        cursor = self.infobox.textCursor()
+        cursor.movePosition(QtGui.QTextCursor.End)
+        self.infobox.setTextCursor(cursor)
+        self.infobox.insertPlainText(f"{text}\n")
+        if lookup:
+            self.infobox_lookup_lines += text.count("\n") + 1
+            return
+        self.info_history.append(text)
+        document = self.infobox.document()
+        excess = (
+            document.blockCount()
+            - 1
+            - self.infobox_lookup_lines
+            - self.info_history.depth
+        )
+        if excess > 0:
+            cursor = QtGui.QTextCursor(
+                document.findBlockByNumber(self.infobox_lookup_lines)
+            )
+            cursor.movePosition(
+                QtGui.QTextCursor.NextBlock, QtGui.QTextCursor.KeepAnchor, excess
+            )
+            cursor.removeSelectedText()
+
+    def closeEvent(self, event) -> None:
+        """Flush the chat and infobox history and back up on the way out."""
+        self.chat_history.close()
+        self.info_history.close()
+        if self.n1mm_listener is not None:
+            self.n1mm_listener.stop()
+        if self.cat_control is not None:
+            self.cat_control.stop()
+        if self.cw is not None:
+            self.cw.stop()
+        self.markers.flush()
+        self.cloudlog.stop()
+        self.backup.stop()
+        event.accept()
+
+    def udp_wanted(self, datagram) -> bool:
+        """
+        Peeks at a datagram to see if check_udp_queue would do anything with it.
+        Our own multicast echoes and traffic meant for others are not.
+        """
+        cmd, station, recipient = peek(datagram)
+        mycall = self.preference.get("mycallsign")
+        if cmd in ("PING", "GROUPQUERY"):
+            return station != mycall
+        if cmd == "RESPONSE":
+            return recipient == mycall
+        return cmd == "CHAT"
+
     def watch_udp(self):
-        """Puts UDP datagrams in a FIFO queue"""
+        """Puts wanted UDP datagrams, as (buffer, length), in a FIFO queue"""
         while True:
             if self.connect_to_server:
+                buffer = self.udp_buffers.get()
                 try:
-                    datagram = self.server_udp.recv(1500)
+                    nbytes = self.server_udp.recv_into(buffer)
                 except socket.timeout:
+                    self.udp_buffers.put(buffer)
                     time.sleep(1)
                     continue
-                if datagram:
-                    self.udp_fifo.put(datagram)
+                if nbytes and self.udp_wanted(memoryview(buffer)[:nbytes]):
+                    self.udp_fifo.put((buffer, nbytes))
+                else:
+                    self.udp_buffers.put(buffer)
             else:
                 time.sleep(1)
 
@@ -443,26 +665,37 @@ class MainWindow(QtWidgets.QMainWindow):
                     "padding-left:5px;\npadding-right: 5px;"
                 )
         while not self.udp_fifo.empty():
-            datagram = self.udp_fifo.get()
+            buffer, nbytes = self.udp_fifo.get()
+            datagram = memoryview(buffer)[:nbytes]
             try:
-                json_data = loads(datagram.decode())
+                json_data = self.wire.decode(datagram)
             except UnicodeDecodeError as err:
-                the_error = f"Not Unicode: {err}\n{datagram}"
+                the_error = f"Not Unicode: {err}\n{bytes(datagram)}"
                 logger.info(the_error)
                 continue
             except JSONDecodeError as err:
-                the_error = f"Not JSON: {err}\n{datagram}"
+                the_error = f"Not JSON: {err}\n{bytes(datagram)}"
                 logger.info(the_error)
                 continue
+            except ValueError as err:
+                the_error = f"Bad packet: {err}\n{bytes(datagram)}"
+                logger.info(the_error)
+                continue
+            finally:
+                self.udp_buffers.put(buffer)
             logger.info("%s", json_data)
 
             if json_data.get("cmd") == "PING":
                 if json_data.get("station"):
-                    band_mode = f"{json_data.get('band')} {json_data.get('mode')}"
-                    if self.people.get(json_data.get("station")) != band_mode:
-                        self.people[json_data.get("station")] = band_mode
-                    self.show_people()
+                    self.wire.note_peer(
+                        json_data.get("station"), json_data.get("proto")
+                    )
+                    self.update_people(
+                        json_data.get("station"),
+                        f"{json_data.get('band')} {json_data.get('mode')}",
+                    )
                 if json_data.get("host"):
+                    self.wire.note_peer("host", json_data.get("proto"))
                     self.server_seen = datetime.now() + timedelta(seconds=30)
                     self.group_call_indicator.setStyleSheet(
                         "border: 1px solid green;\npadding-left:5px;\npadding-right: 5px;"
@@ -486,7 +719,7 @@ class MainWindow(QtWidgets.QMainWindow):
                         )
                         return
                     if json_data.get("subject") == "LOG":
-                        self.infobox.insertPlainText("Server Generated Log.\n")
+                        self.infobox_append("Server Generated Log.")
                     self.remove_confirmed_commands(json_data)
                     continue
 
@@ -504,7 +737,7 @@ class MainWindow(QtWidgets.QMainWindow):
             "cmd": "GROUPQUERY",
             "station": self.preference.get("mycallsign"),
         }
-        bytesToSend = bytes(dumps(update), encoding="ascii")
+        bytesToSend = self.wire.encode(update)
         try:
             self.server_udp.sendto(
                 bytesToSend, (self.multicast_group, int(self.multicast_port))
@@ -524,8 +757,12 @@ class MainWindow(QtWidgets.QMainWindow):
                 "mode": self.mode,
                 "band": self.band,
                 "station": self.preference.get("mycallsign"),
+                "proto": PROTOCOL_VERSION,
             }
-            bytesToSend = bytes(dumps(update), encoding="ascii")
+            # Our own PING echo is dropped on receipt, so list ourselves here.
+            self.update_people(update["station"], f"{self.band} {self.mode}")
+            self.age_people()
+            bytesToSend = self.wire.encode(update)
             try:
                 self.server_udp.sendto(
                     bytesToSend, (self.multicast_group, int(self.multicast_port))
@@ -535,6 +772,32 @@ class MainWindow(QtWidgets.QMainWindow):
 
             self.check_for_stale_commands()
 
+    def send_score(self) -> None:
+        """
+        Send our score as an N1MM dynamicresults packet. It comes from the
+        database's cached tally, so the log is only read after it changes.
+        """
+        if not self.preference.get("send_n1mm_packets"):
+            return
+        tally = self.db.band_mode_tally()
+        _, powermult, score = calcscore(tally.stats(), self.preference)
+        station = {
+            "call": self.preference.get("mycallsign"),
+            "class": self.preference.get("myclass"),
+            "section": self.preference.get("mysection"),
+            "power": {2: "QRP", 0: "HIGH"}.get(powermult, "LOW"),
+            "version": __version__,
+        }
+        try:
+            self.n1mm.send_score(
+                tally,
+                station,
+                score,
+                datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S"),
+            )
+        except OSError as err:
+            logger.warning("%s", err)
+
     def clearcontactlookup(self):
         """clearout the contact lookup"""
         self.contactlookup["call"] = ""
@@ -575,49 +838,17 @@ class MainWindow(QtWidgets.QMainWindow):
                 )
             logger.info("%s", self.contactlookup)
 
-    def distance(self, grid1: str, grid2: str) -> float:
+    @staticmethod
+    def distance(grid1: str, grid2: str) -> float:
         """
         Takes two maidenhead gridsquares and returns the distance between the two in kilometers.
         """
-        lat1, lon1 = self.gridtolatlon(grid1)
-        lat2, lon2 = self.gridtolatlon(grid2)
-        return round(self.haversine(lon1, lat1, lon2, lat2))
-
-    def bearing(self, grid1: str, grid2: str) -> float:
-        """calculate bearing to contact"""
-        lat1, lon1 = self.gridtolatlon(grid1)
-        lat2, lon2 = self.gridtolatlon(grid2)
-        lat1 = radians(lat1)
-        lon1 = radians(lon1)
-        lat2 = radians(lat2)
-        lon2 = radians(lon2)
-        londelta = lon2 - lon1
-        why = sin(londelta) * cos(lat2)
-        exs = cos(lat1) * sin(lat2) - sin(lat1) * cos(lat2) * cos(londelta)
-        brng = atan2(why, exs)
-        brng *= 180 / pi
-
-        if brng < 0:
-            brng += 360
-
-        return round(brng)
+        return geometry.distance(grid1, grid2)
 
     @staticmethod
-    def haversine(lon1, lat1, lon2, lat2):
-        """
-        Calculate the great circle distance in kilometers between two points
-        on the earth (specified in decimal degrees)
-        """
-        # convert degrees to radians
-        lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
-
-        # haversine formula
-        dlon = lon2 - lon1
-        dlat = lat2 - lat1
-        aye = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-        cee = 2 * asin(sqrt(aye))
-        arrgh = 6372.8  # Radius of earth in kilometers.
-        return cee * arrgh
+    def bearing(grid1: str, grid2: str) -> float:
+        """calculate bearing to contact"""
+        return geometry.bearing(grid1, grid2)
 
     def run_button_pressed(self):
         """The run/S&P button was pressed."""
@@ -640,53 +871,15 @@ class MainWindow(QtWidgets.QMainWindow):
             logger.debug("read_cw_macros: copying default macro file.")
             data_path = self.working_path + "/data/cwmacros.txt"
             copyfile(data_path, "./cwmacros.txt")
-        with open("./cwmacros.txt", "r", encoding="utf-8") as file_descriptor:
-            for line in file_descriptor:
-                try:
-                    mode, fkey, buttonname, cwtext = line.split("|")
-                    if mode.strip().upper() == "R" and self.run_state:
-                        self.fkeys[fkey.strip()] = (buttonname.strip(), cwtext.strip())
-                    if mode.strip().upper() != "R" and not self.run_state:
-                        self.fkeys[fkey.strip()] = (buttonname.strip(), cwtext.strip())
-                except ValueError as err:
-                    logger.info("read_cw_macros: %s", err)
-        keys = self.fkeys.keys()
-        if "F1" in keys:
-            self.F1.setText(f"F1: {self.fkeys['F1'][0]}")
-            self.F1.setToolTip(self.fkeys["F1"][1])
-        if "F2" in keys:
-            self.F2.setText(f"F2: {self.fkeys['F2'][0]}")
-            self.F2.setToolTip(self.fkeys["F2"][1])
-        if "F3" in keys:
-            self.F3.setText(f"F3: {self.fkeys['F3'][0]}")
-            self.F3.setToolTip(self.fkeys["F3"][1])
-        if "F4" in keys:
-            self.F4.setText(f"F4: {self.fkeys['F4'][0]}")
-            self.F4.setToolTip(self.fkeys["F4"][1])
-        if "F5" in keys:
-            self.F5.setText(f"F5: {self.fkeys['F5'][0]}")
-            self.F5.setToolTip(self.fkeys["F5"][1])
-        if "F6" in keys:
-            self.F6.setText(f"F6: {self.fkeys['F6'][0]}")
-            self.F6.setToolTip(self.fkeys["F6"][1])
-        if "F7" in keys:
-            self.F7.setText(f"F7: {self.fkeys['F7'][0]}")
-            self.F7.setToolTip(self.fkeys["F7"][1])
-        if "F8" in keys:
-            self.F8.setText(f"F8: {self.fkeys['F8'][0]}")
-            self.F8.setToolTip(self.fkeys["F8"][1])
-        if "F9" in keys:
-            self.F9.setText(f"F9: {self.fkeys['F9'][0]}")
-            self.F9.setToolTip(self.fkeys["F9"][1])
-        if "F10" in keys:
-            self.F10.setText(f"F10: {self.fkeys['F10'][0]}")
-            self.F10.setToolTip(self.fkeys["F10"][1])
-        if "F11" in keys:
-            self.F11.setText(f"F11: {self.fkeys['F11'][0]}")
-            self.F11.setToolTip(self.fkeys["F11"][1])
-        if "F12" in keys:
-            self.F12.setText(f"F12: {self.fkeys['F12'][0]}")
-            self.F12.setToolTip(self.fkeys["F12"][1])
+        self.cw_macros.load()
+        self.fkeys.update(self.cw_macros.macros(self.run_state))
+        for number in range(1, 13):
+            fkey = f"F{number}"
+            if fkey in self.fkeys:
+                buttonname, macro = self.fkeys[fkey]
+                button = getattr(self, fkey)
+                button.setText(f"{fkey}: {buttonname}")
+                button.setToolTip(macro.text)
 
     def update_time(self) -> None:
         """
@@ -703,32 +896,44 @@ class MainWindow(QtWidgets.QMainWindow):
         """
         settingsdialog = Settings(self)
         settingsdialog.exec()
-        self.infobox.clear()
-        self.look_up = None
-        self.cat_control = None
+        self.infobox_clear()
         self.readpreferences()
-        if self.preference.get("useqrz"):
-            self.look_up = QRZlookup(
-                self.preference.get("lookupusername"),
-                self.preference.get("lookuppassword"),
-            )
-        if self.preference.get("usehamdb"):
-            self.look_up = HamDBlookup()
-        if self.preference.get("usehamqth"):
-            self.look_up = HamQTH(
-                self.preference.get("lookupusername"),
-                self.preference.get("lookuppassword"),
-            )
-        if self.preference.get("useflrig"):
-            self.cat_control = CAT(
-                "flrig", self.preference.get("CAT_ip"), self.preference.get("CAT_port")
-            )
-        if self.preference.get("userigctld"):
-            self.cat_control = CAT(
-                "rigctld",
-                self.preference.get("CAT_ip"),
-                self.preference.get("CAT_port"),
-            )
+
+    def setup_cat(self) -> None:
+        """
+        (Re)start polling the radios set up in the preferences. Radio 1 uses
+        useflrig/userigctld, CAT_ip and CAT_port, radio 2 the same with a 2.
+        """
+        focused = None
+        if self.cat_control is not None:
+            focused = self.cat_control.focused
+            self.cat_control.stop()
+            self.cat_control = None
+        radios = {}
+        for number, suffix in ((1, ""), (2, "2")):
+            for interface in ("flrig", "rigctld"):
+                if self.preference.get(f"use{interface}{suffix}"):
+                    radios[number] = (
+                        interface,
+                        self.preference.get(f"CAT{suffix}_ip"),
+                        int(self.preference.get(f"CAT{suffix}_port")),
+                    )
+        if not radios:
+            return
+        self.cat_control = MultiCAT(radios)
+        if focused is not None:
+            self.cat_control.focus(focused)
+        self.cat_control.start()
+
+    def focus_radio(self, number: int) -> None:
+        """Switch logging and band/mode tracking to another radio."""
+        if self.cat_control is None or not self.cat_control.focus(number):
+            self.infobox_append(f"No radio {number}")
+            return
+        self.oldfreq = 0
+        self.oldmode = ""
+        self.infobox_append(f"Radio {number} focused")
+        self.poll_radio()
 
     def readpreferences(self):
         """
@@ -764,53 +969,28 @@ class MainWindow(QtWidgets.QMainWindow):
             if self.preference.get("power"):
                 self.power_selector.setValue(int(self.preference.get("power")))
 
-            self.cat_control = None
-            if self.preference.get("useflrig"):
-                self.cat_control = CAT(
-                    "flrig",
-                    self.preference.get("CAT_ip"),
-                    self.preference.get("CAT_port"),
-                )
-            if self.preference.get("userigctld"):
-                self.cat_control = CAT(
-                    "rigctld",
-                    self.preference.get("CAT_ip"),
-                    self.preference.get("CAT_port"),
-                )
-
-            if self.preference.get("useqrz"):
-                self.look_up = QRZlookup(
-                    self.preference.get("lookupusername"),
-                    self.preference.get("lookuppassword"),
-                )
-                if self.look_up.session:
-                    self.QRZ_icon.setStyleSheet("color: rgb(128, 128, 0);")
-                else:
-                    self.QRZ_icon.setStyleSheet("color: rgb(136, 138, 133);")
-
-            if self.preference.get("usehamdb"):
-                self.look_up = HamDBlookup()
-                self.QRZ_icon.setStyleSheet("color: rgb(128, 128, 0);")
-
-            if self.preference.get("usehamqth"):
-                self.look_up = HamQTH(
-                    self.preference.get("lookupusername"),
-                    self.preference.get("lookuppassword"),
-                )
-                if self.look_up.session:
-                    self.QRZ_icon.setStyleSheet("color: rgb(128, 128, 0);")
-                else:
-                    self.QRZ_icon.setStyleSheet("color: rgb(136, 138, 133);")
-
-            if self.look_up and self.preference.get("mycallsign"):
-                _thethread = threading.Thread(
-                    target=self.lookupmygrid,
-                    daemon=True,
-                )
-                _thethread.start()
+            self.setup_cat()
+            self.markers.configure(
+                str(Path.home()) + "/" + self.preference.get("markerfile")
+                if self.preference.get("usemarker")
+                else None
+            )
 
+            self.network_generation += 1
+            self.setup_lookup()
             self.cloudlogauth()
+            cloudlogurl = None
+            if self.preference.get("cloudlog"):
+                cloudlogurl = self.preference.get("cloudlogurl")
+            self.cloudlog.configure(
+                cloudlogurl,
+                self.preference.get("cloudlogapi", ""),
+                self.preference.get("cloudlogstationid", ""),
+                f"{self.preference.get('myclass')} {self.preference.get('mysection')}",
+            )
 
+            if self.cw is not None:
+                self.cw.stop()
             if self.preference.get("cwtype") == 0:
                 self.cw = None
             else:
@@ -841,6 +1021,13 @@ class MainWindow(QtWidgets.QMainWindow):
             self.multicast_group = self.preference.get("multicast_group")
             self.multicast_port = self.preference.get("multicast_port")
             self.interface_ip = self.preference.get("interface_ip")
+            self.wire.compact = bool(self.preference.get("compact_packets"))
+            self.chat_history.depth = self.preference.get("chat_history_depth", 500)
+            self.chatlog.document().setMaximumBlockCount(self.chat_history.depth)
+            self.info_history.depth = self.preference.get("infobox_history_depth", 200)
+            self.backup.interval = int(self.preference.get("backup_interval", 300))
+            self.backup.keep = int(self.preference.get("backup_keep", 5))
+            self.backup.on_exit = bool(self.preference.get("backup_on_exit", True))
 
             # group upd server
             logger.info("Use group server: %s", self.connect_to_server)
@@ -891,9 +1078,15 @@ class MainWindow(QtWidgets.QMainWindow):
                 ip_address=self.preference.get("n1mm_ip"),
                 radioport=self.preference.get("n1mm_radioport"),
                 contactport=self.preference.get("n1mm_contactport"),
+                lookupport=self.preference.get("n1mm_lookupport"),
+                scoreport=self.preference.get("n1mm_scoreport"),
             )
             self.n1mm.set_station_name(self.preference.get("n1mm_station_name"))
             self.n1mm.set_operator(self.preference.get("n1mm_operator"))
+            self.listen_n1mm()
+            self.scoretimer.start(
+                int(self.preference.get("n1mm_score_interval", 15)) * 1000
+            )
 
         except KeyError as err:
             logger.warning("Corrupt preference, %s, loading clean version.", err)
@@ -904,6 +1097,40 @@ class MainWindow(QtWidgets.QMainWindow):
                 file_descriptor.write(dumps(self.preference, indent=4))
                 logger.info("writing: %s", self.preference)
 
+    def listen_n1mm(self) -> None:
+        """
+        Start, restart or stop logging contacts sent to us as N1MM packets,
+        as the preferences say.
+        """
+        if self.n1mm_listener is not None:
+            self.n1mm_listener.stop()
+            self.n1mm_listener = None
+        if not self.preference.get("n1mm_listen"):
+            return
+        port = int(self.preference.get("n1mm_listenport", 12063))
+        if self.preference.get("send_n1mm_packets") and port in {
+            int(self.preference.get(f"n1mm_{name}port", 0))
+            for name in ("radio", "contact", "lookup", "score")
+        }:
+            self.infobox_append(
+                f"N1MM listen port {port} is one we send to, "
+                "our own packets will come back to us."
+            )
+        listener = N1MMListener(
+            self.db,
+            port,
+            int(self.power_selector.value()),
+            self.n1mm_status.finished.emit,
+        )
+        try:
+            listener.start()
+        except OSError as exception:
+            logger.warning("N1MM listener: %s", exception)
+            self.infobox_append(f"N1MM listener: {exception}")
+            return
+        logger.info("Listening for N1MM packets on %s", listener.port)
+        self.n1mm_listener = listener
+
     def writepreferences(self):
         """
         Write preferences to json file.
@@ -929,41 +1156,104 @@ class MainWindow(QtWidgets.QMainWindow):
             pass
         return False
 
+    def setup_lookup(self) -> None:
+        """
+        Make the callsign lookup the preferences ask for. Signing in to QRZ
+        or HamQTH can take a while, so it's done in the background and
+        lookup_ready() puts it to use.
+        """
+        self.look_up = None
+        self.QRZ_icon.setStyleSheet("color: rgb(136, 138, 133);")
+        username = self.preference.get("lookupusername")
+        password = self.preference.get("lookuppassword")
+        make = None
+        if self.preference.get("useqrz"):
+            make = partial(QRZlookup, username, password)
+        if self.preference.get("usehamdb"):
+            make = HamDBlookup
+        if self.preference.get("usehamqth"):
+            make = partial(HamQTH, username, password)
+        if make is None:
+            return
+        generation = self.network_generation
+
+        def sign_in():
+            try:
+                look_up = make()
+            except Exception as exception:  # pylint: disable=broad-except
+                logger.warning("Lookup: %s", exception)
+                return
+            self.network_status.lookup.emit(look_up, generation)
+
+        threading.Thread(target=sign_in, daemon=True).start()
+
+    def lookup_ready(self, look_up, generation: int) -> None:
+        """A lookup has signed in, use it unless the preferences have changed."""
+        if generation != self.network_generation:
+            return
+        self.look_up = look_up
+        if getattr(look_up, "session", True):
+            self.QRZ_icon.setStyleSheet("color: rgb(128, 128, 0);")
+        if self.preference.get("mycallsign"):
+            _thethread = threading.Thread(
+                target=self.lookupmygrid,
+                daemon=True,
+            )
+            _thethread.start()
+
     def cloudlogauth(self) -> None:
         """
-        Check if user has valid Cloudlog API key.
+        Check if user has valid Cloudlog API key, in the background.
+        cloudlog_checked() shows how it went.
         """
         self.cloudlog_icon.setPixmap(self.cloud_grey)
         self.cloudlogauthenticated = False
-        if self.preference.get("cloudlog"):
+        if not self.preference.get("cloudlog"):
+            return
+        self.cloudlog_icon.setPixmap(self.cloud_red)
+        test = (
+            self.preference.get("cloudlogurl")
+            + "/auth/"
+            + self.preference.get("cloudlogapi")
+        )
+        generation = self.network_generation
+
+        def check():
             try:
-                self.cloudlog_icon.setPixmap(self.cloud_red)
-                test = (
-                    self.preference.get("cloudlogurl")
-                    + "/auth/"
-                    + self.preference.get("cloudlogapi")
-                )
                 result = requests.get(test, params={}, timeout=2.0)
-                if result.status_code == 200 and result.text.find("<status>") > 0:
-                    if (
-                        result.text[
-                            result.text.find("<status>")
-                            + 8 : result.text.find("</status>")
-                        ]
-                        == "Valid"
-                    ):
-                        self.cloudlogauthenticated = True
-                        self.cloudlog_icon.setPixmap(self.cloud_green)
-                        logger.info("Cloudlog: Authenticated.")
-                else:
-                    logger.warning(
-                        "%s Unable to authenticate.\n%s", result.status_code, test
-                    )
             except requests.exceptions.RequestException as exception:
-                self.infobox.insertPlainText(
-                    f"****Cloudlog Auth Error:****\n{exception}\n"
-                )
                 logger.warning("Cloudlog: %s", exception)
+                self.network_status.cloudlog.emit(
+                    False, f"****Cloudlog Auth Error:****\n{exception}\n", generation
+                )
+                return
+            if result.status_code == 200 and result.text.find("<status>") > 0:
+                if (
+                    result.text[
+                        result.text.find("<status>") + 8 : result.text.find("</status>")
+                    ]
+                    == "Valid"
+                ):
+                    logger.info("Cloudlog: Authenticated.")
+                    self.network_status.cloudlog.emit(True, "", generation)
+                    return
+            else:
+                logger.warning(
+                    "%s Unable to authenticate.\n%s", result.status_code, test
+                )
+            self.network_status.cloudlog.emit(False, "", generation)
+
+        threading.Thread(target=check, daemon=True).start()
+
+    def cloudlog_checked(self, authenticated: bool, error: str, generation: int):
+        """The Cloudlog auth check is done."""
+        if generation != self.network_generation:
+            return
+        self.cloudlogauthenticated = authenticated
+        if authenticated:
+            self.cloudlog_icon.setPixmap(self.cloud_green)
+        if error:
+            self.infobox_append(error.rstrip("\n"))
 
     @staticmethod
     def fakefreq(band, mode):
@@ -973,25 +1263,7 @@ class MainWindow(QtWidgets.QMainWindow):
         Takes a band and mode as input and returns freq in khz.
         """
         logger.info("fakefreq: band:%s mode:%s", band, mode)
-        modes = {"CW": 0, "DG": 1, "PH": 2, "FT8": 1, "SSB": 2}
-        fakefreqs = {
-            "160": ["1830", "1805", "1840"],
-            "80": ["3530", "3559", "3970"],
-            "60": ["5332", "5373", "5405"],
-            "40": ["7030", "7040", "7250"],
-            "30": ["10130", "10130", "0000"],
-            "20": ["14030", "14070", "14250"],
-            "17": ["18080", "18100", "18150"],
-            "15": ["21065", "21070", "21200"],
-            "12": ["24911", "24920", "24970"],
-            "10": ["28065", "28070", "28400"],
-            "6": ["50030", "50300", "50125"],
-            "2": ["144030", "144144", "144250"],
-            "222": ["222100", "222070", "222100"],
-            "432": ["432070", "432200", "432100"],
-            "SAT": ["144144", "144144", "144144"],
-        }
-        freqtoreturn = fakefreqs[band][modes[mode]]
+        freqtoreturn = BANDPLAN.fakefreq(band, mode)
         logger.info("fakefreq: returning:%s", freqtoreturn)
         return freqtoreturn
 
@@ -1003,48 +1275,15 @@ class MainWindow(QtWidgets.QMainWindow):
         """
         logger.info("getband: %s %s", type(freq), freq)
         if freq.isnumeric():
-            frequency = int(float(freq))
-            if 2000000 > frequency > 1800000:
-                return "160"
-            if 4000000 > frequency > 3500000:
-                return "80"
-            if 5406000 > frequency > 5330000:
-                return "60"
-            if 7300000 > frequency > 7000000:
-                return "40"
-            if 10150000 > frequency > 10100000:
-                return "30"
-            if 14350000 > frequency > 14000000:
-                return "20"
-            if 18168000 > frequency > 18068000:
-                return "17"
-            if 21450000 > frequency > 21000000:
-                return "15"
-            if 24990000 > frequency > 24890000:
-                return "12"
-            if 29700000 > frequency > 28000000:
-                return "10"
-            if 54000000 > frequency > 50000000:
-                return "6"
-            if 148000000 > frequency > 144000000:
-                return "2"
-            if 225000000 > frequency > 222000000:
-                return "222"
-            if 450000000 > frequency > 420000000:
-                return "432"
-        else:
-            return "0"
+            return BANDPLAN.band(int(freq))
+        return "0"
 
     @staticmethod
     def getmode(rigmode: str) -> str:
         """
         Change what rigctld returned for the mode to the cabrillo mode for logging.
         """
-        if rigmode in ("CW", "CWR"):
-            return "CW"
-        if rigmode in ("USB", "LSB", "FM", "AM"):
-            return "PH"
-        return "DG"  # All else digital
+        return BANDPLAN.mode(rigmode)
 
     def setband(self, theband: str) -> None:
         """
@@ -1064,7 +1303,8 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def poll_radio(self) -> None:
         """
-        Poll rigctld to get band.
+        Pick up the band and mode of the focused radio. The radios are
+        polled in the background, this only reads what they last said.
         """
         if self.cat_control is None:
             self.radio_icon.setPixmap(self.radio_grey)
@@ -1072,18 +1312,6 @@ class MainWindow(QtWidgets.QMainWindow):
 
         if not self.cat_control.online:
             self.radio_icon.setPixmap(self.radio_red)
-            if self.preference.get("useflrig"):
-                self.cat_control = CAT(
-                    "flrig",
-                    self.preference.get("CAT_ip"),
-                    self.preference.get("CAT_port"),
-                )
-            if self.preference.get("userigctld"):
-                self.cat_control = CAT(
-                    "rigctld",
-                    self.preference.get("CAT_ip"),
-                    self.preference.get("CAT_port"),
-                )
         if self.cat_control.online:
             newfreq = self.cat_control.get_vfo()
             newmode = self.cat_control.get_mode()
@@ -1103,16 +1331,24 @@ class MainWindow(QtWidgets.QMainWindow):
                 # setpower(str(newpwr))
                 # self.setfreq(str(newfreq))
 
-            if self.preference.get("send_n1mm_packets"):
+        if self.preference.get("send_n1mm_packets"):
+            focused = str(self.cat_control.focused)
+            for number in self.cat_control.numbers:
+                radio = self.cat_control.state(number)
+                if not radio.get("online"):
+                    continue
                 self.n1mm.radio_info["StationName"] = self.preference.get(
                     "n1mm_station_name"
                 )
-                self.n1mm.radio_info["Freq"] = newfreq[:-1]
-                self.n1mm.radio_info["TXFreq"] = newfreq[:-1]
-                self.n1mm.radio_info["Mode"] = newmode
+                self.n1mm.radio_info["RadioNr"] = str(number)
+                self.n1mm.radio_info["FocusRadioNr"] = focused
+                self.n1mm.radio_info["ActiveRadioNr"] = focused
+                self.n1mm.radio_info["Freq"] = radio.get("vfo")[:-1]
+                self.n1mm.radio_info["TXFreq"] = radio.get("vfo")[:-1]
+                self.n1mm.radio_info["Mode"] = radio.get("mode")
                 self.n1mm.radio_info["OpCall"] = self.preference.get("mycallsign")
                 self.n1mm.radio_info["IsRunning"] = str(self.run_state)
-                if self.cat_control.get_ptt() == "0":
+                if str(radio.get("ptt")) == "0":
                     self.n1mm.radio_info["IsTransmitting"] = "False"
                 else:
                     self.n1mm.radio_info["IsTransmitting"] = "True"
@@ -1131,17 +1367,26 @@ class MainWindow(QtWidgets.QMainWindow):
         )
         app.processEvents()
 
-    def process_macro(self, macro: str) -> str:
-        """Process CW macro substitutions"""
-        macro = macro.upper()
+    def macro_values(self) -> dict:
+        """What the {FIELD}s in CW macros are filled in with."""
         if self.groupcall and self.connect_to_server:
-            macro = macro.replace("{MYCALL}", self.groupcall)
+            mycall = self.groupcall
         else:
-            macro = macro.replace("{MYCALL}", self.preference.get("mycallsign"))
-        macro = macro.replace("{MYCLASS}", self.preference.get("myclass"))
-        macro = macro.replace("{MYSECT}", self.preference.get("mysection"))
-        macro = macro.replace("{HISCALL}", self.callsign_entry.text())
-        return macro
+            mycall = self.preference.get("mycallsign")
+        return {
+            "MYCALL": mycall,
+            "MYCLASS": self.preference.get("myclass"),
+            "MYSECT": self.preference.get("mysection"),
+            "HISCALL": self.callsign_entry.text(),
+        }
+
+    def send_macro(self, fkey: str, button) -> None:
+        """Sends the CW macro on a function key."""
+        if self.cw:
+            if self.preference.get("send_n1mm_packets"):
+                self.n1mm.radio_info["FunctionKeyCaption"] = button.text()
+            if fkey in self.fkeys:
+                self.cw.sendcw(self.fkeys[fkey][1].render(self.macro_values()))
 
     def keyPressEvent(self, event):
         """This overrides Qt key event."""
@@ -1149,18 +1394,13 @@ class MainWindow(QtWidgets.QMainWindow):
         if event.key() == Qt.Key.Key_Escape:
             self.clearinputs()
             if self.cw is not None and modifier == Qt.ControlModifier:
-                if self.cw.servertype == 1:
-                    self.cw.sendcw("\x1b4")
+                self.cw.abort()
         if event.key() == Qt.Key.Key_PageUp:
             if self.cw is not None:
-                if self.cw.servertype == 1:
-                    self.cw.speed += 1
-                    self.cw.sendcw(f"\x1b2{self.cw.speed}")
+                self.cw.set_speed(self.cw.speed + 1)
         if event.key() == Qt.Key.Key_PageDown:
             if self.cw is not None:
-                if self.cw.servertype == 1:
-                    self.cw.speed -= 1
-                    self.cw.sendcw(f"\x1b2{self.cw.speed}")
+                self.cw.set_speed(self.cw.speed - 1)
         if event.key() == Qt.Key.Key_Tab:
             if self.section_entry.hasFocus():
                 logger.debug("From section")
@@ -1219,87 +1459,51 @@ class MainWindow(QtWidgets.QMainWindow):
 
     def sendf1(self):
         """Sends CW macro"""
-        if self.cw:
-            if self.preference.get("send_n1mm_packets"):
-                self.n1mm.radio_info["FunctionKeyCaption"] = self.F1.text()
-            self.cw.sendcw(self.process_macro(self.F1.toolTip()))
+        self.send_macro("F1", self.F1)
 
     def sendf2(self):
         """Sends CW macro"""
-        if self.cw:
-            if self.preference.get("send_n1mm_packets"):
-                self.n1mm.radio_info["FunctionKeyCaption"] = self.F2.text()
-            self.cw.sendcw(self.process_macro(self.F2.toolTip()))
+        self.send_macro("F2", self.F2)
 
     def sendf3(self):
         """Sends CW macro"""
-        if self.cw:
-            if self.preference.get("send_n1mm_packets"):
-                self.n1mm.radio_info["FunctionKeyCaption"] = self.F3.text()
-            self.cw.sendcw(self.process_macro(self.F3.toolTip()))
+        self.send_macro("F3", self.F3)
 
     def sendf4(self):
         """Sends CW macro"""
-        if self.cw:
-            if self.preference.get("send_n1mm_packets"):
-                self.n1mm.radio_info["FunctionKeyCaption"] = self.F4.text()
-            self.cw.sendcw(self.process_macro(self.F4.toolTip()))
+        self.send_macro("F4", self.F4)
 
     def sendf5(self):
         """Sends CW macro"""
-        if self.cw:
-            if self.preference.get("send_n1mm_packets"):
-                self.n1mm.radio_info["FunctionKeyCaption"] = self.F5.text()
-            self.cw.sendcw(self.process_macro(self.F5.toolTip()))
+        self.send_macro("F5", self.F5)
 
     def sendf6(self):
         """Sends CW macro"""
-        if self.cw:
-            if self.preference.get("send_n1mm_packets"):
-                self.n1mm.radio_info["FunctionKeyCaption"] = self.F6.text()
-            self.cw.sendcw(self.process_macro(self.F6.toolTip()))
+        self.send_macro("F6", self.F6)
 
     def sendf7(self):
         """Sends CW macro"""
-        if self.cw:
-            if self.preference.get("send_n1mm_packets"):
-                self.n1mm.radio_info["FunctionKeyCaption"] = self.F7.text()
-            self.cw.sendcw(self.process_macro(self.F7.toolTip()))
+        self.send_macro("F7", self.F7)
 
     def sendf8(self):
         """Sends CW macro"""
-        if self.cw:
-            if self.preference.get("send_n1mm_packets"):
-                self.n1mm.radio_info["FunctionKeyCaption"] = self.F8.text()
-            self.cw.sendcw(self.process_macro(self.F8.toolTip()))
+        self.send_macro("F8", self.F8)
 
     def sendf9(self):
         """Sends CW macro"""
-        if self.cw:
-            if self.preference.get("send_n1mm_packets"):
-                self.n1mm.radio_info["FunctionKeyCaption"] = self.F9.text()
-            self.cw.sendcw(self.process_macro(self.F9.toolTip()))
+        self.send_macro("F9", self.F9)
 
     def sendf10(self):
         """Sends CW macro"""
-        if self.cw:
-            if self.preference.get("send_n1mm_packets"):
-                self.n1mm.radio_info["FunctionKeyCaption"] = self.F10.text()
-            self.cw.sendcw(self.process_macro(self.F10.toolTip()))
+        self.send_macro("F10", self.F10)
 
     def sendf11(self):
         """Sends CW macro"""
-        if self.cw:
-            if self.preference.get("send_n1mm_packets"):
-                self.n1mm.radio_info["FunctionKeyCaption"] = self.F11.text()
-            self.cw.sendcw(self.process_macro(self.F11.toolTip()))
+        self.send_macro("F11", self.F11)
 
     def sendf12(self):
         """Sends CW macro"""
-        if self.cw:
-            if self.preference.get("send_n1mm_packets"):
-                self.n1mm.radio_info["FunctionKeyCaption"] = self.F12.text()
-            self.cw.sendcw(self.process_macro(self.F12.toolTip()))
+        self.send_macro("F12", self.F12)
 
     def clearinputs(self):
         """Clears the text input fields and sets focus to callsign field."""
@@ -1341,6 +1545,8 @@ class MainWindow(QtWidgets.QMainWindow):
         """
         self.preference["power"] = str(self.power_selector.value())
         self.oldrfpower = self.preference.get("power")
+        if self.n1mm_listener is not None:
+            self.n1mm_listener.power = int(self.power_selector.value())
         self.writepreferences()
 
     def changemycall(self):
@@ -1457,6 +1663,15 @@ class MainWindow(QtWidgets.QMainWindow):
             if text[1] == "L":
                 self.generate_logs()
                 return
+            if text[1] == "I":
+                self.import_log()
+                return
+            if text[1] == "R":
+                try:
+                    self.focus_radio(int(text[2:]))
+                except ValueError:
+                    pass
+                return
             if text[1] == "H":
                 pass  # help
             if text[1] == "":
@@ -1583,6 +1798,7 @@ class MainWindow(QtWidgets.QMainWindow):
             self.contactlookup.get("name"),
             self.run_state,
             unique_id,
+            self.radio_number(),
         )
         self.db.log_contact(contact)
         stale = datetime.now() + timedelta(seconds=30)
@@ -1604,7 +1820,7 @@ class MainWindow(QtWidgets.QMainWindow):
                 "expire": stale.isoformat(),
             }
             self.server_commands.append(contact)
-            bytesToSend = bytes(dumps(contact), encoding="ascii")
+            bytesToSend = self.wire.encode(contact)
             try:
                 self.server_udp.sendto(
                     bytesToSend, (self.multicast_group, int(self.multicast_port))
@@ -1632,14 +1848,21 @@ class MainWindow(QtWidgets.QMainWindow):
             self.n1mm.contact_info["name"] = self.contactlookup.get("name")
             self.n1mm.contact_info["power"] = self.power_selector.value()
             self.n1mm.contact_info["ID"] = unique_id
+            self.n1mm.contact_info["radionr"] = str(self.radio_number())
             self.n1mm.send_contact_info()
 
         self.sections()
         self.stats()
-        self.updatemarker()
+        self.updatemarker(self.contactlookup.get("grid"))
         self.logwindow()
         self.clearinputs()
-        self.postcloudlog()
+        self.postcloudlog(unique_id)
+
+    def radio_number(self) -> int:
+        """The number of the focused radio, 1 without CAT control."""
+        if self.cat_control is None:
+            return 1
+        return self.cat_control.focused
 
     def stats(self) -> None:
         """
@@ -1658,35 +1881,16 @@ class MainWindow(QtWidgets.QMainWindow):
         self.QSO_Last15.setText(str(last15))
         self.QSO_PerHour.setText(str(lasthour))
         self.bandmodemult = bandmodemult
-        self.QSO_Points.setText(str(self.calcscore()))
+        self.QSO_Points.setText(str(self.calcscore(results)))
 
-    def calcscore(self) -> int:
+    def calcscore(self, results: dict = None) -> int:
         """
         Return our current score based on operating power,
         band / mode multipliers and types of contacts.
         """
-        results = self.db.stats()
-        cw = results.get("cwcontacts")
-        ph = results.get("phonecontacts")
-        di = results.get("digitalcontacts")
-        bandmodemult = results.get("bandmodemult")
-        # highpower = results.get("highpower")
-        qrp = results.get("qrp")
-        self.score = (int(cw) * 2) + int(ph) + (int(di) * 2)
-        self.basescore = self.score
-        if qrp:
-            self.score = self.score * 2
-        # elif not highpower:
-        #     self.score = self.score * 1
-        self.score = self.score * bandmodemult
-        self.score = (
-            self.score
-            + (500 * self.preference.get("altpower"))
-            + (500 * self.preference.get("outdoors"))
-            + (500 * self.preference.get("notathome"))
-            + (500 * self.preference.get("satellite"))
-            + (500 * self.preference.get("antenna"))
-        )
+        if results is None:
+            results = self.db.stats()
+        self.basescore, self.powermult, self.score = calcscore(results, self.preference)
         return self.score
 
     def logwindow(self):
@@ -1714,8 +1918,10 @@ class MainWindow(QtWidgets.QMainWindow):
         """
         Perform functions after QSO edited or deleted.
         """
+        self.adif_log.invalidate()
         self.sections()
         self.stats()
+        self.markers.reload()
         self.logwindow()
 
     def qsoclicked(self):
@@ -1753,7 +1959,7 @@ class MainWindow(QtWidgets.QMainWindow):
         Shows you the possible section matches based on
         what you have typed in the section input filed.
         """
-        self.infobox.clear()
+        self.infobox_clear()
         self.infobox.setTextColor(QtGui.QColor(211, 215, 207))
         self.section_entry.setStyleSheet("color: rgb(211, 215, 207);")
         sec = self.section_entry.text()
@@ -1766,7 +1972,7 @@ class MainWindow(QtWidgets.QMainWindow):
         if (len(xx) == 0) and (sec != "^"):
             self.section_entry.setStyleSheet("color: rgb(255, 0, 0);")
         for xxx in xx:
-            self.infobox.insertPlainText(self.secName[xxx] + "\n")
+            self.infobox_append(self.secName[xxx], lookup=True)
 
     def read_scp(self):
         """
@@ -1784,18 +1990,18 @@ class MainWindow(QtWidgets.QMainWindow):
         """
         Performs a supercheck partial on the callsign entered in the field.
         """
-        self.infobox.clear()
+        self.infobox_clear()
         self.infobox.setTextColor(QtGui.QColor(211, 215, 207))
         acall = self.callsign_entry.text()
         if len(acall) > 2:
             matches = list(filter(lambda x: x.startswith(acall), self.scp))
-            for match in matches:
-                self.infobox.insertPlainText(match + " ")
+            if matches:
+                self.infobox_append(" ".join(matches), lookup=True)
 
     def dup_check(self) -> None:
         """checks to see if a contact you're entering will be a dup."""
         acall = self.callsign_entry.text()
-        self.infobox.clear()
+        self.infobox_clear()
         log = self.db.dup_check(acall)
         for contact in log:
             hiscall = contact.get("callsign")
@@ -1808,13 +2014,14 @@ class MainWindow(QtWidgets.QMainWindow):
             if len(self.section_entry.text()) == 0:
                 self.section_entry.setText(hissection)
             dupetext = ""
+            color = QtGui.QColor(211, 215, 207)
             if hisband == self.band and hismode == self.mode:
                 self.flash()
-                self.infobox.setTextColor(QtGui.QColor(245, 121, 0))
+                color = QtGui.QColor(245, 121, 0)
                 dupetext = " DUP!!!"
-            else:
-                self.infobox.setTextColor(QtGui.QColor(211, 215, 207))
-            self.infobox.insertPlainText(f"{hiscall}: {hisband} {hismode}{dupetext}\n")
+            self.infobox_append(
+                f"{hiscall}: {hisband} {hismode}{dupetext}", color, lookup=True
+            )
 
     def sections_worked(self) -> None:
         """Generates a list of sections worked."""
@@ -1988,52 +2195,6 @@ class MainWindow(QtWidgets.QMainWindow):
         self.writepreferences()
         self.stats()
 
-    def get_band_mode_tally(self, band, mode):
-        """
-        Returns the amount of contacts and the maximum power
-        used for a particular band/mode combination.
-        """
-        return self.db.get_band_mode_tally(band, mode)
-
-    def getbands(self) -> list:
-        """
-        Returns a list of bands worked, and an empty list if none worked.
-        """
-        bandlist = []
-        result = self.db.get_bands()
-        if result:
-            for returned_band in result:
-                bandlist.append(returned_band.get("band"))
-            return bandlist
-        return []
-
-    def generate_band_mode_tally(self) -> None:
-        """
-        Creates a Statistics.txt file when the Generate Logs button
-        is pressed. Containing a breakdown of the bands and modes
-        used.
-        """
-        bandlist = self.getbands()
-        try:
-            with open("Statistics.txt", "w", encoding="utf-8") as file_descriptor:
-                print("\t\tCW\tPWR\tDG\tPWR\tPH\tPWR", end="\r\n", file=file_descriptor)
-                print("-" * 60, end="\r\n", file=file_descriptor)
-                for band in self.bands:
-                    if band in bandlist:
-                        cwt = self.get_band_mode_tally(band, "CW")
-                        dit = self.get_band_mode_tally(band, "DG")
-                        pht = self.get_band_mode_tally(band, "PH")
-                        print(
-                            f"Band:\t{band}\t{cwt.get('tally')}\t{cwt.get('mpow')}\t"
-                            f"{dit.get('tally')}\t{dit.get('mpow')}\t"
-                            f"{pht.get('tally')}\t{pht.get('mpow')}",
-                            end="\r\n",
-                            file=file_descriptor,
-                        )
-                        print("-" * 60, end="\r\n", file=file_descriptor)
-        except IOError as exception:
-            logger.critical("generate_band_mode_tally: write error: %s", exception)
-
     def get_state(self, section):
         """
         Returns the US state a section is in, or Bool False if none was found.
@@ -2044,436 +2205,160 @@ class MainWindow(QtWidgets.QMainWindow):
             return state
         return False
 
-    def gridtolatlon(self, maiden):
+    @staticmethod
+    def gridtolatlon(maiden):
         """
         Converts a maidenhead gridsquare to a latitude longitude pair.
         """
-        maiden = str(maiden).strip().upper()
-
-        chars_in_grid_square = len(maiden)
-        if not 8 >= chars_in_grid_square >= 2 and chars_in_grid_square % 2 == 0:
-            return 0, 0
-
-        lon = (ord(maiden[0]) - 65) * 20 - 180
-        lat = (ord(maiden[1]) - 65) * 10 - 90
+        return geometry.gridtolatlon(maiden)
 
-        if chars_in_grid_square >= 4:
-            lon += (ord(maiden[2]) - 48) * 2
-            lat += ord(maiden[3]) - 48
-
-        if chars_in_grid_square >= 6:
-            lon += (ord(maiden[4]) - 65) / 12 + 1 / 24
-            lat += (ord(maiden[5]) - 65) / 24 + 1 / 48
-
-        if chars_in_grid_square >= 8:
-            lon += (ord(maiden[6])) * 5.0 / 600
-            lat += (ord(maiden[7])) * 2.5 / 600
+    def updatemarker(self, grid: str) -> None:
+        """
+        Adds the grid just logged to the xplanet marker file, nothing to do
+        if the contact has no grid. The file is written a moment later, once
+        for a burst of contacts.
+        """
+        if grid:
+            self.markers.add(grid)
 
-        return lat, lon
+    def marker_failed(self, message: str) -> None:
+        """The marker file couldn't be written."""
+        self.infobox_append(message, QtGui.QColor(245, 121, 0))
 
-    def updatemarker(self):
+    def postcloudlog(self, unique_id: str) -> None:
         """
-        Updates the xplanet marker file with a list of logged contact lat & lon
+        Log contact to Cloudlog: https://github.com/magicbug/Cloudlog
+        It's queued and uploaded in the background, and kept until it is.
         """
-        if self.preference.get("usemarker"):
-            filename = str(Path.home()) + "/" + self.preference.get("markerfile")
-            logger.info("%s", filename)
-            try:
-                grids = self.db.get_unique_grids()
-                if grids:
-                    lastcolor = ""
-                    with open(filename, "w", encoding="ascii") as file_descriptor:
-                        islast = len(grids) - 1
-                        for count, grid in enumerate(grids):
-                            if count == islast:
-                                lastcolor = "color=Orange"
-                            if len(grid.get("grid")) > 1:
-                                lat, lon = self.gridtolatlon(grid.get("grid"))
-                                print(
-                                    f'{lat} {lon} "" {lastcolor}',
-                                    end="\r\n",
-                                    file=file_descriptor,
-                                )
-            except IOError as exception:
-                logger.warning(
-                    "updatemarker: error %s writing to %s", exception, filename
-                )
-                self.infobox.setTextColor(QtGui.QColor(245, 121, 0))
-                self.infobox.insertPlainText(f"Unable to write to {filename}\n")
+        if self.preference.get("cloudlog"):
+            self.cloudlog.enqueue(unique_id)
 
-    def adif(self):
+    def cloudlog_changed(self, uploaded: bool, message: str) -> None:
+        """Cloudlog uploads started working, stopped, or a contact was refused."""
+        if uploaded:
+            self.cloudlog_icon.setPixmap(self.cloud_green)
+            return
+        self.cloudlog_icon.setPixmap(self.cloud_red)
+        waiting, rejected = self.db.outbox_count()
+        self.infobox_append(f"{message}\n{waiting} waiting, {rejected} refused")
+
+    def generate_logs(self):
         """
-        Creates an ADIF file of the contacts made.
+        Called when the user presses the Generate Logs button.
+        The Cabrillo, ADIF and Statistics files are written in the background
+        from a fresh backup of the log, so logging can carry on meanwhile.
         """
-        logname = "WFD.adi"
+        if self.log_export.running():
+            self.infobox_append("Already generating logs.")
+            return
+        self.infobox_clear()
         self.infobox.setTextColor(QtGui.QColor(211, 215, 207))
-        self.infobox.insertPlainText(f"Saving ADIF to: {logname}\n")
-        app.processEvents()
-        log = self.db.fetch_all_contacts_asc()
-        grid = False
-        opname = False
-        try:
-            with open(logname, "w", encoding="utf-8") as file_descriptor:
-                print("<ADIF_VER:5>2.2.0", end="\r\n", file=file_descriptor)
-                print("<EOH>", end="\r\n", file=file_descriptor)
-                for contact in log:
-                    hiscall = contact.get("callsign")
-                    hisclass = contact.get("class")
-                    hissection = contact.get("section")
-                    the_date_and_time = contact.get("date_time")
-                    band = contact.get("band")
-                    mode = contact.get("mode")
-                    grid = contact.get("grid")
-                    opname = contact.get("opname")
-                    frequency = contact.get("frequency")
-                    if frequency == 0:
-                        frequency = f"{int(self.fakefreq(band, mode)) / 1000:.3f}"
-                    else:
-                        frequency = f"{int(frequency) / 1000000:.3f}"
-                    if mode == "DG":
-                        mode = "RTTY"
-                    if mode == "PH":
-                        mode = "SSB"
-                    if mode == "CW":
-                        rst = "599"
-                    else:
-                        rst = "59"
-                    loggeddate = the_date_and_time[:10]
-                    loggedtime = the_date_and_time[11:13] + the_date_and_time[14:16]
-                    print(
-                        f"<QSO_DATE:{len(''.join(loggeddate.split('-')))}:d>"
-                        f"{''.join(loggeddate.split('-'))}",
-                        end="\r\n",
-                        file=file_descriptor,
-                    )
-                    print(
-                        f"<TIME_ON:{len(loggedtime)}>{loggedtime}",
-                        end="\r\n",
-                        file=file_descriptor,
-                    )
-                    print(
-                        f"<CALL:{len(hiscall)}>{hiscall}",
-                        end="\r\n",
-                        file=file_descriptor,
-                    )
-                    print(f"<MODE:{len(mode)}>{mode}", end="\r\n", file=file_descriptor)
-                    print(
-                        f"<BAND:{len(band + 'M')}>{band + 'M'}",
-                        end="\r\n",
-                        file=file_descriptor,
-                    )
-                    try:
-                        print(
-                            f"<FREQ:{len(frequency)}>{frequency}",
-                            end="\r\n",
-                            file=file_descriptor,
-                        )
-                    except TypeError:
-                        pass  # This is bad form... I can't remember why this is in a try block
-                    print(
-                        f"<RST_SENT:{len(rst)}>{rst}", end="\r\n", file=file_descriptor
-                    )
-                    print(
-                        f"<RST_RCVD:{len(rst)}>{rst}", end="\r\n", file=file_descriptor
-                    )
-                    myexch = f"{self.preference.get('myclass')} {self.preference.get('mysection')}"
-                    print(
-                        f"<STX_STRING:{len(myexch)}>{myexch}",
-                        end="\r\n",
-                        file=file_descriptor,
-                    )
-                    hisexch = f"{hisclass} {hissection}"
-                    print(
-                        f"<SRX_STRING:{len(hisexch)}>{hisexch}",
-                        end="\r\n",
-                        file=file_descriptor,
-                    )
-                    print(
-                        f"<ARRL_SECT:{len(hissection)}>{hissection}",
-                        end="\r\n",
-                        file=file_descriptor,
-                    )
-                    print(
-                        f"<CLASS:{len(hisclass)}>{hisclass}",
-                        end="\r\n",
-                        file=file_descriptor,
-                    )
-                    state = self.get_state(hissection)
-                    if state:
-                        print(
-                            f"<STATE:{len(state)}>{state}",
-                            end="\r\n",
-                            file=file_descriptor,
-                        )
-                    if len(grid) > 1:
-                        print(
-                            f"<GRIDSQUARE:{len(grid)}>{grid}",
-                            end="\r\n",
-                            file=file_descriptor,
-                        )
-                    if len(opname) > 1:
-                        print(
-                            f"<NAME:{len(opname)}>{opname}",
-                            end="\r\n",
-                            file=file_descriptor,
+        self.resolve_dirty_records()
+        self.show_dirty_records()
+        self.genLogButton.setEnabled(False)
+        preference = dict(self.preference)
+        cabrillo_name = f"{preference.get('mycallsign').upper()}.log"
+        myexch = f"{preference.get('myclass')} {preference.get('mysection')}"
+
+        def write_cabrillo(snapshot):
+            cabrillo(cabrillo_name, preference, snapshot, self.fakefreq)
+            return f"Saved cabrillo to: {cabrillo_name}"
+
+        mygrid = self.mygrid
+
+        def write_statistics(snapshot):
+            statistics("Statistics.txt", self.bands, snapshot, mygrid)
+            return "Saved Statistics.txt"
+
+        def write_adif(snapshot):
+            count = self.adif_log.export(snapshot, myexch)
+            return f"Saved ADIF to: {self.adif_log.filename}, {count} new contacts"
+
+        self.log_export.start(
+            self.backup,
+            [
+                (
+                    "Cabrillo",
+                    cabrillo_name,
+                    tuple(
+                        preference.get(name)
+                        for name in (
+                            "mycallsign",
+                            "myclass",
+                            "mysection",
+                            "altpower",
+                            "outdoors",
+                            "notathome",
+                            "satellite",
+                            "antenna",
                         )
-                    comment = "WFD"
-                    print(
-                        f"<COMMENT:{len(comment)}>{comment}",
-                        end="\r\n",
-                        file=file_descriptor,
-                    )
-                    print("<EOR>", end="\r\n", file=file_descriptor)
-                    print("", end="\r\n", file=file_descriptor)
-        except IOError as exception:
-            logger.critical("adif: IO error: %s", exception)
-        self.infobox.insertPlainText("Done\n\n")
-        app.processEvents()
+                    ),
+                    write_cabrillo,
+                ),
+                (
+                    "Statistics",
+                    "Statistics.txt",
+                    (self.bands, mygrid),
+                    write_statistics,
+                ),
+                ("ADIF", self.adif_log.filename, myexch, write_adif),
+            ],
+        )
 
-    def postcloudlog(self):
-        """
-        Log contact to Cloudlog: https://github.com/magicbug/Cloudlog
-        """
-        if (not self.preference.get("cloudlog")) or (not self.cloudlogauthenticated):
+    def import_log(self):
+        """Ask for an ADIF or Cabrillo file and import it in the background."""
+        if self._importing is not None and self._importing.is_alive():
+            self.infobox_append("Already importing.")
             return
-        contact = self.db.fetch_last_contact()
-
-        hiscall = contact.get("callsign")
-        hisclass = contact.get("class")
-        hissection = contact.get("section")
-        the_date_and_time = contact.get("date_time")
-        band = contact.get("band")
-        mode = contact.get("mode")
-        grid = contact.get("grid")
-        opname = contact.get("opname")
-        frequency = contact.get("frequency")
-        if frequency == 0:
-            frequency = f"{int(self.fakefreq(band, mode)) / 1000:.3f}"
-        else:
-            frequency = f"{int(frequency) / 1000000:.3f}"
-
-        logger.info("%s", contact)
-        if mode == "DG":
-            mode = "RTTY"
-        if mode == "PH":
-            mode = "SSB"
-        if mode == "CW":
-            rst = "599"
-        else:
-            rst = "59"
-        loggeddate = the_date_and_time[:10]
-        loggedtime = the_date_and_time[11:13] + the_date_and_time[14:16]
-        stx = (
-            f"{self.preference.get('myclass') + ' ' + self.preference.get('mysection')}"
-        )
-        adifq = (
-            f"<QSO_DATE:{len(''.join(loggeddate.split('-')))}:d>"
-            f"{''.join(loggeddate.split('-'))}"
-            f"<TIME_ON:{len(loggedtime)}>{loggedtime}"
-            f"<CALL:{len(hiscall)}>{hiscall}"
-            f"<MODE:{len(mode)}>{mode}"
-            f"<BAND:{len(band + 'M')}>{band + 'M'}"
-            f"<FREQ:{len(frequency)}>{frequency}"
-            f"<RST_SENT:{len(rst)}>{rst}"
-            f"<RST_RCVD:{len(rst)}>{rst}"
-            f"<STX_STRING:{len(stx)}>"
-            f"{stx}"
-            f"<SRX_STRING:{len(hisclass + ' ' + hissection)}>"
-            f"{hisclass + ' ' + hissection}"
-            f"<ARRL_SECT:{len(hissection)}>{hissection}"
-            f"<CLASS:{len(hisclass)}>{hisclass}"
+        filename, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self,
+            "Import contacts",
+            os.getcwd(),
+            "ADIF or Cabrillo (*.adi *.adif *.log *.cbr);;All files (*)",
         )
-        state = self.get_state(hissection)
-        if state:
-            adifq += f"<STATE:{len(state)}>{state}"
-        if len(grid) > 1:
-            adifq += f"<GRIDSQUARE:{len(grid)}>{grid}"
-        if len(opname) > 1:
-            adifq += f"<NAME:{len(opname)}>{opname}"
-        comment = "Winter Field Day"
-        adifq += f"<COMMENT:{len(comment)}>{comment}"
-        adifq += "<EOR>"
-
-        payload_dict = {
-            "key": self.preference.get("cloudlogapi", ""),
-            "station_profile_id": self.preference.get("cloudlogstationid", ""),
-            "type": "adif",
-            "string": adifq,
-        }
-        jason_data = dumps(payload_dict)
-        _ = requests.post(
-            self.preference.get("cloudlogurl") + "/qso/", jason_data, timeout=5
+        if not filename:
+            return
+        self.infobox.setTextColor(QtGui.QColor(211, 215, 207))
+        self.infobox_append(f"Importing {filename}")
+        self._importing = threading.Thread(
+            target=self.import_worker,
+            args=(filename, self.power_selector.value()),
+            daemon=True,
         )
+        self._importing.start()
 
-    def cabrillo(self):
-        """
-        Generates a cabrillo log file.
-        """
-        filename = f"{self.preference.get('mycallsign').upper()}.log"
-        self.infobox.setTextColor(QtGui.QColor(211, 215, 207))
-        self.infobox.insertPlainText(f"Saving cabrillo to: {filename}")
-        app.processEvents()
-        bonuses = 0
-        log = self.db.fetch_all_contacts_asc()
-        catpower = ""
-        result = self.db.stats()
-        highpower = result.get("highpower")
-        qrp = result.get("qrp")
-        self.powermult = 1
-        if qrp:
-            catpower = "QRP"
-            self.powermult = 2
-        elif highpower:
-            catpower = "HIGH"
-            self.powermult = 0
-        else:
-            catpower = "LOW"
+    def import_worker(self, filename: str, power: int):
+        """Runs in its own thread, imports a file and reports how it went."""
         try:
-            with open(filename, "w", encoding="ascii") as file_descriptor:
-                print("START-OF-LOG: 3.0", end="\r\n", file=file_descriptor)
-                print(
-                    "CREATED-BY: K6GTE Winter Field Day Logger",
-                    end="\r\n",
-                    file=file_descriptor,
-                )
-                print("CONTEST: WFD", end="\r\n", file=file_descriptor)
-                print(
-                    f"CALLSIGN: {self.preference.get('mycallsign')}",
-                    end="\r\n",
-                    file=file_descriptor,
-                )
-                print("LOCATION:", end="\r\n", file=file_descriptor)
-                print(
-                    f"ARRL-SECTION: {self.preference.get('mysection')}",
-                    end="\r\n",
-                    file=file_descriptor,
-                )
-                print(
-                    f"CATEGORY: {self.preference.get('myclass')}",
-                    end="\r\n",
-                    file=file_descriptor,
-                )
-                print(f"CATEGORY-POWER: {catpower}", end="\r\n", file=file_descriptor)
-                print(
-                    f"SOAPBOX: QSO Points {self.basescore}",
-                    end="\r\n",
-                    file=file_descriptor,
-                )
-                print(
-                    f"SOAPBOX: Power Output Multiplier {self.powermult}",
-                    end="\r\n",
-                    file=file_descriptor,
-                )
-                print(
-                    f"SOAPBOX: Band/mode multiplier {self.bandmodemult}",
-                    end="\r\n",
-                    file=file_descriptor,
-                )
-                if self.preference.get("altpower"):
-                    print(
-                        "SOAPBOX: 500 points for not using commercial power",
-                        end="\r\n",
-                        file=file_descriptor,
-                    )
-                    bonuses += 500
-                if self.preference.get("outdoors"):
-                    print(
-                        "SOAPBOX: 500 points for setting up outdoors",
-                        end="\r\n",
-                        file=file_descriptor,
-                    )
-                    bonuses += 500
-                if self.preference.get("notathome"):
-                    print(
-                        "SOAPBOX: 500 points for setting up away from home",
-                        end="\r\n",
-                        file=file_descriptor,
-                    )
-                    bonuses += 500
-                if self.preference.get("satellite"):
-                    print(
-                        "SOAPBOX: 500 points for working satellite",
-                        end="\r\n",
-                        file=file_descriptor,
-                    )
-                    bonuses += 500
-                if self.preference.get("antenna"):
-                    print(
-                        "SOAPBOX: 500 points for setting up WFD antenna",
-                        end="\r\n",
-                        file=file_descriptor,
-                    )
-                    bonuses += 500
-
-                print(
-                    f"SOAPBOX: BONUS Total {bonuses}", end="\r\n", file=file_descriptor
-                )
-                print(
-                    f"CLAIMED-SCORE: {self.calcscore()}",
-                    end="\r\n",
-                    file=file_descriptor,
-                )
-                print(
-                    f"OPERATORS: {self.preference.get('mycallsign')}",
-                    end="\r\n",
-                    file=file_descriptor,
-                )
-                print("NAME: ", end="\r\n", file=file_descriptor)
-                print("ADDRESS: ", end="\r\n", file=file_descriptor)
-                print("ADDRESS-CITY: ", end="\r\n", file=file_descriptor)
-                print("ADDRESS-STATE: ", end="\r\n", file=file_descriptor)
-                print("ADDRESS-POSTALCODE: ", end="\r\n", file=file_descriptor)
-                print("ADDRESS-COUNTRY: ", end="\r\n", file=file_descriptor)
-                print("EMAIL: ", end="\r\n", file=file_descriptor)
-                for contact in log:
-                    hiscall = contact.get("callsign")
-                    hisclass = contact.get("class")
-                    hissection = contact.get("section")
-                    the_date_and_time = contact.get("date_time")
-                    band = contact.get("band")
-                    mode = contact.get("mode")
-                    frequency = contact.get("frequency")
-                    if frequency == 0:
-                        frequency = self.fakefreq(band, mode)
-                    else:
-                        frequency = f"{int(frequency / 1000)}"
-
-                    loggeddate = the_date_and_time[:10]
-                    loggedtime = the_date_and_time[11:13] + the_date_and_time[14:16]
-                    print(
-                        f"QSO: {frequency} {mode} {loggeddate} {loggedtime}"
-                        f" {self.preference.get('mycallsign')}"
-                        f" {self.preference.get('myclass')}"
-                        f" {self.preference.get('mysection')} "
-                        f"{hiscall} {hisclass} {hissection}",
-                        end="\r\n",
-                        file=file_descriptor,
-                    )
-                print("END-OF-LOG:", end="\r\n", file=file_descriptor)
-        except IOError as exception:
-            logger.critical(
-                "cabrillo: IO error: %s, writing to %s", exception, filename
-            )
-            self.infobox.insertPlainText(" Failed\n\n")
-            app.processEvents()
+            read, added, errors = Importer(self.db, power).import_file(filename)
+        except (IOError, sqlite3.Error) as exception:
+            logger.warning("import: %s", exception)
+            self.import_status.message.emit(f"Import failed: {exception}")
             return
-        self.infobox.insertPlainText(" Done\n\n")
-        app.processEvents()
+        self.import_status.finished.emit()
+        for number, reason in errors:
+            logger.warning("import: %s record %s: %s", filename, number, reason)
+        for number, reason in errors[:10]:
+            self.import_status.message.emit(f"Record {number}: {reason}")
+        if len(errors) > 10:
+            self.import_status.message.emit(
+                f"and {len(errors) - 10} more, see the debug log"
+            )
+        self.import_status.message.emit(
+            f"Read {read}, added {added}, {len(errors)} errors\n"
+        )
 
-    def generate_logs(self):
-        """Called when the user presses the Generate Logs button."""
-        self.infobox.clear()
+    def logs_generated(self):
+        """Called when the Generate Logs thread is done."""
+        self.genLogButton.setEnabled(True)
         self.show_dirty_records()
-        self.resolve_dirty_records()
-        self.cabrillo()
-        self.generate_band_mode_tally()
-        self.adif()
+        self.infobox_append("Done\n")
         if self.connect_to_server:
             update = {
                 "cmd": "LOG",
                 "station": self.preference.get("mycallsign"),
             }
-            bytesToSend = bytes(dumps(update), encoding="ascii")
+            bytesToSend = self.wire.encode(update)
             try:
                 self.server_udp.sendto(
                     bytesToSend, (self.multicast_group, int(self.multicast_port))
@@ -2552,7 +2437,7 @@ class EditQsoDialog(QtWidgets.QDialog):
             command["opname"] = self.contact.get("opname")
             command["grid"] = self.contact.get("grid")
             window.server_commands.append(command)
-            bytesToSend = bytes(dumps(command), encoding="ascii")
+            bytesToSend = window.wire.encode(command)
             try:
                 window.server_udp.sendto(
                     bytesToSend, (window.multicast_group, int(window.multicast_port))
@@ -2595,7 +2480,7 @@ class EditQsoDialog(QtWidgets.QDialog):
             ).upper()
             command["expire"] = stale.isoformat()
             window.server_commands.append(command)
-            bytesToSend = bytes(dumps(command), encoding="ascii")
+            bytesToSend = window.wire.encode(command)
             try:
                 window.server_udp.sendto(
                     bytesToSend, (window.multicast_group, int(window.multicast_port))
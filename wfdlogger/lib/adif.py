@@ -0,0 +1,197 @@
+"""
+K6GTE, ADIF log writer
+Email: michael.bridak@gmail.com
+GPL V3
+"""
+
+import logging
+import os
+from itertools import islice
+from json import dumps, loads, JSONDecodeError
+
+if __name__ == "__main__":
+    print("I'm not the program you are looking for.")
+
+
+class ADIF:
+    """
+    Writes contacts to an ADIF file.
+
+    Contacts are streamed from the database and written in chunks. A full
+    export goes to a temp file which is renamed over the log, so a reader
+    never sees half a file. An incremental export appends only the
+    contacts added since the last export, tracked by a watermark kept next
+    to the log. Anything that could make the existing file wrong, like an
+    edited or deleted contact, calls invalidate() to force a full export.
+
+    get_state, function returning the US state for a section or False.
+    fakefreq, function returning a frequency in khz for a band and mode.
+    """
+
+    chunk_size = 256
+
+    def __init__(self, filename: str, get_state, fakefreq) -> None:
+        self.filename = filename
+        self.watermark_file = f"{filename}.watermark"
+        self.get_state = get_state
+        self.fakefreq = fakefreq
+        self.generation = 0
+
+    @staticmethod
+    def field(tag: str, value: str) -> str:
+        """One ADIF field, on its own line."""
+        return f"<{tag}:{len(value)}>{value}\r\n"
+
+    def record(self, contact: dict, myexch: str, comment: str = "WFD") -> str:
+        """Returns the ADIF record for a contact."""
+        hiscall = contact.get("callsign")
+        hisclass = contact.get("class")
+        hissection = contact.get("section")
+        the_date_and_time = contact.get("date_time")
+        band = contact.get("band")
+        mode = contact.get("mode")
+        grid = contact.get("grid")
+        opname = contact.get("opname")
+        frequency = contact.get("frequency")
+        if frequency == 0:
+            frequency = f"{int(self.fakefreq(band, mode)) / 1000:.3f}"
+        else:
+            frequency = f"{int(frequency) / 1000000:.3f}"
+        if mode == "DG":
+            mode = "RTTY"
+        if mode == "PH":
+            mode = "SSB"
+        if mode == "CW":
+            rst = "599"
+        else:
+            rst = "59"
+        loggeddate = "".join(the_date_and_time[:10].split("-"))
+        loggedtime = the_date_and_time[11:13] + the_date_and_time[14:16]
+        fields = [
+            f"<QSO_DATE:{len(loggeddate)}:d>{loggeddate}\r\n",
+            self.field("TIME_ON", loggedtime),
+            self.field("CALL", hiscall),
+            self.field("MODE", mode),
+            self.field("BAND", band + "M"),
+            self.field("FREQ", frequency),
+            self.field("RST_SENT", rst),
+            self.field("RST_RCVD", rst),
+            self.field("STX_STRING", myexch),
+            self.field("SRX_STRING", f"{hisclass} {hissection}"),
+            self.field("ARRL_SECT", hissection),
+            self.field("CLASS", hisclass),
+        ]
+        state = self.get_state(hissection)
+        if state:
+            fields.append(self.field("STATE", state))
+        if grid and len(str(grid)) > 1:
+            fields.append(self.field("GRIDSQUARE", str(grid)))
+        if opname and len(str(opname)) > 1:
+            fields.append(self.field("NAME", str(opname)))
+        fields.append(self.field("COMMENT", comment))
+        fields.append("<EOR>\r\n\r\n")
+        return "".join(fields)
+
+    def _write(self, file_descriptor, contacts, myexch: str) -> tuple:
+        """Write records a chunk at a time, returns (count, last id)."""
+        count = 0
+        last_id = 0
+        contacts = iter(contacts)
+        while True:
+            chunk = list(islice(contacts, self.chunk_size))
+            if not chunk:
+                return count, last_id
+            file_descriptor.write("".join(self.record(x, myexch) for x in chunk))
+            count += len(chunk)
+            last_id = max(last_id, max(x.get("id") or 0 for x in chunk))
+
+    def read_watermark(self) -> dict:
+        """The watermark left by the last export, or an empty dict."""
+        try:
+            with open(self.watermark_file, "rt", encoding="utf-8") as file_descriptor:
+                return loads(file_descriptor.read())
+        except (IOError, JSONDecodeError):
+            return {}
+
+    def write_watermark(self, last_id: int, count: int, myexch: str) -> None:
+        """Remember how far we got, and how many contacts that was."""
+        watermark = {"last_id": last_id, "count": count, "myexch": myexch}
+        try:
+            with open(self.watermark_file, "wt", encoding="utf-8") as file_descriptor:
+                file_descriptor.write(dumps(watermark))
+        except IOError as exception:
+            logging.warning("ADIF watermark: %s", exception)
+
+    def invalidate(self) -> None:
+        """
+        Forget the watermark so the next export rewrites the whole file.
+        Safe to call while an export is running in another thread, that
+        export won't leave a watermark behind.
+        """
+        self.generation += 1
+        self._remove_watermark()
+
+    def _remove_watermark(self) -> None:
+        """Delete the watermark file if there is one."""
+        try:
+            os.remove(self.watermark_file)
+        except FileNotFoundError:
+            pass
+        except OSError as exception:
+            logging.warning("ADIF watermark: %s", exception)
+
+    def export_full(self, contacts, myexch: str) -> int:
+        """
+        Write every contact to a temp file, then rename it over the log.
+        contacts is any iterable of contact dicts, oldest first.
+        Returns the number of contacts written.
+        """
+        temp_name = f"{self.filename}.tmp"
+        with open(
+            temp_name, "w", encoding="utf-8", newline="", buffering=1 << 16
+        ) as file_descriptor:
+            file_descriptor.write("<ADIF_VER:5>2.2.0\r\n<EOH>\r\n")
+            count, last_id = self._write(file_descriptor, contacts, myexch)
+        os.replace(temp_name, self.filename)
+        self.write_watermark(last_id, count, myexch)
+        return count
+
+    def export(self, database, myexch: str, incremental: bool = True) -> int:
+        """
+        Export contacts from a DataBase.
+        If incremental, only contacts added since the last export are
+        appended, falling back to a full export when that isn't safe:
+        no log file, a different exchange, or a database that no longer
+        holds the contacts the watermark says were written.
+        Returns the number of contacts written.
+        """
+        generation = self.generation
+        try:
+            return self._export(database, myexch, incremental)
+        finally:
+            if generation != self.generation:
+                self._remove_watermark()
+
+    def _export(self, database, myexch: str, incremental: bool) -> int:
+        """export() without the invalidation check."""
+        watermark = self.read_watermark()
+        last_id = watermark.get("last_id")
+        if (
+            not incremental
+            or not os.path.exists(self.filename)
+            or watermark.get("myexch") != myexch
+            or not isinstance(last_id, int)
+            or database.count_contacts_upto(last_id) != watermark.get("count")
+        ):
+            return self.export_full(database.iter_contacts(), myexch)
+        with open(
+            self.filename, "a", encoding="utf-8", newline="", buffering=1 << 16
+        ) as file_descriptor:
+            count, new_last_id = self._write(
+                file_descriptor, database.iter_contacts(after_id=last_id), myexch
+            )
+        if count:
+            self.write_watermark(
+                max(last_id, new_last_id), watermark.get("count") + count, myexch
+            )
+        return count
@@ -0,0 +1,190 @@
+"""
+K6GTE, Background backups of the contact database
+Email: michael.bridak@gmail.com
+GPL V3
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from urllib.request import pathname2url
+
+if __name__ == "__main__":
+    print("I'm not the program you are looking for.")
+
+
+class Backup:
+    """
+    Copies the contact database to rotating snapshot files.
+
+    The copy is made with sqlite's online backup, a few pages at a time with
+    a pause in between, so logging never waits on it and the copy is always
+    consistent. It's written to a temp file and renamed into place. Only the
+    newest 'keep' snapshots are kept, and no copy is made unless the
+    database's change counter has moved since the last one.
+
+    snapshot() copies to one file in an 'export' folder under 'folder'
+    instead, so Generate Logs doesn't push timed snapshots out of the ones
+    kept.
+
+    database, the DataBase to back up.
+    folder, where the snapshots go.
+    interval, seconds between backups when started, 0 to only back up on
+    demand.
+    on_exit, take one last backup, all in one go, when stopped.
+    """
+
+    pages = 64
+
+    def __init__(
+        self, database, folder: str = "backups", interval: int = 300, keep: int = 5
+    ) -> None:
+        self.database = database
+        self.folder = folder
+        self.interval = interval
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.on_exit = True
+        self._latest = None
+        self._latest_changes = None
+        self._export_changes = None
+
+    def start(self) -> None:
+        """Start backing up every 'interval' seconds in the background."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stop the background thread and, if on_exit, take one last backup
+        without pausing between pages. Skipped if the thread is still in the
+        middle of a copy after half a second, that's left to finish or not.
+        """
+        self._stop.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout=0.5)
+            if thread.is_alive():
+                logging.warning("Backup: still copying, no backup on exit")
+                return
+        if self.interval and self.on_exit:
+            self.backup_now(paced=False)
+
+    def _run(self) -> None:
+        """The backup thread."""
+        while not self._stop.wait(self.interval or 60):
+            if self.interval:
+                self.backup_now()
+
+    def _stem(self) -> str:
+        """Snapshot names start with the database name, less its extension."""
+        return os.path.splitext(os.path.basename(self.database.database))[0]
+
+    def snapshots(self) -> list:
+        """Paths of the snapshots on disk, oldest first."""
+        stem = f"{self._stem()}-"
+        try:
+            names = sorted(
+                name
+                for name in os.listdir(self.folder)
+                if name.startswith(stem) and name.endswith(".db")
+            )
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.folder, name) for name in names]
+
+    def backup_now(self, paced: bool = True) -> str:
+        """
+        Take a snapshot if the database has changed since the last one.
+        Returns the path of the newest snapshot, or None if it failed.
+        paced False copies it all at once, for when nothing else is going on.
+        """
+        with self._lock:
+            changes = self.database.changes
+            if (
+                changes == self._latest_changes
+                and self._latest is not None
+                and os.path.exists(self._latest)
+            ):
+                return self._latest
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S-%f")
+            path = os.path.join(self.folder, f"{self._stem()}-{stamp}.db")
+            if not self._copy(path, paced):
+                return None
+            self._latest = path
+            self._latest_changes = changes
+            self._rotate()
+            return path
+
+    def _copy(self, path: str, paced: bool = True) -> bool:
+        """Copy the database to path by way of a temp file, False if it failed."""
+        temp_name = f"{path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            source = sqlite3.connect(self.database.database)
+            target = sqlite3.connect(temp_name)
+            try:
+                if paced:
+                    source.backup(target, pages=self.pages, sleep=0.005)
+                else:
+                    source.backup(target)
+            finally:
+                target.close()
+                source.close()
+            os.replace(temp_name, path)
+        except (sqlite3.Error, OSError) as exception:
+            logging.warning("Backup: %s", exception)
+            try:
+                os.remove(temp_name)
+            except OSError:
+                pass
+            return False
+        return True
+
+    def _rotate(self) -> None:
+        """Delete all but the newest 'keep' snapshots."""
+        for path in self.snapshots()[: -max(1, self.keep)]:
+            try:
+                os.remove(path)
+            except OSError as exception:
+                logging.warning("Backup: %s", exception)
+
+    @property
+    def changes(self) -> int:
+        """The database's change counter, so a Backup can stand in for it."""
+        return self.database.changes
+
+    def snapshot(self):
+        """
+        Returns a Snapshot read from a fresh copy in the export folder
+        rather than the live database, or from the database itself if the
+        copy fails. The copy is opened read only, nothing is written to it.
+        """
+        changes = self.database.changes
+        path = os.path.join(self.folder, "export", f"{self._stem()}.db")
+        with self._lock:
+            if changes != self._export_changes or not os.path.exists(path):
+                if not self._copy(path):
+                    self._export_changes = None
+                    return self.database.snapshot()
+                self._export_changes = changes
+        try:
+            conn = sqlite3.connect(
+                f"file:{pathname2url(os.path.abspath(path))}?mode=ro",
+                uri=True,
+                isolation_level=None,
+            )
+            try:
+                return type(self.database).read_snapshot(conn, changes)
+            finally:
+                conn.close()
+        except sqlite3.Error as exception:
+            logging.warning("Backup: %s", exception)
+            return self.database.snapshot()
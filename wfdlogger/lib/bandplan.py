@@ -0,0 +1,153 @@
+"""
+K6GTE, Band plan
+Email: michael.bridak@gmail.com
+GPL V3
+
+Maps a frequency to its band, sub-band and likely mode with a binary search
+of a sorted table of band edges. The table comes from a JSON file, the
+packaged data/bandplan.json, or bandplan.json in the working directory if
+there is one, so a different region's plan can be dropped in.
+"""
+
+import json
+import logging
+import os
+from bisect import bisect_right
+
+if __name__ == "__main__":
+    print("I'm not the program you are looking for.")
+
+PACKAGED_PLAN = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "data",
+    "bandplan.json",
+)
+LOCAL_PLAN = "./bandplan.json"
+
+
+class BandPlan:
+    """
+    A band plan read from a JSON file.
+
+    bands, list of {band, lower, upper, segments} in hz, segments a list of
+    {lower, name, mode} each running to the next one or the top of the band.
+    fakefreq, {band: {mode: khz}} to log when there's no rig.
+    modes, what the modes passed to fakefreq mean, FT8 is DG and so on.
+    rigmodes, rig mode to CW, PH or DG, anything not listed is
+    rigmode_default.
+
+    A frequency is in a band if it's above the lower edge and below the
+    upper one, the edges themselves are out of band.
+    """
+
+    def __init__(self, filename: str = PACKAGED_PLAN) -> None:
+        with open(filename, "rt", encoding="utf-8") as file_descriptor:
+            plan = json.load(file_descriptor)
+        self.filename = filename
+        self.name = plan.get("name", "")
+        self.fakefreqs = plan.get("fakefreq", {})
+        self.modes = plan.get("modes", {})
+        self.rigmodes = plan.get("rigmodes", {})
+        self.rigmode_default = plan.get("rigmode_default", "DG")
+        bands = sorted(plan.get("bands", []), key=lambda band: band["lower"])
+        self._lowers = []
+        self._uppers = []
+        self._bands = []
+        self._segments = []
+        for band in bands:
+            lower, upper = int(band["lower"]), int(band["upper"])
+            if lower >= upper or (self._uppers and lower < self._uppers[-1]):
+                raise ValueError(f"{filename}: band {band.get('band')} overlaps")
+            segments = sorted(band.get("segments", []), key=lambda seg: seg["lower"])
+            self._lowers.append(lower)
+            self._uppers.append(upper)
+            self._bands.append(str(band["band"]))
+            self._segments.append(
+                (
+                    [int(segment["lower"]) for segment in segments],
+                    [(segment["name"], segment["mode"]) for segment in segments],
+                )
+            )
+        # Every edge in one list, lower, upper, lower, upper..., so one
+        # bisect finds the band: an odd index is between a band's edges.
+        self._edges = [
+            edge for pair in zip(self._lowers, self._uppers) for edge in pair
+        ]
+
+    @property
+    def bands(self) -> list:
+        """The bands, lowest first."""
+        return list(self._bands)
+
+    @property
+    def edges(self) -> list:
+        """(lower, upper, band) of each band, lowest first."""
+        return list(zip(self._lowers, self._uppers, self._bands))
+
+    @property
+    def segment_edges(self) -> list:
+        """The lower edge of every sub-band, lowest first."""
+        return [lower for lowers, _ in self._segments for lower in lowers]
+
+    def _index(self, frequency: int) -> int:
+        """Index of the band a frequency in hz is in, -1 if out of band."""
+        index = bisect_right(self._edges, frequency)
+        if index & 1 and frequency > self._edges[index - 1]:
+            return index >> 1
+        return -1
+
+    def band(self, frequency: int) -> str:
+        """The band a frequency in hz is in, "0" if out of band."""
+        index = bisect_right(self._edges, frequency)
+        if index & 1 and frequency > self._edges[index - 1]:
+            return self._bands[index >> 1]
+        return "0"
+
+    def segment(self, frequency: int) -> tuple:
+        """
+        (band, sub-band, likely mode) for a frequency in hz. Sub-band and
+        mode are "" if the band has no segment there, everything is "0" if
+        out of band.
+        """
+        index = self._index(frequency)
+        if index < 0:
+            return "0", "0", "0"
+        lowers, segments = self._segments[index]
+        position = bisect_right(lowers, frequency) - 1
+        if position < 0:
+            return self._bands[index], "", ""
+        return (self._bands[index],) + segments[position]
+
+    def likely_mode(self, frequency: int) -> str:
+        """CW, PH or DG for where a frequency in hz sits in its band."""
+        return self.segment(frequency)[2]
+
+    def fakefreq(self, band: str, mode: str) -> str:
+        """
+        A frequency in khz for a band and mode, to log when the rig can't
+        say. Raises KeyError for a band or mode the plan doesn't know.
+        """
+        return self.fakefreqs[band][self.modes.get(mode, mode)]
+
+    def mode(self, rigmode: str) -> str:
+        """The CW, PH or DG to log for a mode a rig reports."""
+        return self.rigmodes.get(rigmode, self.rigmode_default)
+
+
+def load(filename: str = None) -> BandPlan:
+    """
+    The plan in filename, or bandplan.json in the working directory if
+    there is one, else the packaged plan. A plan that won't load is logged
+    and the packaged one used.
+    """
+    if filename is None:
+        filename = LOCAL_PLAN if os.path.exists(LOCAL_PLAN) else PACKAGED_PLAN
+    if filename != PACKAGED_PLAN:
+        try:
+            return BandPlan(filename)
+        except (OSError, ValueError, KeyError, TypeError) as exception:
+            logging.warning("BandPlan: %s, using the packaged plan", exception)
+    return BandPlan(PACKAGED_PLAN)
+
+
+BANDPLAN = load()
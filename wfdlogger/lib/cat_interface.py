@@ -5,16 +5,34 @@ GPL V3
 """
 
 import logging
+import queue
 import socket
+import threading
+import time
 import xmlrpc.client
 
 if __name__ == "__main__":
     print("I'm not the program you are looking for.")
 
 
+class TimeoutTransport(xmlrpc.client.Transport):
+    """An xmlrpc Transport that won't wait forever on a hung server."""
+
+    def __init__(self, timeout: float) -> None:
+        super().__init__()
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+
 class CAT:
     """CAT control rigctld or flrig"""
 
+    timeout = 0.5
+
     def __init__(self, interface: str, host: str, port: int) -> None:
         """
         Computer Aided Tranceiver abstraction class.
@@ -57,7 +75,9 @@ class CAT:
         if self.interface == "flrig":
             target = f"http://{host}:{port}"
             logging.debug("%s", target)
-            self.server = xmlrpc.client.ServerProxy(target)
+            self.server = xmlrpc.client.ServerProxy(
+                target, transport=TimeoutTransport(self.timeout)
+            )
             try:
                 _ = self.server.main.get_version()
                 self.online = True
@@ -69,7 +89,7 @@ class CAT:
     def __initialize_rigctrld(self):
         try:
             self.rigctrlsocket = socket.socket()
-            self.rigctrlsocket.settimeout(0.5)
+            self.rigctrlsocket.settimeout(self.timeout)
             self.rigctrlsocket.connect((self.host, self.port))
             logging.debug("Connected to rigctrld")
             self.online = True
@@ -315,3 +335,177 @@ class CAT:
             except socket.error:
                 self.online = False
                 self.rigctrlsocket = None
+
+
+class Radio:
+    """One rig of a MultiCAT, and what was last read from it."""
+
+    def __init__(self, number: int, interface: str, host: str, port: int) -> None:
+        self.number = number
+        self.interface = interface
+        self.host = host
+        self.port = port
+        self.cat = None
+        self.commands = queue.Queue()
+        self.vfo = ""
+        self.mode = ""
+        self.ptt = "0"
+        self.online = False
+        self.polls = 0
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def state(self) -> dict:
+        """What was last read from the rig."""
+        return {
+            "radio": self.number,
+            "vfo": self.vfo,
+            "mode": self.mode,
+            "ptt": self.ptt,
+            "online": self.online,
+        }
+
+
+class MultiCAT:
+    """
+    Polls several radios at once, one thread each, and stands in for a CAT.
+
+    Each thread connects its rig, and reads the vfo, mode and PTT every
+    'interval' seconds. A rig that's offline is tried again after a wait
+    that doubles each time, up to 'max_backoff' seconds. So a slow or
+    missing rig doesn't hold up the others or the GUI. get_vfo(), get_mode(),
+    get_ptt() and online give what was last read from the focused radio and
+    never wait on it. set_vfo(), set_mode() and set_power() are queued for
+    the focused radio's thread, which sends them between polls, so the GUI
+    never waits on a rig either.
+
+    radios, {radio number: (interface, host, port)}.
+    """
+
+    interval = 0.25
+    max_backoff = 10.0
+    stop_timeout = 1.0
+
+    def __init__(self, radios: dict) -> None:
+        self.radios = {
+            number: Radio(number, *config) for number, config in radios.items()
+        }
+        self.numbers = sorted(self.radios)
+        self.focused = self.numbers[0] if self.numbers else None
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self) -> None:
+        """Start polling every radio."""
+        if self._threads:
+            return
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._poll, args=(radio,), daemon=True)
+            for radio in self.radios.values()
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Stop polling, waiting at most 'stop_timeout' for all the threads."""
+        self._stop.set()
+        deadline = time.monotonic() + self.stop_timeout
+        for thread in self._threads:
+            thread.join(timeout=max(0, deadline - time.monotonic()))
+        self._threads = []
+
+    def _poll(self, radio: Radio) -> None:
+        """The polling thread of one radio."""
+        while not self._stop.is_set():
+            try:
+                if radio.cat is None or not radio.cat.online:
+                    if time.monotonic() < radio.retry_at:
+                        self._commands(radio)
+                        continue
+                    radio.cat = CAT(radio.interface, radio.host, radio.port)
+                if radio.cat.online:
+                    vfo = radio.cat.get_vfo()
+                    mode = radio.cat.get_mode()
+                    ptt = radio.cat.get_ptt()
+                    radio.vfo, radio.mode, radio.ptt = vfo, mode, ptt
+                radio.online = radio.cat.online
+                radio.polls += 1
+            except Exception as exception:  # pylint: disable=broad-except
+                logging.debug("MultiCAT radio %s: %s", radio.number, exception)
+                radio.cat = None
+                radio.online = False
+            if radio.online:
+                radio.failures = 0
+            else:
+                radio.failures += 1
+                radio.retry_at = time.monotonic() + min(
+                    self.max_backoff, self.interval * 2**radio.failures
+                )
+            self._commands(radio)
+
+    def _commands(self, radio: Radio) -> None:
+        """Send queued commands to a radio until it's time to poll again."""
+        end = time.monotonic() + self.interval
+        while not self._stop.is_set():
+            try:
+                name, args = radio.commands.get(timeout=max(0, end - time.monotonic()))
+            except queue.Empty:
+                return
+            if radio.cat is None or not radio.cat.online:
+                continue
+            try:
+                getattr(radio.cat, name)(*args)
+            except Exception as exception:  # pylint: disable=broad-except
+                logging.debug("MultiCAT radio %s: %s", radio.number, exception)
+
+    def focus(self, number: int) -> bool:
+        """Make a radio the focused one. False if there's no such radio."""
+        if number not in self.radios:
+            return False
+        self.focused = number
+        return True
+
+    def state(self, number: int = None) -> dict:
+        """What was last read from a radio, the focused one if not given."""
+        return self.radios[self.focused if number is None else number].state()
+
+    @property
+    def online(self) -> bool:
+        """True if the focused radio answered its last poll."""
+        return self.radios[self.focused].online
+
+    def get_vfo(self) -> str:
+        """The focused radio's vfo."""
+        return self.radios[self.focused].vfo
+
+    def get_mode(self) -> str:
+        """The focused radio's mode."""
+        return self.radios[self.focused].mode
+
+    def get_ptt(self):
+        """The focused radio's PTT state."""
+        return self.radios[self.focused].ptt
+
+    def _command(self, name: str, *args) -> bool:
+        """
+        Queue a CAT method for the focused radio. False if it's offline and
+        the command was dropped.
+        """
+        radio = self.radios[self.focused]
+        if not radio.online:
+            return False
+        radio.commands.put((name, args))
+        return True
+
+    def set_vfo(self, freq: str) -> bool:
+        """Sets the focused radio's vfo"""
+        return self._command("set_vfo", freq)
+
+    def set_mode(self, mode: str) -> bool:
+        """Sets the focused radio's mode"""
+        return self._command("set_mode", mode)
+
+    def set_power(self, power):
+        """Sets the focused radio's power"""
+        return self._command("set_power", power)
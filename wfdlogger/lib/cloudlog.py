@@ -0,0 +1,177 @@
+"""
+K6GTE, Cloudlog uploader
+Email: michael.bridak@gmail.com
+GPL V3
+"""
+
+import logging
+import random
+import threading
+from json import dumps
+
+import requests
+
+if __name__ == "__main__":
+    print("I'm not the program you are looking for.")
+
+
+class Cloudlog:
+    """
+    Uploads contacts to Cloudlog, https://github.com/magicbug/Cloudlog, in
+    the background.
+
+    enqueue() puts a contact's unique_id on the outbox table in the
+    database and returns, logging never waits on Cloudlog. A thread posts
+    up to 'batch' contacts at a time over one keep-alive session, so a
+    backlog built up while offline goes out quickly once Cloudlog can be
+    reached. A failed post, or an outbox the thread can't read or update,
+    is tried again after a backoff that doubles, up to 'max_backoff'
+    seconds. Contacts logged meanwhile wait it out, only a post that works
+    ends the backoff. Contacts Cloudlog refuses are tried one at a time,
+    and the ones still refused are marked rejected in the outbox rather
+    than dropped.
+
+    database, the DataBase with the contacts and the outbox.
+    record, function returning the ADIF record for a contact dict.
+    on_status, called from the thread with (ok, message) when uploads
+    start or stop working, and for each contact refused.
+    """
+
+    batch = 25
+    timeout = 10
+    backoff = 5
+    max_backoff = 300
+    comment = "Winter Field Day"
+
+    def __init__(self, database, record, on_status=None) -> None:
+        self.database = database
+        self.record = record
+        self.on_status = on_status
+        self.sent = 0
+        self.failures = 0
+        self._config = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._session = requests.Session()
+        self._ok = None
+
+    def configure(self, url, key: str = "", station_id: str = "", myexch="") -> None:
+        """Upload to url with the API key and station, or stop if url is None."""
+        with self._lock:
+            self._config = (url, key, station_id, myexch) if url else None
+        if self._config is None:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self.wake()
+
+    def enqueue(self, unique_id: str) -> None:
+        """Queue a logged contact for upload, it waits out any backoff."""
+        self.database.outbox_add(unique_id)
+        if not self.failures:
+            self._wake.set()
+
+    def wake(self) -> None:
+        """Try the queue now, without waiting out a backoff."""
+        self._wake.set()
+
+    def stop(self) -> None:
+        """
+        Stop the thread, anything not sent stays queued for next time, so
+        this only waits a moment for it. A post still in flight is left to
+        the daemon thread, which ends with the program.
+        """
+        self._stop.set()
+        self._wake.set()
+        self._session.close()
+        if self._thread is not None:
+            self._thread.join(timeout=0.5)
+
+    def _delay(self) -> float:
+        """Seconds to wait before trying again, None to wait for a wake."""
+        if not self.failures:
+            return None
+        delay = min(self.max_backoff, self.backoff * 2 ** (self.failures - 1))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _run(self) -> None:
+        """The upload thread."""
+        while not self._stop.is_set():
+            with self._lock:
+                config = self._config
+            try:
+                if config is not None:
+                    contacts = self.database.outbox_pending(self.batch)
+                    if contacts and self._upload(config, contacts):
+                        continue
+            except Exception as exception:  # pylint: disable=broad-except
+                self.failures += 1
+                self._status(False, f"Cloudlog: outbox {exception}")
+            self._wake.wait(self._delay())
+            self._wake.clear()
+
+    def _upload(self, config, contacts) -> bool:
+        """Post some contacts, True if it went well enough to carry on."""
+        error, refused = self._post(config, contacts)
+        if error is None:
+            self.database.outbox_sent([contact["unique_id"] for contact in contacts])
+            self.sent += len(contacts)
+            self.failures = 0
+            self._status(True, f"Cloudlog: uploaded {len(contacts)}")
+            return True
+        if refused and len(contacts) > 1:
+            for contact in contacts:
+                if not self._upload(config, [contact]):
+                    return False
+            return True
+        self.database.outbox_failed(
+            [contact["unique_id"] for contact in contacts], error, refused
+        )
+        if refused:
+            self._status(
+                False, f"Cloudlog refused {contacts[0]['callsign']}: {error}", True
+            )
+            return True
+        self.failures += 1
+        self._status(False, f"Cloudlog: {error}")
+        return False
+
+    def _post(self, config, contacts) -> tuple:
+        """
+        (error, refused) from posting the contacts, error None if it
+        worked, refused True if Cloudlog said no rather than failing.
+        """
+        url, key, station_id, myexch = config
+        payload = {
+            "key": key,
+            "station_profile_id": station_id,
+            "type": "adif",
+            "string": "".join(
+                self.record(contact, myexch, self.comment) for contact in contacts
+            ),
+        }
+        try:
+            result = self._session.post(
+                f"{url}/qso/", dumps(payload), timeout=self.timeout
+            )
+        except requests.exceptions.RequestException as exception:
+            return str(exception), False
+        if 200 <= result.status_code < 300:
+            return None, False
+        error = f"{result.status_code} {result.text[:200]}"
+        refused = result.status_code in (400, 422)
+        return error, refused
+
+    def _status(self, ok: bool, message: str, always=False) -> None:
+        """Tell on_status when uploads start or stop working."""
+        if ok:
+            logging.info("%s", message)
+        else:
+            logging.warning("%s", message)
+        if self.on_status is not None and (always or ok != self._ok):
+            self.on_status(ok, message)
+        self._ok = ok
@@ -4,49 +4,198 @@ Email: michael.bridak@gmail.com
 GPL V3
 """
 
+from collections import deque
 from xmlrpc.client import ServerProxy, Error
 import socket
 import logging
+import threading
+import time
+
+try:
+    from wfdlogger.lib.cat_interface import TimeoutTransport
+except ModuleNotFoundError:
+    from lib.cat_interface import TimeoutTransport
 
 if __name__ == "__main__":
     print("I'm not the program you are looking for.")
 
 
 class CW:
-    """An interface to cwdaemon and PyWinkeyerSerial"""
+    """
+    An interface to cwdaemon and PyWinkeyerSerial
+
+    The UDP socket or xmlrpc proxy is made once and kept. sendcw() only
+    queues the text, a background thread does the sending, so a slow keyer
+    host never holds up the GUI. abort() and set_speed() jump the queue,
+    abort() also throws away whatever hasn't been sent yet. metrics() has
+    the queue depth and how long texts waited before they were sent.
+    """
+
+    timeout = 2.0
 
     def __init__(self, servertype: int, host: str, port: int) -> None:
         self.servertype = servertype
         self.host = host
         self.port = port
+        self.speed = 20
+        self._udp_socket = None
+        self._proxy = None
+        self._queue = deque()
+        self._urgent = deque()
+        self._ready = threading.Condition()
+        self._thread = None
+        self._running = False
+        self.sent = 0
+        self.failed = 0
+        self.aborted = 0
+        self.max_depth = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self._total_latency = 0.0
 
     def sendcw(self, texttosend):
-        """sends cw to k1el"""
+        """queues cw to be sent"""
         logging.info("sendcw: %s", texttosend)
+        self._put(self._queue, texttosend)
+
+    def abort(self):
+        """Stop sending, dropping anything still queued."""
+        with self._ready:
+            self.aborted += len(self._queue)
+            self._queue.clear()
+        if self.servertype == 1:
+            self._put(self._urgent, "\x1b4")
+
+    def set_speed(self, speed: int):
+        """Change the cwdaemon speed ahead of anything already queued."""
+        if self.servertype != 1:
+            return
+        self.speed = speed
+        self._put(self._urgent, f"\x1b2{self.speed}")
+
+    @property
+    def depth(self) -> int:
+        """How many texts are waiting to be sent."""
+        with self._ready:
+            return len(self._queue) + len(self._urgent)
+
+    def metrics(self) -> dict:
+        """Queue depth, counts and latency in seconds from queued to sent."""
+        with self._ready:
+            return {
+                "depth": len(self._queue) + len(self._urgent),
+                "max_depth": self.max_depth,
+                "sent": self.sent,
+                "failed": self.failed,
+                "aborted": self.aborted,
+                "last_latency": self.last_latency,
+                "max_latency": self.max_latency,
+                "average_latency": (
+                    self._total_latency / self.sent if self.sent else 0.0
+                ),
+            }
+
+    def stop(self):
+        """
+        Tell the sending thread to stop once the queue is empty. It closes
+        the socket or proxy itself, so this only waits a moment for it.
+        """
+        with self._ready:
+            self._running = False
+            self._ready.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=0.1)
+
+    def _put(self, where: deque, texttosend: str):
+        """Queue a text and make sure the sending thread is running."""
+        with self._ready:
+            where.append((texttosend, time.monotonic()))
+            self.max_depth = max(self.max_depth, len(self._queue) + len(self._urgent))
+            if self._thread is None or not self._thread.is_alive():
+                self._running = True
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._ready.notify()
+
+    def _run(self):
+        """
+        The sending thread. When it's stopped and the queue is empty it
+        hands back the socket or proxy and closes them, so a thread started
+        after it never shares them.
+        """
+        while True:
+            with self._ready:
+                while self._running and not (self._urgent or self._queue):
+                    self._ready.wait()
+                if self._urgent:
+                    texttosend, queued = self._urgent.popleft()
+                elif self._queue:
+                    texttosend, queued = self._queue.popleft()
+                else:
+                    self._thread = None
+                    udp_socket, self._udp_socket = self._udp_socket, None
+                    proxy, self._proxy = self._proxy, None
+                    break
+            sent = self._send(texttosend)
+            with self._ready:
+                if sent:
+                    latency = time.monotonic() - queued
+                    self.sent += 1
+                    self.last_latency = latency
+                    self.max_latency = max(self.max_latency, latency)
+                    self._total_latency += latency
+                else:
+                    self.failed += 1
+        if udp_socket is not None:
+            udp_socket.close()
+        if proxy is not None:
+            proxy("close")()
+
+    def _send(self, texttosend) -> bool:
+        """sends cw to k1el"""
         if self.servertype == 2:
-            self._sendcw_xmlrpc(texttosend)
+            return self._sendcw_xmlrpc(texttosend)
         if self.servertype == 1:
-            self._sendcw_udp(texttosend)
+            return self._sendcw_udp(texttosend)
+        return False
 
-    def _sendcw_xmlrpc(self, texttosend):
+    def _sendcw_xmlrpc(self, texttosend) -> bool:
         """sends cw to xmlrpc"""
         logging.info("xmlrpc: %s", texttosend)
-        with ServerProxy(f"http://{self.host}:{self.port}") as proxy:
-            try:
-                proxy.k1elsendstring(texttosend)
-            except Error as exception:
-                logging.info(
-                    "http://%s:%s, xmlrpc error: %s", self.host, self.port, exception
-                )
-            except ConnectionRefusedError:
-                logging.info(
-                    "http://%s:%s, xmlrpc Connection Refused", self.host, self.port
-                )
-
-    def _sendcw_udp(self, texttosend):
+        if self._proxy is None:
+            self._proxy = ServerProxy(
+                f"http://{self.host}:{self.port}",
+                transport=TimeoutTransport(self.timeout),
+            )
+        try:
+            self._proxy.k1elsendstring(texttosend)
+            return True
+        except Error as exception:
+            logging.info(
+                "http://%s:%s, xmlrpc error: %s", self.host, self.port, exception
+            )
+        except ConnectionRefusedError:
+            logging.info(
+                "http://%s:%s, xmlrpc Connection Refused", self.host, self.port
+            )
+        except OSError as exception:
+            logging.info("http://%s:%s, xmlrpc: %s", self.host, self.port, exception)
+        self._proxy("close")()
+        self._proxy = None
+        return False
+
+    def _sendcw_udp(self, texttosend) -> bool:
         """send cw to udp port"""
         logging.info("UDP: %s", texttosend)
         server_address_port = (self.host, self.port)
-        # bufferSize          = 1024
-        udp_client_socket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
-        udp_client_socket.sendto(bytes(texttosend, "utf-8"), server_address_port)
+        if self._udp_socket is None:
+            self._udp_socket = socket.socket(
+                family=socket.AF_INET, type=socket.SOCK_DGRAM
+            )
+        try:
+            self._udp_socket.sendto(bytes(texttosend, "utf-8"), server_address_port)
+        except OSError as exception:
+            logging.info("UDP %s:%s: %s", self.host, self.port, exception)
+            return False
+        return True
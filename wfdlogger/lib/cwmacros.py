@@ -0,0 +1,83 @@
+"""
+K6GTE, CW macros
+Email: michael.bridak@gmail.com
+GPL V3
+"""
+
+import logging
+import os
+import re
+
+if __name__ == "__main__":
+    print("I'm not the program you are looking for.")
+
+_FIELD = re.compile(r"\{([A-Z]+)\}")
+
+
+class Macro:
+    """
+    A macro split once into literal text and {FIELD}s, so filling it in is
+    a single join. The text is upper cased, as it's sent. Fields with no
+    value given are left as they are.
+    """
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        parts = _FIELD.split(text.upper())
+        self.literals = parts[0::2]
+        self.fields = parts[1::2]
+
+    def render(self, values: dict) -> str:
+        """The macro with its fields filled in from values."""
+        out = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            value = values.get(field)
+            out.append(f"{{{field}}}" if value is None else value)
+            out.append(literal)
+        return "".join(out)
+
+
+class CWMacros:
+    """
+    The run and S&P macros from cwmacros.txt, parsed once and kept.
+
+    Each line is mode|fkey|button name|macro, mode R for run, anything else
+    for S&P. load() only reads the file again if its modification time or
+    size has changed.
+    """
+
+    def __init__(self, filename: str = "./cwmacros.txt") -> None:
+        self.filename = filename
+        self.run = {}
+        self.search_and_pounce = {}
+        self._stamp = None
+
+    def load(self) -> bool:
+        """Read the file if it has changed. Returns True if it was read."""
+        try:
+            stat = os.stat(self.filename)
+        except OSError as exception:
+            logging.info("CWMacros: %s", exception)
+            return False
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._stamp:
+            return False
+        run = {}
+        search_and_pounce = {}
+        with open(self.filename, "r", encoding="utf-8") as file_descriptor:
+            for line in file_descriptor:
+                try:
+                    mode, fkey, buttonname, cwtext = line.split("|")
+                except ValueError as err:
+                    logging.info("CWMacros: %s", err)
+                    continue
+                macros = run if mode.strip().upper() == "R" else search_and_pounce
+                macros[fkey.strip()] = (buttonname.strip(), Macro(cwtext.strip()))
+        self.run = run
+        self.search_and_pounce = search_and_pounce
+        self._stamp = stamp
+        return True
+
+    def macros(self, run_state: bool) -> dict:
+        """{fkey: (button name, Macro)} for run or S&P."""
+        return self.run if run_state else self.search_and_pounce
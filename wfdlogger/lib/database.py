@@ -3,21 +3,44 @@ K6GTE, Database class to store contacts
 Email: michael.bridak@gmail.com
 GPL V3
 """
+
 import logging
 import sqlite3
+import threading
+from itertools import groupby
 
 if __name__ == "__main__":
     print("I'm not the program you are looking for.")
 
 
 class DataBase:
-    """Database class for our database."""
+    """
+    Database class for our database.
+
+    'changes' counts every insert, update, delete and dirty flag change made
+    through this instance, so callers can tell if the log is the same as the
+    last time they looked without reading it.
+    """
 
     def __init__(self, database):
         """initializes DataBase instance"""
         self.database = database
+        self._changes = 0
+        self._changes_lock = threading.Lock()
+        self._tally = (None, None)
         self.create_db()
 
+    @property
+    def changes(self) -> int:
+        """How many times the contacts have been written to."""
+        with self._changes_lock:
+            return self._changes
+
+    def changed(self) -> None:
+        """Bump the change counter."""
+        with self._changes_lock:
+            self._changes += 1
+
     @staticmethod
     def row_factory(cursor, row):
         """
@@ -52,16 +75,37 @@ class DataBase:
                 "opname text NOT NULL,"
                 "IsRunQSO INTEGER DEFAULT 0,"
                 "unique_id text NOT NULL, "
-                "dirty INTEGER DEFAULT 1);"
+                "dirty INTEGER DEFAULT 1, "
+                "modified text, "
+                "radio INTEGER);"
             )
             cursor.execute(sql_table)
+            cursor.execute("PRAGMA table_info(contacts);")
+            columns = [column[1] for column in cursor.fetchall()]
+            if "modified" not in columns:
+                cursor.execute("ALTER TABLE contacts ADD COLUMN modified text;")
+                cursor.execute("UPDATE contacts SET modified = date_time;")
+            if "radio" not in columns:
+                cursor.execute("ALTER TABLE contacts ADD COLUMN radio INTEGER;")
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS contacts_unique_id ON contacts (unique_id);"
+            )
+            cursor.execute(
+                "CREATE TABLE IF NOT EXISTS cloudlog_outbox "
+                "(unique_id text PRIMARY KEY, "
+                "queued text NOT NULL, "
+                "attempts INTEGER DEFAULT 0, "
+                "rejected INTEGER DEFAULT 0, "
+                "error text);"
+            )
             conn.commit()
 
     def log_contact(self, logme: tuple) -> None:
         """
         Inserts a contact into the db.
         pass in (hiscall, hisclass, hissection, frequency,band, mode, int(power),
-        grid, opname, IsRunQSO, unique_id)
+        grid, opname, IsRunQSO, unique_id, radio)
+        radio, the number of the radio it was made on.
         """
         logging.info("%s", logme)
         try:
@@ -69,8 +113,9 @@ class DataBase:
                 sql = (
                     "INSERT INTO contacts"
                     "(callsign, class, section, frequency, date_time, "
-                    "band, mode, power, grid, opname, IsRunQSO, unique_id, dirty) "
-                    "VALUES(?,?,?,?,datetime('now'),?,?,?,?,?,?,?,1);"
+                    "band, mode, power, grid, opname, IsRunQSO, unique_id, radio, "
+                    "dirty, modified) "
+                    "VALUES(?,?,?,?,datetime('now'),?,?,?,?,?,?,?,?,1,datetime('now'));"
                 )
                 logging.info("%s", sql)
                 cur = conn.cursor()
@@ -78,6 +123,84 @@ class DataBase:
                 conn.commit()
         except sqlite3.Error as exception:
             logging.info("DataBase log_contact: %s", exception)
+        self.changed()
+
+    insert_new = (
+        "INSERT INTO contacts"
+        "(callsign, class, section, frequency, date_time, "
+        "band, mode, power, grid, opname, IsRunQSO, unique_id, radio, dirty, "
+        "modified) "
+        "SELECT :callsign, :class, :section, :frequency, :date_time, "
+        ":band, :mode, :power, :grid, :opname, :IsRunQSO, :unique_id, :radio, 1, "
+        "datetime('now') "
+        "WHERE NOT EXISTS "
+        "(SELECT 1 FROM contacts WHERE unique_id = :unique_id);"
+    )
+
+    replace_existing = (
+        "UPDATE contacts SET callsign = :callsign, class = :class, "
+        "section = :section, frequency = :frequency, date_time = :date_time, "
+        "band = :band, mode = :mode, power = :power, grid = :grid, "
+        "opname = :opname, IsRunQSO = :IsRunQSO, radio = :radio, dirty = 1, "
+        "modified = datetime('now') "
+        "WHERE unique_id = :unique_id;"
+    )
+
+    def bulk_log_contacts(self, contacts) -> int:
+        """
+        Inserts many contacts with one executemany in one transaction.
+        contacts is an iterable of dicts with the keys callsign, class, section,
+        frequency, date_time, band, mode, power, grid, opname, IsRunQSO,
+        unique_id and radio, None if it isn't known. Contacts whose unique_id
+        is already in the log are skipped.
+        Returns how many were added. A sqlite3.Error is logged and raised,
+        nothing is added.
+        """
+        try:
+            with sqlite3.connect(self.database) as conn:
+                before = conn.total_changes
+                conn.executemany(self.insert_new, contacts)
+                added = conn.total_changes - before
+        except sqlite3.Error as exception:
+            logging.critical("DataBase bulk_log_contacts: %s", exception)
+            raise
+        self.changed()
+        return added
+
+    def apply_contact_changes(self, changes) -> tuple:
+        """
+        Applies a batch of (action, contact) in order, in one transaction.
+        action is "add", "replace" or "delete". Contacts are dicts like
+        bulk_log_contacts() takes, a delete only needs the unique_id.
+        A replace for a contact we don't have adds it, an add for one we
+        do is skipped. Runs of the same action go in with one executemany.
+        Returns (added, replaced, deleted).
+        """
+        counts = {"add": 0, "replace": 0, "delete": 0}
+        try:
+            with sqlite3.connect(self.database) as conn:
+                for action, run in groupby(changes, key=lambda change: change[0]):
+                    contacts = [contact for _, contact in run]
+                    if action == "replace":
+                        before = conn.total_changes
+                        conn.executemany(self.replace_existing, contacts)
+                        counts["replace"] += conn.total_changes - before
+                        action = "add"
+                    before = conn.total_changes
+                    if action == "add":
+                        conn.executemany(self.insert_new, contacts)
+                    elif action == "delete":
+                        conn.executemany(
+                            "DELETE FROM contacts WHERE unique_id = :unique_id;",
+                            contacts,
+                        )
+                    else:
+                        continue
+                    counts[action] += conn.total_changes - before
+        except sqlite3.Error as exception:
+            logging.critical("DataBase apply_contact_changes: %s", exception)
+        self.changed()
+        return counts["add"], counts["replace"], counts["delete"]
 
     def clear_dirty_flag(self, unique_id) -> None:
         """Clears the dirty flag."""
@@ -90,6 +213,7 @@ class DataBase:
                     conn.commit()
             except sqlite3.Error as exception:
                 logging.critical("%s", exception)
+            self.changed()
 
     def get_unique_id(self, contact) -> str:
         """get unique id"""
@@ -116,6 +240,7 @@ class DataBase:
                     conn.commit()
             except sqlite3.Error as exception:
                 logging.info("DataBase delete_contact: %s", exception)
+            self.changed()
 
     def change_contact(self, qso):
         """Update an existing contact."""
@@ -124,7 +249,8 @@ class DataBase:
                 sql = (
                     f"update contacts set callsign = '{qso[0]}', class = '{qso[1]}', "
                     f"section = '{qso[2]}', date_time = '{qso[3]}', band = '{qso[4]}', "
-                    f"mode = '{qso[5]}', power = '{qso[6]}', frequency = '{qso[7]}' "
+                    f"mode = '{qso[5]}', power = '{qso[6]}', frequency = '{qso[7]}', "
+                    "modified = datetime('now') "
                     f"where id='{qso[8]}';"
                 )
                 logging.info("%s\n%s", sql, qso)
@@ -133,89 +259,59 @@ class DataBase:
                 conn.commit()
         except sqlite3.Error as exception:
             logging.info("DataBase change_contact: %s", exception)
+        self.changed()
 
     def stats(self) -> dict:
         """
         returns a dict with some stats:
-        cwcontacts, phonecontacts, digitalcontacts, bandmodemult, last15, lasthour, highpower, qrp
+        cwcontacts, phonecontacts, digitalcontacts, bandmodemult, last15, lasthour, highpower, qrp,
+        points, powermult and the Tally they came from.
         """
         with sqlite3.connect(self.database) as conn:
-            cursor = conn.cursor()
-            cursor.execute("select count(*) from contacts where mode = 'CW';")
-            cwcontacts = str(cursor.fetchone()[0])
-            cursor.execute("select count(*) from contacts where mode = 'PH';")
-            phonecontacts = str(cursor.fetchone()[0])
-            cursor.execute("select count(*) from contacts where mode = 'DG';")
-            digitalcontacts = str(cursor.fetchone()[0])
-            cursor.execute("select distinct band, mode from contacts;")
-            bandmodemult = len(cursor.fetchall())
-            cursor.execute(
-                "SELECT count(*) FROM contacts "
-                "where datetime(date_time) >=datetime('now', '-15 Minutes');"
-            )
-            last15 = str(cursor.fetchone()[0])
-            cursor.execute(
-                "SELECT count(*) FROM contacts "
-                "where datetime(date_time) >=datetime('now', '-1 Hours');"
-            )
-            lasthour = str(cursor.fetchone()[0])
-            cursor.execute(
-                "select count(*) as qrpc from contacts where mode = 'CW' and power > 5;"
-            )
-            log = cursor.fetchall()
-            qrpc = list(log[0])[0]
-            cursor.execute(
-                "select count(*) as qrpp from contacts where mode = 'PH' and power > 10;"
-            )
-            log = cursor.fetchall()
-            qrpp = list(log[0])[0]
-            cursor.execute(
-                "select count(*) as qrpd from contacts where mode = 'DG' and power > 10;"
-            )
-            log = cursor.fetchall()
-            qrpd = list(log[0])[0]
-            cursor.execute(
-                "select count(*) as highpower from contacts where power > 100;"
-            )
-            log = cursor.fetchall()
-            highpower = bool(list(log[0])[0])
-            qrp = not qrpc + qrpp + qrpd
-
-            packaged_stats = {
-                "cwcontacts": cwcontacts,
-                "phonecontacts": phonecontacts,
-                "digitalcontacts": digitalcontacts,
-                "bandmodemult": bandmodemult,
-                "last15": last15,
-                "lasthour": lasthour,
-                "highpower": highpower,
-                "qrp": qrp,
-            }
-
-            return packaged_stats
-
-    def get_band_mode_tally(self, band, mode):
+            return self._stats(conn.cursor())
+
+    @staticmethod
+    def _stats(cursor) -> dict:
+        """stats() using an open cursor, so it can share a transaction."""
+        tally = DataBase._band_mode_tally(cursor)
+        cursor.execute(
+            "SELECT count(*) FROM contacts "
+            "where datetime(date_time) >=datetime('now', '-15 Minutes');"
+        )
+        last15 = str(cursor.fetchone()[0])
+        cursor.execute(
+            "SELECT count(*) FROM contacts "
+            "where datetime(date_time) >=datetime('now', '-1 Hours');"
+        )
+        lasthour = str(cursor.fetchone()[0])
+        packaged_stats = tally.stats()
+        packaged_stats["last15"] = last15
+        packaged_stats["lasthour"] = lasthour
+        return packaged_stats
+
+    def band_mode_tally(self):
         """
-        returns list of dicts with amount of contacts and the maximum power used
-        for a given band using a particular mode.
-        Only showing contacts below 101 watts.
+        returns a Tally of the whole log. It's kept until the change counter
+        moves, so asking again for an unchanged log doesn't read it.
         """
+        changes = self.changes
+        cached_changes, tally = self._tally
+        if cached_changes == changes:
+            return tally
         with sqlite3.connect(self.database) as conn:
-            conn.row_factory = self.row_factory
-            cursor = conn.cursor()
-            cursor.execute(
-                "select count(*) as tally, MAX(power) as mpow from contacts "
-                f"where band = '{band}' AND mode ='{mode}' AND power < 101;"
-            )
-            return cursor.fetchone()
+            tally = self._band_mode_tally(conn.cursor())
+        self._tally = (changes, tally)
+        return tally
 
-    def get_bands(self) -> list:
-        """returns a list of dicts with bands"""
-        with sqlite3.connect(self.database) as conn:
-            conn.row_factory = self.row_factory
-            cursor = conn.cursor()
-            cursor.execute("select DISTINCT band from contacts;")
-            return cursor.fetchall()
+    @staticmethod
+    def _band_mode_tally(cursor):
+        """band_mode_tally() using an open cursor, one pass over the contacts."""
+        cursor.execute(
+            "select band, mode, count(*), sum(power < 101), "
+            "max(case when power < 101 then power end), max(power) "
+            "from contacts group by band, mode;"
+        )
+        return Tally(cursor.fetchall())
 
     def fetch_all_contacts_asc(self) -> list:
         """returns a list of dicts with contacts in the database."""
@@ -225,6 +321,61 @@ class DataBase:
             cursor.execute("select * from contacts order by date_time ASC;")
             return cursor.fetchall()
 
+    def iter_contacts(self, after_id: int = 0, chunk: int = 500):
+        """
+        Yields contacts as dicts, oldest first, streaming from the cursor
+        a chunk at a time instead of loading the whole log.
+        Only contacts with an id greater than after_id are returned.
+        """
+        with sqlite3.connect(self.database) as conn:
+            conn.row_factory = self.row_factory
+            cursor = conn.cursor()
+            cursor.execute(
+                "select * from contacts where id > ? order by date_time ASC, id ASC;",
+                (after_id,),
+            )
+            while True:
+                rows = cursor.fetchmany(chunk)
+                if not rows:
+                    return
+                yield from rows
+
+    def count_contacts_upto(self, last_id: int) -> int:
+        """returns how many contacts have an id of last_id or less."""
+        with sqlite3.connect(self.database) as conn:
+            cursor = conn.cursor()
+            cursor.execute("select count(*) from contacts where id <= ?;", (last_id,))
+            return cursor.fetchone()[0]
+
+    def snapshot(self):
+        """
+        Returns a Snapshot of every contact and the stats, read inside one
+        transaction so they agree with each other even while logging goes on.
+        The counter is read first, so the snapshot is never older than it.
+        """
+        changes = self.changes
+        with sqlite3.connect(self.database, isolation_level=None) as conn:
+            return self.read_snapshot(conn, changes)
+
+    @staticmethod
+    def read_snapshot(conn, changes: int = 0):
+        """
+        snapshot() from an open connection, made with isolation_level=None.
+        Only reads, so it can be used on a read only connection to a copy.
+        """
+        cursor = conn.cursor()
+        cursor.execute("BEGIN;")
+        try:
+            contacts = cursor.execute(
+                "select * from contacts order by date_time ASC, id ASC;"
+            )
+            contacts.row_factory = DataBase.row_factory
+            contacts = contacts.fetchall()
+            stats = DataBase._stats(conn.cursor())
+        finally:
+            cursor.execute("COMMIT;")
+        return Snapshot(contacts, stats, changes)
+
     def fetch_all_contacts_desc(self) -> list:
         """returns a list of dicts with contacts in the database."""
         with sqlite3.connect(self.database) as conn:
@@ -303,3 +454,175 @@ class DataBase:
             cursor = conn.cursor()
             cursor.execute("select DISTINCT grid from contacts;")
             return cursor.fetchall()
+
+    def outbox_add(self, unique_id: str) -> None:
+        """Queue a contact to be uploaded to Cloudlog."""
+        with sqlite3.connect(self.database) as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO cloudlog_outbox (unique_id, queued) "
+                "VALUES (?, datetime('now'));",
+                (unique_id,),
+            )
+
+    def outbox_pending(self, limit: int) -> list:
+        """
+        Up to 'limit' queued contacts, oldest first, leaving out rejected
+        ones. Queued contacts that have since been deleted are dropped.
+        """
+        with sqlite3.connect(self.database) as conn:
+            conn.row_factory = self.row_factory
+            cursor = conn.cursor()
+            cursor.execute(
+                "DELETE FROM cloudlog_outbox WHERE NOT EXISTS "
+                "(SELECT 1 FROM contacts "
+                "WHERE contacts.unique_id = cloudlog_outbox.unique_id);"
+            )
+            cursor.execute(
+                "SELECT contacts.* FROM cloudlog_outbox "
+                "JOIN contacts ON contacts.unique_id = cloudlog_outbox.unique_id "
+                "WHERE cloudlog_outbox.rejected = 0 "
+                "GROUP BY cloudlog_outbox.unique_id "
+                "ORDER BY cloudlog_outbox.rowid LIMIT ?;",
+                (limit,),
+            )
+            return cursor.fetchall()
+
+    def outbox_sent(self, unique_ids: list) -> None:
+        """Take uploaded contacts off the queue."""
+        with sqlite3.connect(self.database) as conn:
+            conn.executemany(
+                "DELETE FROM cloudlog_outbox WHERE unique_id = ?;",
+                [(unique_id,) for unique_id in unique_ids],
+            )
+
+    def outbox_failed(self, unique_ids: list, error: str, rejected=False) -> None:
+        """
+        Note a failed upload. Rejected contacts, ones Cloudlog refused, stay
+        on the queue but aren't tried again.
+        """
+        with sqlite3.connect(self.database) as conn:
+            conn.executemany(
+                "UPDATE cloudlog_outbox SET attempts = attempts + 1, "
+                "error = ?, rejected = ? WHERE unique_id = ?;",
+                [(error, int(rejected), unique_id) for unique_id in unique_ids],
+            )
+
+    def outbox_count(self) -> tuple:
+        """(waiting, rejected) contacts on the Cloudlog queue."""
+        with sqlite3.connect(self.database) as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT COUNT(*) - COALESCE(SUM(rejected), 0), "
+                "COALESCE(SUM(rejected), 0) FROM cloudlog_outbox;"
+            )
+            return tuple(cursor.fetchone())
+
+
+class Snapshot:
+    """
+    A read only copy of the log taken at one moment by DataBase.snapshot().
+    Has the same read methods the log exporters use on a DataBase, so they
+    can all work from the same data in other threads.
+    """
+
+    def __init__(self, contacts: list, stats: dict, changes: int = 0) -> None:
+        self.contacts = contacts
+        self._stats = stats
+        self.changes = changes
+
+    def stats(self) -> dict:
+        """returns the stats as they were when the snapshot was taken."""
+        return dict(self._stats)
+
+    def fetch_all_contacts_asc(self) -> list:
+        """returns a list of dicts with contacts in the snapshot."""
+        return list(self.contacts)
+
+    def iter_contacts(self, after_id: int = 0):
+        """Yields contacts, oldest first, with an id greater than after_id."""
+        for contact in self.contacts:
+            if contact.get("id") > after_id:
+                yield contact
+
+    def count_contacts_upto(self, last_id: int) -> int:
+        """returns how many contacts have an id of last_id or less."""
+        return sum(1 for contact in self.contacts if contact.get("id") <= last_id)
+
+
+class Tally:
+    """
+    The band/mode matrix of the log, from one GROUP BY pass over the contacts.
+    For each band and mode: how many contacts, how many of those were under
+    101 watts and the most power among them, and the most power overall.
+    The score, power category and Statistics.txt are all worked out from it.
+    """
+
+    points_per_contact = {"CW": 2, "DG": 2, "PH": 1}
+    qrp_limit = {"CW": 5, "DG": 10, "PH": 10}
+
+    def __init__(self, rows=()) -> None:
+        self.cells = {}
+        for band, mode, count, lowcount, lowpower, maxpower in rows:
+            self.cells[(band, mode)] = (count, lowcount or 0, lowpower, maxpower)
+
+    def cell(self, band: str, mode: str) -> tuple:
+        """(contacts, contacts under 101 watts, most power under 101, most power)"""
+        return self.cells.get((band, mode), (0, 0, None, None))
+
+    def bands(self) -> set:
+        """The bands worked."""
+        return {band for band, _ in self.cells}
+
+    def contacts(self, mode: str) -> int:
+        """How many contacts were made using a mode."""
+        return sum(cell[0] for (_, cmode), cell in self.cells.items() if cmode == mode)
+
+    @property
+    def bandmodemult(self) -> int:
+        """How many band/mode combinations were worked."""
+        return len(self.cells)
+
+    @property
+    def points(self) -> int:
+        """QSO points, before any multipliers."""
+        return sum(
+            cell[0] * self.points_per_contact.get(mode, 0)
+            for (_, mode), cell in self.cells.items()
+        )
+
+    @property
+    def highpower(self) -> bool:
+        """True if any contact was made over 100 watts."""
+        return any(cell[3] > 100 for cell in self.cells.values())
+
+    @property
+    def qrp(self) -> bool:
+        """True if every contact was within the QRP limit for its mode."""
+        return not any(
+            cell[3] > self.qrp_limit[mode]
+            for (_, mode), cell in self.cells.items()
+            if mode in self.qrp_limit
+        )
+
+    @property
+    def powermult(self) -> int:
+        """The power output multiplier."""
+        if self.qrp:
+            return 2
+        if self.highpower:
+            return 0
+        return 1
+
+    def stats(self) -> dict:
+        """The part of DataBase.stats() that comes from the tally."""
+        return {
+            "cwcontacts": str(self.contacts("CW")),
+            "phonecontacts": str(self.contacts("PH")),
+            "digitalcontacts": str(self.contacts("DG")),
+            "bandmodemult": self.bandmodemult,
+            "highpower": self.highpower,
+            "qrp": self.qrp,
+            "points": self.points,
+            "powermult": self.powermult,
+            "tally": self,
+        }
@@ -0,0 +1,151 @@
+"""
+K6GTE, Maidenhead grid geometry
+Email: michael.bridak@gmail.com
+GPL V3
+
+Grid squares to latitude and longitude, and the distance and bearing
+between them. Decoded grids are cached, and a station's own grid is kept as
+an Origin with its sin and cos worked out once. batch() does a whole list of
+grids at a time, with numpy if it's installed.
+"""
+
+from functools import lru_cache
+from math import asin, atan2, cos, pi, radians, sin, sqrt
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+if __name__ == "__main__":
+    print("I'm not the program you are looking for.")
+
+EARTH_RADIUS = 6372.8  # Kilometers.
+
+
+@lru_cache(maxsize=4096)
+def _decode(maiden: str) -> tuple:
+    """gridtolatlon for an already stripped and upper cased grid."""
+    chars_in_grid_square = len(maiden)
+    if not 8 >= chars_in_grid_square >= 2 and chars_in_grid_square % 2 == 0:
+        return 0, 0
+
+    lon = (ord(maiden[0]) - 65) * 20 - 180
+    lat = (ord(maiden[1]) - 65) * 10 - 90
+
+    if chars_in_grid_square >= 4:
+        lon += (ord(maiden[2]) - 48) * 2
+        lat += ord(maiden[3]) - 48
+
+    if chars_in_grid_square >= 6:
+        lon += (ord(maiden[4]) - 65) / 12 + 1 / 24
+        lat += (ord(maiden[5]) - 65) / 24 + 1 / 48
+
+    if chars_in_grid_square >= 8:
+        lon += (ord(maiden[6])) * 5.0 / 600
+        lat += (ord(maiden[7])) * 2.5 / 600
+
+    return lat, lon
+
+
+def gridtolatlon(maiden) -> tuple:
+    """
+    Converts a maidenhead gridsquare to a latitude longitude pair.
+    Raises IndexError for a one character grid.
+    """
+    return _decode(str(maiden).strip().upper())
+
+
+class Origin:
+    """
+    A grid distances and bearings are measured from, usually our own.
+    Its position in radians, and the sin and cos of its latitude, are
+    worked out once.
+    """
+
+    def __init__(self, grid: str) -> None:
+        self.grid = grid
+        self.lat, self.lon = gridtolatlon(grid)
+        self._lat = radians(self.lat)
+        self._lon = radians(self.lon)
+        self._sin_lat = sin(self._lat)
+        self._cos_lat = cos(self._lat)
+
+    def _to(self, grid: str) -> tuple:
+        """(distance in km, bearing in degrees) to a grid, not rounded."""
+        lat, lon = gridtolatlon(grid)
+        lat = radians(lat)
+        dlon = radians(lon) - self._lon
+        sin_lat, cos_lat = sin(lat), cos(lat)
+        aye = (
+            sin((lat - self._lat) / 2) ** 2
+            + self._cos_lat * cos_lat * sin(dlon / 2) ** 2
+        )
+        why = sin(dlon) * cos_lat
+        exs = self._cos_lat * sin_lat - self._sin_lat * cos_lat * cos(dlon)
+        return 2 * asin(sqrt(aye)) * EARTH_RADIUS, atan2(why, exs) * 180 / pi % 360
+
+    def distance(self, grid: str) -> int:
+        """Kilometers to a grid."""
+        return round(self._to(grid)[0])
+
+    def bearing(self, grid: str) -> int:
+        """Degrees, 0 - 360, to a grid."""
+        return round(self._to(grid)[1])
+
+    def batch(self, grids) -> tuple:
+        """
+        (distances, bearings) to every grid in a list, rounded like distance()
+        and bearing(). Both are None for a grid shorter than two characters.
+        """
+        grids = [str(grid or "").strip() for grid in grids]
+        good = [index for index, grid in enumerate(grids) if len(grid) > 1]
+        distances = [None] * len(grids)
+        bearings = [None] * len(grids)
+        if not good:
+            return distances, bearings
+        if numpy is None:
+            for index in good:
+                km, degrees = self._to(grids[index])
+                distances[index] = round(km)
+                bearings[index] = round(degrees)
+            return distances, bearings
+        latlon = numpy.radians(
+            numpy.array([gridtolatlon(grids[index]) for index in good], dtype=float)
+        )
+        lat, dlon = latlon[:, 0], latlon[:, 1] - self._lon
+        sin_lat, cos_lat = numpy.sin(lat), numpy.cos(lat)
+        aye = (
+            numpy.sin((lat - self._lat) / 2) ** 2
+            + self._cos_lat * cos_lat * numpy.sin(dlon / 2) ** 2
+        )
+        km = 2 * numpy.arcsin(numpy.sqrt(aye)) * EARTH_RADIUS
+        degrees = (
+            numpy.degrees(
+                numpy.arctan2(
+                    numpy.sin(dlon) * cos_lat,
+                    self._cos_lat * sin_lat - self._sin_lat * cos_lat * numpy.cos(dlon),
+                )
+            )
+            % 360
+        )
+        for index, kilometers, angle in zip(good, km.tolist(), degrees.tolist()):
+            distances[index] = round(kilometers)
+            bearings[index] = round(angle)
+        return distances, bearings
+
+
+@lru_cache(maxsize=16)
+def origin(grid: str) -> Origin:
+    """The Origin for a grid, made once."""
+    return Origin(grid)
+
+
+def distance(grid1: str, grid2: str) -> int:
+    """Kilometers between two grids."""
+    return origin(grid1).distance(grid2)
+
+
+def bearing(grid1: str, grid2: str) -> int:
+    """Degrees, 0 - 360, from grid1 to grid2."""
+    return origin(grid1).bearing(grid2)
@@ -0,0 +1,339 @@
+"""
+K6GTE, ADIF and Cabrillo import
+Email: michael.bridak@gmail.com
+GPL V3
+
+Reads ADIF or Cabrillo files a chunk at a time and bulk inserts the
+contacts, skipping any already in the log. Run on its own as
+'wfdlogger-import' to load files without starting the logger.
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import uuid
+
+try:
+    from wfdlogger.lib.bandplan import BANDPLAN
+    from wfdlogger.lib.database import DataBase
+except ModuleNotFoundError:
+    from lib.bandplan import BANDPLAN
+    from lib.database import DataBase
+
+# Namespace for unique_ids made from a contact's call, time, band and mode,
+# so importing the same file twice doesn't duplicate anything.
+IMPORT_NAMESPACE = uuid.UUID("6d0b5a4e-3f0e-5b6a-9a53-2f1f2b7c1e4d")
+
+ADIF_BANDS = {
+    "160M": "160",
+    "80M": "80",
+    "60M": "60",
+    "40M": "40",
+    "30M": "30",
+    "20M": "20",
+    "17M": "17",
+    "15M": "15",
+    "12M": "12",
+    "10M": "10",
+    "6M": "6",
+    "2M": "2",
+    "1.25M": "222",
+    "70CM": "432",
+}
+
+# Cabrillo uses these in place of a frequency above 30 mhz.
+CABRILLO_BANDS = {"50": "6", "144": "2", "222": "222", "432": "432"}
+
+MODES = {
+    "CW": "CW",
+    "PH": "PH",
+    "SSB": "PH",
+    "USB": "PH",
+    "LSB": "PH",
+    "AM": "PH",
+    "FM": "PH",
+    "DG": "DG",
+    "RY": "DG",
+    "RTTY": "DG",
+    "FT8": "DG",
+    "FT4": "DG",
+    "PSK": "DG",
+    "PSK31": "DG",
+    "MFSK": "DG",
+    "OLIVIA": "DG",
+    "JT65": "DG",
+    "DATA": "DG",
+}
+
+_ADIF_TAG = re.compile(rb"<([A-Za-z0-9_]+)(?::(\d+)(?::[^>]*)?)?>")
+_ADIF_EOH = re.compile(rb"<eoh>", re.IGNORECASE)
+
+
+class RecordError(ValueError):
+    """A record that can't be imported."""
+
+
+def getband(frequency: int) -> str:
+    """Returns the band a frequency in hz is in, or "0" if out of band."""
+    return BANDPLAN.band(frequency)
+
+
+def read_adif(file_descriptor, chunk: int = 1 << 16):
+    """
+    Yields each ADIF record as a dict of upper case field names to values.
+    file_descriptor is opened binary, ADIF lengths count bytes, not
+    characters, so values are cut out as bytes and then decoded as UTF-8.
+    The file is read a chunk at a time, the header, if any, is skipped.
+    """
+    buffer = file_descriptor.read(chunk)
+    pos = 0
+    record = {}
+    if buffer.lstrip()[:1] != b"<":
+        match = _ADIF_EOH.search(buffer)
+        while match is None:
+            more = file_descriptor.read(chunk)
+            if not more:
+                return
+            buffer = buffer[-5:] + more
+            match = _ADIF_EOH.search(buffer)
+        pos = match.end()
+    while True:
+        match = _ADIF_TAG.search(buffer, pos)
+        end = None if match is None else match.end() + int(match.group(2) or 0)
+        if match is None or end > len(buffer):
+            more = file_descriptor.read(chunk)
+            if not more:
+                return
+            buffer = buffer[pos:] + more
+            pos = 0
+            continue
+        name = match.group(1).decode("ascii").upper()
+        if name == "EOR":
+            if record:
+                yield record
+            record = {}
+        elif name != "EOH":
+            record[name] = buffer[match.end() : end].decode("utf-8", "replace")
+        pos = end
+
+
+def read_cabrillo(file_descriptor):
+    """Yields the fields after 'QSO:' of each contact line, as a list."""
+    for line in file_descriptor:
+        if line[:4].upper() == "QSO:":
+            yield line[4:].split()
+
+
+def _date_time(date: str, time: str) -> str:
+    """'YYYYMMDD' or 'YYYY-MM-DD' and 'HHMM[SS]' to the log's date_time."""
+    date = date.replace("-", "")
+    if len(date) != 8 or not date.isdigit():
+        raise RecordError(f"Bad date {date!r}")
+    time = time.replace(":", "")
+    if len(time) not in (4, 6) or not time.isdigit():
+        raise RecordError(f"Bad time {time!r}")
+    time = time.ljust(6, "0")
+    return f"{date[:4]}-{date[4:6]}-{date[6:]} {time[:2]}:{time[2:4]}:{time[4:]}"
+
+
+def _mode(mode: str) -> str:
+    """Fold any mode to CW, PH or DG."""
+    try:
+        return MODES[mode.upper()]
+    except KeyError:
+        raise RecordError(f"Unknown mode {mode!r}") from None
+
+
+def _contact(
+    call, the_class, section, date_time, frequency, band, mode, power, grid, opname
+) -> dict:
+    """Check and package a contact for DataBase.bulk_log_contacts()."""
+    if not call:
+        raise RecordError("No callsign")
+    if not the_class or not section:
+        raise RecordError(f"{call}: No class/section")
+    if band == "0":
+        raise RecordError(f"{call}: Out of band")
+    call = call.upper()
+    return {
+        "callsign": call,
+        "class": the_class.upper(),
+        "section": section.upper(),
+        "frequency": frequency,
+        "date_time": date_time,
+        "band": band,
+        "mode": mode,
+        "power": power,
+        "grid": grid,
+        "opname": opname,
+        "IsRunQSO": 0,
+        "unique_id": uuid.uuid5(
+            IMPORT_NAMESPACE, f"{call}|{date_time}|{band}|{mode}"
+        ).hex,
+        "radio": None,
+    }
+
+
+def adif_contact(record: dict, power: int) -> dict:
+    """Turn an ADIF record into a contact, raise RecordError if we can't."""
+    exchange = record.get("SRX_STRING", "").split()
+    the_class = record.get("CLASS") or (exchange[0] if exchange else "")
+    section = record.get("ARRL_SECT") or (exchange[1] if len(exchange) > 1 else "")
+    frequency = 0
+    if record.get("FREQ"):
+        try:
+            frequency = int(round(float(record.get("FREQ")) * 1000000))
+        except ValueError:
+            raise RecordError(f"Bad frequency {record.get('FREQ')!r}") from None
+    band = ADIF_BANDS.get(record.get("BAND", "").upper())
+    if band is None:
+        band = getband(frequency)
+    if record.get("TX_PWR"):
+        try:
+            power = int(float(record.get("TX_PWR")))
+        except ValueError:
+            raise RecordError(f"Bad power {record.get('TX_PWR')!r}") from None
+    return _contact(
+        record.get("CALL"),
+        the_class,
+        section,
+        _date_time(record.get("QSO_DATE", ""), record.get("TIME_ON", "")),
+        frequency,
+        band,
+        _mode(record.get("MODE", "")),
+        power,
+        record.get("GRIDSQUARE", ""),
+        record.get("NAME", ""),
+    )
+
+
+def cabrillo_contact(fields: list, power: int) -> dict:
+    """
+    Turn the fields of a Cabrillo QSO line into a contact.
+    freq mode date time mycall myclass mysection call class section
+    """
+    if len(fields) != 10:
+        raise RecordError(f"Expected 10 fields, got {len(fields)}")
+    freq, mode, date, time, _, _, _, call, the_class, section = fields
+    if freq in CABRILLO_BANDS:
+        frequency = 0
+        band = CABRILLO_BANDS[freq]
+    else:
+        try:
+            frequency = int(float(freq) * 1000)
+        except ValueError:
+            raise RecordError(f"Bad frequency {freq!r}") from None
+        band = getband(frequency)
+    return _contact(
+        call,
+        the_class,
+        section,
+        _date_time(date, time),
+        frequency,
+        band,
+        _mode(mode),
+        power,
+        "",
+        "",
+    )
+
+
+def is_cabrillo(filename: str) -> bool:
+    """Guess the format from the name, or failing that the first line."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension in (".adi", ".adif"):
+        return False
+    if extension in (".log", ".cbr"):
+        return True
+    with open(filename, "r", encoding="utf-8", errors="replace") as file_descriptor:
+        for line in file_descriptor:
+            if line.strip():
+                return line.strip().upper().startswith("START-OF-LOG")
+    return False
+
+
+class Importer:
+    """
+    Imports ADIF and Cabrillo files into a DataBase.
+
+    Contacts are parsed as the file is read and handed to
+    DataBase.bulk_log_contacts() as a generator, so the whole file goes in
+    with one executemany in one transaction. Records that can't be imported
+    are skipped and listed in 'errors' as (record number, reason).
+
+    power, the power in watts used for contacts that don't say.
+    """
+
+    def __init__(self, database, power: int = 100) -> None:
+        self.database = database
+        self.power = power
+        self.errors = []
+        self.read = 0
+
+    def contacts(self, filename: str):
+        """Yields the contacts in a file, noting the ones that are no good."""
+        if is_cabrillo(filename):
+            file_descriptor = open(filename, "r", encoding="utf-8", errors="replace")
+            records, convert = read_cabrillo(file_descriptor), cabrillo_contact
+        else:
+            file_descriptor = open(filename, "rb")
+            records, convert = read_adif(file_descriptor), adif_contact
+        with file_descriptor:
+            for number, record in enumerate(records, 1):
+                self.read += 1
+                try:
+                    yield convert(record, self.power)
+                except RecordError as exception:
+                    self.errors.append((number, str(exception)))
+
+    def import_file(self, filename: str) -> tuple:
+        """
+        Import a file. Returns (records read, contacts added, errors).
+        Contacts already in the log are not added again. Raises IOError if
+        the file can't be read, sqlite3.Error if the log can't be written.
+        """
+        self.errors = []
+        self.read = 0
+        added = self.database.bulk_log_contacts(self.contacts(filename))
+        return self.read, added, list(self.errors)
+
+
+def main():
+    """Import files from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Import ADIF or Cabrillo files into a Winter Field Day log."
+    )
+    parser.add_argument("files", nargs="+", help="ADIF or Cabrillo files")
+    parser.add_argument(
+        "-d", "--database", default="WFD.db", help="log to import into (WFD.db)"
+    )
+    parser.add_argument(
+        "-p",
+        "--power",
+        type=int,
+        default=100,
+        help="watts to use for contacts that don't say (100)",
+    )
+    args = parser.parse_args()
+    importer = Importer(DataBase(args.database), args.power)
+    failed = False
+    for filename in args.files:
+        try:
+            read, added, errors = importer.import_file(filename)
+        except (IOError, sqlite3.Error) as exception:
+            print(f"{filename}: {exception}", file=sys.stderr)
+            failed = True
+            continue
+        for number, reason in errors:
+            print(f"{filename}: record {number}: {reason}", file=sys.stderr)
+        print(
+            f"{filename}: {read} records, {added} added, "
+            f"{read - added - len(errors)} already in the log, {len(errors)} errors"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+K6GTE, Generate Logs in the background
+Email: michael.bridak@gmail.com
+GPL V3
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from PyQt5 import QtCore
+
+try:
+    from wfdlogger.lib.geometry import origin
+except ModuleNotFoundError:
+    from lib.geometry import origin
+
+if __name__ == "__main__":
+    print("I'm not the program you are looking for.")
+
+BONUSES = (
+    ("altpower", "500 points for not using commercial power"),
+    ("outdoors", "500 points for setting up outdoors"),
+    ("notathome", "500 points for setting up away from home"),
+    ("satellite", "500 points for working satellite"),
+    ("antenna", "500 points for setting up WFD antenna"),
+)
+
+
+def calcscore(stats: dict, preference: dict) -> tuple:
+    """
+    Returns (QSO points, power multiplier, claimed score) from the dict
+    returned by DataBase.stats() and the bonuses claimed in preference.
+    """
+    basescore = stats.get("points")
+    powermult = stats.get("powermult")
+    score = basescore
+    if powermult == 2:
+        score = score * 2
+    score = score * stats.get("bandmodemult")
+    for bonus, _ in BONUSES:
+        score = score + (500 * preference.get(bonus))
+    return basescore, powermult, score
+
+
+def cabrillo(filename: str, preference: dict, snapshot, fakefreq) -> None:
+    """
+    Writes a cabrillo log file from a Snapshot.
+    Raises IOError if the file can't be written.
+    """
+    stats = snapshot.stats()
+    basescore, powermult, score = calcscore(stats, preference)
+    catpower = {2: "QRP", 0: "HIGH"}.get(powermult, "LOW")
+    mycall = preference.get("mycallsign")
+    myclass = preference.get("myclass")
+    mysection = preference.get("mysection")
+    lines = [
+        "START-OF-LOG: 3.0",
+        "CREATED-BY: K6GTE Winter Field Day Logger",
+        "CONTEST: WFD",
+        f"CALLSIGN: {mycall}",
+        "LOCATION:",
+        f"ARRL-SECTION: {mysection}",
+        f"CATEGORY: {myclass}",
+        f"CATEGORY-POWER: {catpower}",
+        f"SOAPBOX: QSO Points {basescore}",
+        f"SOAPBOX: Power Output Multiplier {powermult}",
+        f"SOAPBOX: Band/mode multiplier {stats.get('bandmodemult')}",
+    ]
+    bonuses = 0
+    for bonus, text in BONUSES:
+        if preference.get(bonus):
+            lines.append(f"SOAPBOX: {text}")
+            bonuses += 500
+    lines += [
+        f"SOAPBOX: BONUS Total {bonuses}",
+        f"CLAIMED-SCORE: {score}",
+        f"OPERATORS: {mycall}",
+        "NAME: ",
+        "ADDRESS: ",
+        "ADDRESS-CITY: ",
+        "ADDRESS-STATE: ",
+        "ADDRESS-POSTALCODE: ",
+        "ADDRESS-COUNTRY: ",
+        "EMAIL: ",
+    ]
+    for contact in snapshot.iter_contacts():
+        band = contact.get("band")
+        mode = contact.get("mode")
+        frequency = contact.get("frequency")
+        if frequency == 0:
+            frequency = fakefreq(band, mode)
+        else:
+            frequency = f"{int(frequency / 1000)}"
+        the_date_and_time = contact.get("date_time")
+        loggeddate = the_date_and_time[:10]
+        loggedtime = the_date_and_time[11:13] + the_date_and_time[14:16]
+        lines.append(
+            f"QSO: {frequency} {mode} {loggeddate} {loggedtime}"
+            f" {mycall} {myclass} {mysection} "
+            f"{contact.get('callsign')} {contact.get('class')} {contact.get('section')}"
+        )
+    lines.append("END-OF-LOG:")
+    with open(filename, "w", encoding="ascii", newline="") as file_descriptor:
+        file_descriptor.write("\r\n".join(lines) + "\r\n")
+
+
+def distances(mygrid: str, snapshot) -> list:
+    """
+    Lines for Statistics.txt on how far away the contacts with a grid were,
+    measured from mygrid all at once.
+    """
+    contacts = [contact for contact in snapshot.iter_contacts() if contact.get("grid")]
+    if not mygrid or not contacts:
+        return []
+    kilometers, _ = origin(mygrid).batch([contact.get("grid") for contact in contacts])
+    measured = [
+        (km, contact) for km, contact in zip(kilometers, contacts) if km is not None
+    ]
+    if not measured:
+        return []
+    farthest, contact = max(measured, key=lambda pair: pair[0])
+    average = sum(km for km, _ in measured) / len(measured)
+    return [
+        f"Distance from {mygrid}: {len(measured)} contacts with a grid, "
+        f"average {average:.0f} km",
+        f"Farthest: {contact.get('callsign')} {contact.get('grid')} {farthest} km",
+        "-" * 60,
+    ]
+
+
+def statistics(filename: str, bands: tuple, snapshot, mygrid: str = "") -> None:
+    """
+    Writes Statistics.txt from a Snapshot. Containing a breakdown of the
+    bands and modes used, counting only contacts below 101 watts, and if
+    mygrid is known, how far away the contacts were.
+    Raises IOError if the file can't be written.
+    """
+    tally = snapshot.stats().get("tally")
+    worked = tally.bands()
+    lines = ["\t\tCW\tPWR\tDG\tPWR\tPH\tPWR", "-" * 60]
+    for band in bands:
+        if band in worked:
+            columns = "\t".join(
+                f"{lowcount}\t{lowpower}"
+                for _, lowcount, lowpower, _ in (
+                    tally.cell(band, mode) for mode in ("CW", "DG", "PH")
+                )
+            )
+            lines += [f"Band:\t{band}\t{columns}", "-" * 60]
+    lines += distances(mygrid, snapshot)
+    with open(filename, "w", encoding="utf-8", newline="") as file_descriptor:
+        file_descriptor.write("\r\n".join(lines) + "\r\n")
+
+
+class LogExport(QtCore.QObject):
+    """
+    Runs Generate Logs off the GUI thread.
+
+    start() takes one snapshot of the log and runs every job on it at the
+    same time. Each job is (name, filename, key, function) where the
+    function takes the snapshot, writes filename and returns a line to
+    report. Lines to show the user come out of the progress signal,
+    finished is emitted at the end.
+
+    A job is skipped if its file is still there and neither the database's
+    change counter nor the job's key, everything else that goes into the
+    file, has changed since it was last written.
+    """
+
+    progress = QtCore.pyqtSignal(str)
+    finished = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self._thread = None
+        self._written = {}
+
+    def running(self) -> bool:
+        """True while an export is under way."""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, database, jobs: list) -> bool:
+        """Start an export, returns False if one is already running."""
+        if self.running():
+            return False
+        self._thread = threading.Thread(
+            target=self._run, args=(database, jobs), daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def forget(self) -> None:
+        """Write everything next time, even if nothing has changed."""
+        self._written.clear()
+
+    def _fresh(self, job: tuple, changes: int) -> bool:
+        """True if a job's file is already up to date."""
+        name, filename, key, _ = job
+        return self._written.get(name) == (changes, key) and os.path.exists(filename)
+
+    def _run(self, database, jobs: list) -> None:
+        """The export thread."""
+        try:
+            changes = database.changes
+            for job in jobs:
+                if self._fresh(job, changes):
+                    self.progress.emit(f"{job[1]} unchanged")
+            jobs = [job for job in jobs if not self._fresh(job, changes)]
+            if not jobs:
+                return
+            snapshot = database.snapshot()
+            with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+                futures = {executor.submit(job[3], snapshot): job for job in jobs}
+                for future in as_completed(futures):
+                    name, _, key, _ = futures[future]
+                    try:
+                        self.progress.emit(future.result())
+                        self._written[name] = (snapshot.changes, key)
+                    except Exception as exception:  # pylint: disable=broad-except
+                        logging.critical("%s: %s", name, exception)
+                        self._written.pop(name, None)
+                        self.progress.emit(f"{name} Failed")
+        except Exception as exception:  # pylint: disable=broad-except
+            logging.critical("LogExport: %s", exception)
+            self.progress.emit("Generate Logs Failed")
+        finally:
+            self.finished.emit()
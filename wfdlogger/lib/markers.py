@@ -0,0 +1,134 @@
+"""
+K6GTE, xplanet marker file
+Email: michael.bridak@gmail.com
+GPL V3
+"""
+
+import logging
+import os
+
+from PyQt5 import QtCore
+
+try:
+    from wfdlogger.lib.geometry import gridtolatlon
+except ModuleNotFoundError:
+    from lib.geometry import gridtolatlon
+
+if __name__ == "__main__":
+    print("I'm not the program you are looking for.")
+
+
+class Markers(QtCore.QObject):
+    """
+    Keeps an xplanet marker file of the grids worked, the last contact's
+    grid in orange.
+
+    The grids are read from the log once and kept, each with its marker
+    line, so logging a contact only adds its grid if it's new and moves
+    the orange to it. Writes wait 'delay' ms so a burst of contacts is one
+    write, and go to a temp file renamed over the marker file, so xplanet
+    never reads half of one. reload() starts again from the log, for when
+    contacts are edited, deleted or imported.
+
+    failed is emitted with a message if the file can't be written.
+    """
+
+    failed = QtCore.pyqtSignal(str)
+    delay = 500
+
+    def __init__(self, database, parent=None) -> None:
+        super().__init__(parent)
+        self.database = database
+        self.filename = None
+        self.writes = 0
+        self._lines = {}
+        self._last = None
+        self._loaded = False
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(self.delay)
+        self._timer.timeout.connect(self.write)
+
+    def configure(self, filename) -> None:
+        """Write markers to filename, or stop if it's None."""
+        if filename == self.filename:
+            return
+        self.filename = filename
+        self._loaded = False
+        self._lines = {}
+        if filename:
+            self._schedule()
+        else:
+            self._timer.stop()
+
+    def reload(self) -> None:
+        """Read the grids from the log again at the next write."""
+        if self.filename:
+            self._loaded = False
+            self._schedule()
+
+    def add(self, grid) -> None:
+        """A contact was logged in grid."""
+        key = self._key(grid)
+        if not self.filename or key is None:
+            return
+        if self._loaded and key not in self._lines:
+            self._lines[key] = self._line(key)
+        self._last = key
+        self._schedule()
+
+    def flush(self) -> None:
+        """Write now if a write is waiting."""
+        if self._timer.isActive():
+            self._timer.stop()
+            self.write()
+
+    def write(self) -> None:
+        """Write the marker file, empty if no grids have been worked."""
+        if not self.filename:
+            return
+        if not self._loaded:
+            self._load()
+        lines = []
+        if self._lines:
+            last = self._last
+            if last not in self._lines:
+                last = next(reversed(self._lines))
+            lines = [line for key, line in self._lines.items() if key != last]
+            lines.append(f"{self._lines[last]}color=Orange\r\n")
+        temp = f"{self.filename}.tmp"
+        try:
+            with open(temp, "w", encoding="ascii", newline="") as file_descriptor:
+                file_descriptor.write("\r\n".join(lines))
+            os.replace(temp, self.filename)
+        except OSError as exception:
+            logging.warning("Markers: error %s writing to %s", exception, self.filename)
+            self.failed.emit(f"Unable to write to {self.filename}")
+            return
+        self.writes += 1
+
+    def _schedule(self) -> None:
+        """Write once 'delay' ms from the first change, not each one."""
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def _load(self) -> None:
+        """Every grid in the log, in the order they were first worked."""
+        self._lines = {}
+        for row in self.database.get_unique_grids():
+            key = self._key(row.get("grid"))
+            if key is not None and key not in self._lines:
+                self._lines[key] = self._line(key)
+        self._loaded = True
+
+    @staticmethod
+    def _key(grid):
+        """The grid as kept, None if it's too short to plot."""
+        grid = str(grid or "").strip().upper()
+        return grid if len(grid) > 1 else None
+
+    @staticmethod
+    def _line(grid: str) -> str:
+        """A grid's marker line, without the color."""
+        lat, lon = gridtolatlon(grid)
+        return f'{lat} {lon} "" '
@@ -0,0 +1,195 @@
+"""
+K6GTE, Merge station logs into one club log
+Email: michael.bridak@gmail.com
+GPL V3
+
+Each station's database is ATTACHed in turn and its contacts upserted into
+the club database by unique_id in one statement. If two stations have the
+same contact, the one modified last wins. Which stations had each contact
+is kept in a provenance table. Run on its own as 'wfdlogger-merge'.
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+from urllib.request import pathname2url
+
+try:
+    from wfdlogger.lib.database import DataBase
+except ModuleNotFoundError:
+    from lib.database import DataBase
+
+COLUMNS = (
+    "callsign",
+    "class",
+    "section",
+    "date_time",
+    "frequency",
+    "band",
+    "mode",
+    "power",
+    "grid",
+    "opname",
+    "IsRunQSO",
+    "unique_id",
+    "radio",
+    "dirty",
+)
+
+DUPES = (
+    "SELECT contacts.callsign, contacts.band, contacts.mode, "
+    "COUNT(DISTINCT contacts.unique_id) AS times, "
+    "GROUP_CONCAT(DISTINCT provenance.source) AS sources "
+    "FROM contacts LEFT JOIN provenance USING (unique_id) "
+    "GROUP BY contacts.callsign, contacts.band, contacts.mode "
+    "HAVING COUNT(DISTINCT contacts.unique_id) > 1 "
+    "ORDER BY contacts.callsign, contacts.band, contacts.mode;"
+)
+
+
+class Merge:
+    """
+    Merges station databases into a club database.
+
+    The club database gets a unique index on unique_id, which the upsert
+    needs, and a provenance table of (unique_id, source, modified), one row
+    per station that had the contact. Contacts deleted at one station but
+    still in another station's log will come back, as deletes aren't kept.
+    """
+
+    def __init__(self, club: str) -> None:
+        self.club = DataBase(club)
+        with sqlite3.connect(club) as conn:
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS contacts_unique_id_merged "
+                "ON contacts (unique_id);"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS provenance "
+                "(unique_id text NOT NULL, "
+                "source text NOT NULL, "
+                "modified text, "
+                "PRIMARY KEY (unique_id, source));"
+            )
+
+    def merge(self, station: str, source: str = None) -> tuple:
+        """
+        Merge one station's database. source names it in the provenance
+        table, the file name less extension if not given.
+        Returns (contacts in the station's log, added, updated).
+        """
+        if source is None:
+            source = os.path.splitext(os.path.basename(station))[0]
+        if not os.path.isfile(station):
+            raise sqlite3.DatabaseError(f"{station} not found")
+        conn = sqlite3.connect(self.club.database, isolation_level=None, uri=True)
+        try:
+            conn.execute(
+                "ATTACH DATABASE ? AS station;",
+                (f"file:{pathname2url(os.path.abspath(station))}?mode=ro",),
+            )
+            station_columns = [
+                column[1]
+                for column in conn.execute("PRAGMA station.table_info(contacts);")
+            ]
+            if not station_columns:
+                raise sqlite3.DatabaseError(f"{station} has no contacts table")
+            modified = (
+                "COALESCE(modified, date_time)"
+                if "modified" in station_columns
+                else "date_time"
+            )
+            columns = ", ".join(COLUMNS)
+            selects = ", ".join(
+                column if column in station_columns else "NULL" for column in COLUMNS
+            )
+            updates = ", ".join(
+                f"{column} = excluded.{column}"
+                for column in COLUMNS + ("modified",)
+                if column != "unique_id"
+            )
+            conn.execute("BEGIN;")
+            try:
+                before = conn.execute("SELECT COUNT(*) FROM main.contacts;")
+                before = before.fetchone()[0]
+                changes = conn.total_changes
+                conn.execute(
+                    f"INSERT INTO main.contacts ({columns}, modified) "
+                    f"SELECT {selects}, {modified} FROM station.contacts WHERE true "
+                    f"ON CONFLICT (unique_id) DO UPDATE SET {updates} "
+                    "WHERE excluded.modified > contacts.modified;"
+                )
+                changes = conn.total_changes - changes
+                added = conn.execute("SELECT COUNT(*) FROM main.contacts;")
+                added = added.fetchone()[0] - before
+                conn.execute(
+                    "INSERT OR REPLACE INTO main.provenance "
+                    "(unique_id, source, modified) "
+                    f"SELECT unique_id, ?, {modified} FROM station.contacts;",
+                    (source,),
+                )
+                read = conn.execute("SELECT COUNT(*) FROM station.contacts;")
+                read = read.fetchone()[0]
+                conn.execute("COMMIT;")
+            except sqlite3.Error:
+                conn.execute("ROLLBACK;")
+                raise
+            conn.execute("DETACH DATABASE station;")
+        finally:
+            conn.close()
+        self.club.changed()
+        return read, added, changes - added
+
+    def dupes(self) -> list:
+        """
+        Contacts with the same call, band and mode but different unique_ids,
+        as dicts of callsign, band, mode, times and the sources that had them.
+        """
+        with sqlite3.connect(self.club.database) as conn:
+            conn.row_factory = self.club.row_factory
+            return conn.execute(DUPES).fetchall()
+
+
+def main():
+    """Merge station logs from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Merge Winter Field Day station logs into one club log."
+    )
+    parser.add_argument("stations", nargs="+", help="station databases")
+    parser.add_argument(
+        "-o", "--output", default="club.db", help="club database (club.db)"
+    )
+    parser.add_argument(
+        "-r", "--report", default="dupes.txt", help="dupe report (dupes.txt)"
+    )
+    args = parser.parse_args()
+    try:
+        merge = Merge(args.output)
+    except sqlite3.Error as exception:
+        print(f"{args.output}: {exception}", file=sys.stderr)
+        return 1
+    failed = False
+    for station in args.stations:
+        try:
+            read, added, updated = merge.merge(station)
+        except sqlite3.Error as exception:
+            print(f"{station}: {exception}", file=sys.stderr)
+            failed = True
+            continue
+        print(f"{station}: {read} contacts, {added} added, {updated} updated")
+    dupes = merge.dupes()
+    with open(args.report, "w", encoding="utf-8") as file_descriptor:
+        print("Call\tBand\tMode\tTimes\tStations", file=file_descriptor)
+        for dupe in dupes:
+            print(
+                f"{dupe.get('callsign')}\t{dupe.get('band')}\t{dupe.get('mode')}\t"
+                f"{dupe.get('times')}\t{dupe.get('sources')}",
+                file=file_descriptor,
+            )
+    print(f"{len(dupes)} dupes, see {args.report}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
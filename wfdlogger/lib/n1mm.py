@@ -1,21 +1,134 @@
 """
-K6GTE, N1MM sending interface
+K6GTE, N1MM sending and listening interface
 Email: michael.bridak@gmail.com
 GPL V3
 """
 
 import logging
+import queue
 import socket
+import threading
+import time
+import uuid
+from xml.etree.ElementTree import ParseError, XMLPullParser
 
-# pip3 install -U dicttoxml
-from dicttoxml import dicttoxml
+try:
+    from wfdlogger.lib.importer import (
+        IMPORT_NAMESPACE,
+        MODES,
+        RecordError,
+        getband,
+    )
+except ModuleNotFoundError:
+    from lib.importer import IMPORT_NAMESPACE, MODES, RecordError, getband
 
 if __name__ == "__main__":
     print("I'm not the program you are looking for.")
 
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8" ?>'
+XML_ESCAPES = str.maketrans(
+    {"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&apos;"}
+)
+
+
+# N1MM's band field is the bottom of the band in mhz.
+N1MM_BANDS = {
+    "1.8": "160",
+    "3.5": "80",
+    "5": "60",
+    "7": "40",
+    "10": "30",
+    "14": "20",
+    "18": "17",
+    "21": "15",
+    "24": "12",
+    "28": "10",
+    "50": "6",
+    "144": "2",
+    "222": "222",
+    "420": "432",
+    "432": "432",
+}
+
+N1MM_ACTIONS = {
+    "contactinfo": "add",
+    "contactreplace": "replace",
+    "contactdelete": "delete",
+}
+
+
+def xml_value(value) -> str:
+    """A value as escaped XML text, the way dicttoxml writes it."""
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value).translate(XML_ESCAPES)
+
+
+def compile_template(package_name: str, fields) -> str:
+    """
+    Returns a format string for a packet, with a {} for each field's value.
+    So building a packet is a single str.format() instead of walking a dict.
+    """
+    body = "".join(f"<{field}>{{}}</{field}>" for field in fields)
+    return f"{XML_HEADER}<{package_name}>{body}</{package_name}>"
+
+
+def dynamic_results(tally, station: dict, score: int, timestamp: str) -> bytes:
+    """
+    Returns a dynamicresults score packet for a Tally. station has the
+    keys call, class, section, power and version. The breakdown has the
+    contacts and points on each band and mode worked, and the totals.
+    """
+    lines = []
+    modes = {}
+    for (band, mode), cell in sorted(tally.cells.items()):
+        points = cell[0] * tally.points_per_contact.get(mode, 0)
+        modes[mode] = modes.get(mode, 0) + cell[0]
+        where = f'band="{xml_value(band)}" mode="{xml_value(mode)}"'
+        lines.append(f"<qso {where}>{cell[0]}</qso><point {where}>{points}</point>")
+    for mode, count in sorted(modes.items()):
+        lines.append(f'<qso band="total" mode="{xml_value(mode)}">{count}</qso>')
+    lines.append(f'<qso band="total" mode="ALL">{sum(modes.values())}</qso>')
+    lines.append(f'<point band="total" mode="ALL">{tally.points}</point>')
+    lines.append(
+        f'<mult band="total" mode="ALL" type="bandmode">{tally.bandmodemult}</mult>'
+    )
+    call = xml_value(station.get("call"))
+    return (
+        f"{XML_HEADER}<dynamicresults>"
+        "<contest>WFD</contest>"
+        f"<call>{call}</call>"
+        f"<ops>{call}</ops>"
+        f'<class power="{xml_value(station.get("power"))}" '
+        f'ops="{xml_value(station.get("class"))}" mode="MIXED"></class>'
+        "<club></club>"
+        "<soft>K6GTE-WFD</soft>"
+        f"<version>{xml_value(station.get('version'))}</version>"
+        "<qth><dxcccountry>K</dxcccountry>"
+        f"<arrlsection>{xml_value(station.get('section'))}</arrlsection></qth>"
+        f"<breakdown>{''.join(lines)}</breakdown>"
+        f"<score>{score}</score>"
+        f"<timestamp>{xml_value(timestamp)}</timestamp>"
+        "</dynamicresults>"
+    ).encode("utf-8")
+
 
 class N1MM:
-    """ "Send N1MM style packets"""
+    """
+    Send N1MM style packets.
+
+    RadioInfo is only sent when something in it has changed, or every
+    'keepalive' seconds so listeners know we're still here, kept track of
+    for each RadioNr so two radios don't make each other look changed.
+    'sent' and 'suppressed' count the packets that went out and the ones
+    that didn't.
+
+    The class dicts are the defaults, each instance gets its own copy.
+    """
+
+    keepalive = 15.0
 
     radio_info = {
         "app": "K6GTE-WFD",
@@ -126,7 +239,14 @@ class N1MM:
         self.score_port = scoreport
         self.radio_socket = None
         self.radio_socket = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+        self.radio_info = dict(self.radio_info)
+        self.contact_info = dict(self.contact_info)
+        self.contactdelete = dict(self.contactdelete)
         self.contact_info["NetBiosName"] = socket.gethostname()
+        self.templates = {}
+        self.sent = 0
+        self.suppressed = 0
+        self._last_radio = {}
 
     def set_station_name(self, name):
         """Set the station name"""
@@ -138,9 +258,22 @@ class N1MM:
         """Set Operators Name"""
         self.contact_info["operator"] = name
 
-    def send_radio(self):
-        """Send XML data"""
+    def send_radio(self, force=False):
+        """
+        Send XML data, if the radio state changed or the keepalive is due.
+        Returns True if a packet was sent.
+        """
+        state = tuple(self.radio_info.values())
+        now = time.monotonic()
+        last_state, last_time = self._last_radio.get(
+            self.radio_info.get("RadioNr"), (None, 0.0)
+        )
+        if not force and state == last_state and now - last_time < self.keepalive:
+            self.suppressed += 1
+            return False
+        self._last_radio[self.radio_info.get("RadioNr")] = (state, now)
         self._send(self.radio_port, self.radio_info, "RadioInfo")
+        return True
 
     def send_contact_info(self):
         """Send XML data"""
@@ -158,12 +291,255 @@ class N1MM:
         """Send lookup request"""
         self._send(self.lookup_port, self.contact_info, "lookupinfo")
 
+    def send_score(self, tally, station: dict, score: int, timestamp: str):
+        """Send a dynamicresults score packet, see dynamic_results()."""
+        logging.info("dynamicresults - %s", score)
+        self._sendto(self.score_port, dynamic_results(tally, station, score, timestamp))
+
+    def to_xml(self, payload, package_name) -> bytes:
+        """Returns the XML for a packet, compiling its template the first time."""
+        fields = tuple(payload)
+        template = self.templates.get((package_name, fields))
+        if template is None:
+            template = compile_template(package_name, fields)
+            self.templates[(package_name, fields)] = template
+        return template.format(*map(xml_value, payload.values())).encode("utf-8")
+
     def _send(self, port, payload, package_name):
         """Send XML data"""
-        logging_info = f"{package_name} - {payload}"
-        logging.info("%s", logging_info)
-        bytes_to_send = dicttoxml(payload, custom_root=package_name, attr_type=False)
+        logging.info("%s - %s", package_name, payload)
+        self._sendto(port, self.to_xml(payload, package_name))
+
+    def _sendto(self, port, bytes_to_send):
+        """Send a packet"""
         self.radio_socket.sendto(
             bytes_to_send,
             (self.ip_address, int(port)),
         )
+        self.sent += 1
+
+
+def parse_packet(datagram: bytes) -> tuple:
+    """
+    Returns (package name, {field: text}) of an N1MM packet. The packets
+    are flat, so the parser's events are read as they come and each field
+    is dropped once its text is taken.
+    """
+    parser = XMLPullParser(events=("start", "end"))
+    parser.feed(datagram)
+    parser.close()
+    package_name = None
+    fields = {}
+    depth = 0
+    for event, element in parser.read_events():
+        if event == "start":
+            if package_name is None:
+                package_name = element.tag
+            depth += 1
+            continue
+        depth -= 1
+        if depth == 1:
+            fields[element.tag] = (element.text or "").strip()
+            element.clear()
+    return package_name, fields
+
+
+def n1mm_contact(fields: dict, power: int) -> dict:
+    """
+    Turn the fields of a contactinfo or contactreplace packet into a contact,
+    raise RecordError if we can't. rxfreq is in tens of hz.
+    """
+    call = fields.get("call", "").upper()
+    if not call:
+        raise RecordError("No callsign")
+    try:
+        frequency = int(fields.get("rxfreq") or 0) * 10
+    except ValueError:
+        raise RecordError(f"Bad frequency {fields.get('rxfreq')!r}") from None
+    band = getband(frequency)
+    if band == "0":
+        band = N1MM_BANDS.get(fields.get("band", ""), "0")
+    if band == "0":
+        raise RecordError(f"{call}: Out of band")
+    mode = MODES.get(fields.get("mode", "").upper())
+    if mode is None:
+        raise RecordError(f"{call}: Unknown mode {fields.get('mode')!r}")
+    date_time = fields.get("timestamp", "")
+    if len(date_time) < 19:
+        raise RecordError(f"{call}: Bad timestamp {date_time!r}")
+    date_time = date_time[:19]
+    try:
+        power = int(float(fields.get("power") or power))
+    except ValueError:
+        pass
+    try:
+        radio = int(fields.get("radionr") or 0) or None
+    except ValueError:
+        radio = None
+    unique_id = (
+        fields.get("ID")
+        or uuid.uuid5(IMPORT_NAMESPACE, f"{call}|{date_time}|{band}|{mode}").hex
+    )
+    return {
+        "callsign": call,
+        "class": fields.get("exchange1", "").upper(),
+        "section": fields.get("section", "").upper(),
+        "frequency": frequency,
+        "date_time": date_time,
+        "band": band,
+        "mode": mode,
+        "power": power,
+        "grid": fields.get("gridsquare", ""),
+        "opname": fields.get("name", ""),
+        "IsRunQSO": 1 if fields.get("IsRunQSO") in ("1", "True", "true") else 0,
+        "unique_id": unique_id,
+        "radio": radio,
+    }
+
+
+class N1MMListener:
+    """
+    Logs the contacts other programs send as N1MM packets.
+
+    One thread does nothing but take datagrams off a socket with a large
+    receive buffer and queue them, so a burst isn't dropped while the log
+    is being written. Another drains the queue, parses the packets and
+    hands everything waiting, up to 'batch' packets, to
+    DataBase.apply_contact_changes() as one transaction. Our own packets,
+    and anything but contactinfo, contactreplace and contactdelete, are
+    ignored. on_change is called from the writer thread after each batch
+    that changed the log.
+
+    database, the DataBase to log to.
+    port, the UDP port to listen on. 12063 by default, apart from the 12060
+    to 12062 that N1MM and our own N1MM packets use, so we don't hear
+    ourselves.
+    power, watts for contacts that don't say.
+    """
+
+    app = "K6GTE-WFD"
+    batch = 500
+    receive_buffer = 1 << 22
+
+    def __init__(
+        self, database, port: int = 12063, power: int = 100, on_change=None
+    ) -> None:
+        self.database = database
+        self.port = int(port)
+        self.power = power
+        self.on_change = on_change
+        self.received = 0
+        self.logged = 0
+        self.ignored = 0
+        self.errors = 0
+        self._queue = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._socket = None
+        self._threads = []
+
+    def start(self) -> None:
+        """Bind the port and start listening. Raises OSError if we can't."""
+        if self._threads:
+            return
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self._socket.setsockopt(
+                socket.SOL_SOCKET, socket.SO_RCVBUF, self.receive_buffer
+            )
+        except OSError as exception:
+            logging.warning("N1MMListener: %s", exception)
+        self._socket.settimeout(0.5)
+        try:
+            self._socket.bind(("", self.port))
+        except OSError:
+            self._socket.close()
+            self._socket = None
+            raise
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._receive, daemon=True),
+            threading.Thread(target=self._write, daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self) -> None:
+        """Stop listening, logging whatever has already come in."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def _receive(self) -> None:
+        """The receive thread, kept as short as possible."""
+        while not self._stop.is_set():
+            try:
+                datagram = self._socket.recv(65535)
+            except socket.timeout:
+                continue
+            except OSError as exception:
+                logging.warning("N1MMListener: %s", exception)
+                break
+            self._queue.put(datagram)
+
+    def _write(self) -> None:
+        """The writer thread."""
+        while True:
+            try:
+                datagrams = [self._queue.get(timeout=0.5)]
+            except queue.Empty:
+                if self._stop.is_set():
+                    return
+                continue
+            while len(datagrams) < self.batch:
+                try:
+                    datagrams.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.apply(datagrams)
+
+    def change(self, datagram: bytes) -> tuple:
+        """
+        Returns the (action, contact) for a datagram, or None if it isn't
+        one for us.
+        """
+        try:
+            package_name, fields = parse_packet(datagram)
+        except ParseError as exception:
+            logging.info("N1MMListener: %s", exception)
+            self.errors += 1
+            return None
+        action = N1MM_ACTIONS.get(package_name)
+        if action is None or fields.get("app") == self.app:
+            self.ignored += 1
+            return None
+        if action == "delete":
+            if not fields.get("ID"):
+                self.errors += 1
+                return None
+            return action, {"unique_id": fields.get("ID")}
+        try:
+            return action, n1mm_contact(fields, self.power)
+        except RecordError as exception:
+            logging.info("N1MMListener: %s", exception)
+            self.errors += 1
+            return None
+
+    def apply(self, datagrams: list) -> tuple:
+        """
+        Log a batch of datagrams in one transaction.
+        Returns (added, replaced, deleted).
+        """
+        self.received += len(datagrams)
+        changes = [change for change in map(self.change, datagrams) if change]
+        if not changes:
+            return 0, 0, 0
+        result = self.database.apply_contact_changes(changes)
+        self.logged += len(changes)
+        if any(result) and self.on_change is not None:
+            self.on_change()
+        return result
@@ -0,0 +1,64 @@
+"""
+K6GTE, Bounded line history with spill to file
+Email: michael.bridak@gmail.com
+GPL V3
+"""
+
+import logging
+from collections import deque
+from datetime import datetime, timezone
+
+if __name__ == "__main__":
+    print("I'm not the program you are looking for.")
+
+
+class RingLog:
+    """
+    Holds the last 'depth' lines shown in a text pane.
+    When a line falls off the end it's appended, with the UTC time it was
+    added, to spill_file. So memory stays flat and nothing is lost.
+    """
+
+    def __init__(self, spill_file: str, depth: int = 500) -> None:
+        self.spill_file = spill_file
+        self.lines = deque(maxlen=max(1, int(depth)))
+        self._file_descriptor = None
+
+    @property
+    def depth(self) -> int:
+        """How many lines are kept in memory."""
+        return self.lines.maxlen
+
+    @depth.setter
+    def depth(self, depth: int) -> None:
+        depth = max(1, int(depth))
+        while len(self.lines) > depth:
+            self._spill(self.lines.popleft())
+        self.lines = deque(self.lines, maxlen=depth)
+
+    def append(self, line: str) -> None:
+        """Add a line, spilling the oldest one if we're full."""
+        if len(self.lines) == self.lines.maxlen:
+            self._spill(self.lines[0])
+        self.lines.append(
+            (datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"), line)
+        )
+
+    def _spill(self, entry: tuple) -> None:
+        """Append an entry to the spill file."""
+        try:
+            if self._file_descriptor is None:
+                self._file_descriptor = open(  # pylint: disable=consider-using-with
+                    self.spill_file, "a", encoding="utf-8", buffering=1
+                )
+            self._file_descriptor.write(f"[{entry[0]}] {entry[1]}\n")
+        except IOError as exception:
+            logging.warning("RingLog %s: %s", self.spill_file, exception)
+
+    def close(self) -> None:
+        """Spill everything still in memory and close the file."""
+        while self.lines:
+            self._spill(self.lines.popleft())
+        if self._file_descriptor is not None:
+            self._file_descriptor.close()
+            self._file_descriptor = None
@@ -0,0 +1,94 @@
+"""
+K6GTE, Operator roster for group operation
+Email: michael.bridak@gmail.com
+GPL V3
+"""
+
+import time
+
+if __name__ == "__main__":
+    print("I'm not the program you are looking for.")
+
+
+class Roster:
+    """
+    Keeps track of the stations heard on the group, what band/mode each is on,
+    and when it was last heard from.
+
+    update() and expire() return what changed so the display only has to
+    redraw those rows. Stations sharing a band/mode are found through an
+    index keyed on band/mode instead of rebuilding a reverse dict every time.
+    """
+
+    def __init__(self, stale_after: float = 60.0) -> None:
+        self.stale_after = stale_after
+        self.band_mode = {}
+        self.last_seen = {}
+        self.on_band_mode = {}
+
+    def __contains__(self, station) -> bool:
+        return station in self.band_mode
+
+    def __len__(self) -> int:
+        return len(self.band_mode)
+
+    def stations(self) -> list:
+        """Stations in the order they were first heard, which is row order."""
+        return list(self.band_mode)
+
+    def row(self, station: str) -> int:
+        """Zero based row of a station."""
+        return self.stations().index(station)
+
+    def collides(self, station: str) -> bool:
+        """True if someone else is on the same band/mode as this station."""
+        return len(self.on_band_mode.get(self.band_mode.get(station), ())) > 1
+
+    def _leave(self, station: str, changed: set) -> None:
+        """Take a station out of the band/mode index."""
+        others = self.on_band_mode.get(self.band_mode.get(station))
+        if others is None:
+            return
+        others.discard(station)
+        if len(others) == 1:
+            changed.update(others)
+        if not others:
+            del self.on_band_mode[self.band_mode[station]]
+
+    def update(self, station: str, band_mode: str, now: float = None) -> set:
+        """
+        Record a PING from a station.
+        Returns the set of stations whose row needs redrawing, which is empty
+        if nothing but the last seen time changed.
+        """
+        self.last_seen[station] = time.monotonic() if now is None else now
+        if self.band_mode.get(station) == band_mode:
+            return set()
+        changed = {station}
+        self._leave(station, changed)
+        self.band_mode[station] = band_mode
+        others = self.on_band_mode.setdefault(band_mode, set())
+        if len(others) == 1:
+            changed.update(others)
+        others.add(station)
+        return changed
+
+    def expire(self, now: float = None) -> tuple:
+        """
+        Forget stations not heard from in stale_after seconds.
+        Returns ([(row, station), ...] removed, highest row first, and the set
+        of remaining stations whose row needs redrawing).
+        """
+        now = time.monotonic() if now is None else now
+        removed = [
+            (row, station)
+            for row, station in enumerate(self.band_mode)
+            if now - self.last_seen[station] > self.stale_after
+        ]
+        changed = set()
+        for _, station in removed:
+            self._leave(station, changed)
+            del self.band_mode[station]
+            del self.last_seen[station]
+        removed.reverse()
+        return removed, changed - {station for _, station in removed}
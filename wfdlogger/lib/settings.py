@@ -38,6 +38,10 @@ class Settings(QtWidgets.QDialog):
             "useflrig": False,
             "CAT_ip": "localhost",
             "CAT_port": 4532,
+            "userigctld2": False,
+            "useflrig2": False,
+            "CAT2_ip": "localhost",
+            "CAT2_port": 4533,
             "cloudlog": False,
             "cloudlogapi": "c01234567890123456789",
             "cloudlogurl": "https://www.cloudlog.com/Cloudlog/index.php/api",
@@ -55,6 +59,12 @@ class Settings(QtWidgets.QDialog):
             "multicast_group": "224.1.1.1",
             "multicast_port": 2239,
             "interface_ip": "0.0.0.0",
+            "compact_packets": False,
+            "chat_history_depth": 500,
+            "infobox_history_depth": 200,
+            "backup_interval": 300,
+            "backup_keep": 5,
+            "backup_on_exit": True,
             "send_n1mm_packets": False,
             "n1mm_station_name": "20M CW Tent",
             "n1mm_operator": "Bernie",
@@ -63,6 +73,9 @@ class Settings(QtWidgets.QDialog):
             "n1mm_contactport": 12061,
             "n1mm_lookupport": 12060,
             "n1mm_scoreport": 12062,
+            "n1mm_score_interval": 15,
+            "n1mm_listen": False,
+            "n1mm_listenport": 12063,
         }
         self.buttonBox.accepted.connect(self.save_changes)
         self.preference = None
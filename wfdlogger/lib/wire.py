@@ -0,0 +1,289 @@
+"""
+K6GTE, Group multicast packet encoding
+Email: michael.bridak@gmail.com
+GPL V3
+
+Packets are JSON by default. Version 2 peers can also use a compact binary
+framing: a struct packed header, the unique_id as 16 raw bytes, band and
+mode as single byte enums, and length prefixed strings in a fixed field
+order. Compact packets are only sent once every station seen on the group
+has advertised version 2 in its PING, and anything that can't be encoded
+losslessly goes out as JSON, so older peers and the server keep working.
+"""
+
+import queue
+import re
+import struct
+import uuid
+from json import dumps, loads
+
+if __name__ == "__main__":
+    print("I'm not the program you are looking for.")
+
+PROTOCOL_VERSION = 2
+
+MAGIC = b"\xf0W"
+HEADER = struct.Struct("!2sBB")
+
+COMMANDS = ("PING", "POST", "UPDATE", "DELETE", "CHAT", "GROUPQUERY", "LOG")
+BANDS = (
+    "160",
+    "80",
+    "60",
+    "40",
+    "30",
+    "20",
+    "17",
+    "15",
+    "12",
+    "10",
+    "6",
+    "2",
+    "222",
+    "432",
+    "SAT",
+)
+MODES = ("CW", "PH", "DG")
+
+_CONTACT = (
+    ("unique_id", "uuid"),
+    ("station", "str"),
+    ("hiscall", "str"),
+    ("class", "str"),
+    ("section", "str"),
+    ("mode", "mode"),
+    ("band", "band"),
+    ("frequency", "u32"),
+    ("date_and_time", "str"),
+    ("power", "u16"),
+    ("grid", "str"),
+    ("opname", "str"),
+    ("expire", "str"),
+)
+
+SCHEMAS = {
+    "PING": (("station", "str"), ("band", "band"), ("mode", "mode"), ("proto", "u8")),
+    "POST": _CONTACT,
+    "UPDATE": _CONTACT,
+    "DELETE": (("unique_id", "uuid"), ("station", "str"), ("expire", "str")),
+    "CHAT": (("sender", "str"), ("message", "text")),
+    "GROUPQUERY": (("station", "str"),),
+    "LOG": (("station", "str"),),
+}
+
+_PEEK_CMD = re.compile(rb'"cmd"\s*:\s*"([A-Z]+)"')
+_PEEK_STATION = re.compile(rb'"station"\s*:\s*"([^"\\]*)"')
+_PEEK_RECIPIENT = re.compile(rb'"recipient"\s*:\s*"([^"\\]*)"')
+
+_U8 = struct.Struct("!B")
+_U16 = struct.Struct("!H")
+_U32 = struct.Struct("!I")
+_NULL = 0xFF
+
+
+def _pack_field(kind: str, value, out: bytearray) -> None:
+    """Append one field to out, raise ValueError if it won't round trip."""
+    if kind == "uuid":
+        if not isinstance(value, str):
+            raise ValueError
+        raw = uuid.UUID(hex=value)
+        if raw.hex != value:
+            raise ValueError
+        out += raw.bytes
+    elif kind == "band":
+        out += _U8.pack(BANDS.index(value))
+    elif kind == "mode":
+        out += _U8.pack(MODES.index(value))
+    elif kind in ("u8", "u16", "u32"):
+        if type(value) is not int:  # pylint: disable=unidiomatic-typecheck
+            raise ValueError
+        packer = {"u8": _U8, "u16": _U16, "u32": _U32}[kind]
+        out += packer.pack(value)
+    elif kind == "str":
+        if value is None:
+            out += _U8.pack(_NULL)
+            return
+        if not isinstance(value, str):
+            raise ValueError
+        encoded = value.encode("utf-8")
+        if len(encoded) >= _NULL:
+            raise ValueError
+        out += _U8.pack(len(encoded)) + encoded
+    elif kind == "text":
+        if not isinstance(value, str):
+            raise ValueError
+        encoded = value.encode("utf-8")
+        out += _U16.pack(len(encoded)) + encoded
+
+
+def _unpack_field(kind: str, view, offset: int) -> tuple:
+    """Returns the field value and the offset just past it."""
+    if kind == "uuid":
+        return uuid.UUID(bytes=bytes(view[offset : offset + 16])).hex, offset + 16
+    if kind == "band":
+        return BANDS[view[offset]], offset + 1
+    if kind == "mode":
+        return MODES[view[offset]], offset + 1
+    if kind == "u8":
+        return view[offset], offset + 1
+    if kind == "u16":
+        return _U16.unpack_from(view, offset)[0], offset + 2
+    if kind == "u32":
+        return _U32.unpack_from(view, offset)[0], offset + 4
+    if kind == "str":
+        length = view[offset]
+        offset += 1
+        if length == _NULL:
+            return None, offset
+    else:
+        length = _U16.unpack_from(view, offset)[0]
+        offset += 2
+    end = offset + length
+    if end > len(view):
+        raise ValueError("Truncated packet")
+    return bytes(view[offset:end]).decode("utf-8"), end
+
+
+def encode_compact(packet: dict) -> bytes:
+    """
+    Pack a packet into the compact framing.
+    Raises ValueError if the packet has no schema or a value won't fit.
+    """
+    cmd = packet.get("cmd")
+    schema = SCHEMAS.get(cmd)
+    if schema is None or len(packet) != len(schema) + 1:
+        raise ValueError(f"No compact form for {cmd}")
+    out = bytearray(HEADER.pack(MAGIC, PROTOCOL_VERSION, COMMANDS.index(cmd)))
+    try:
+        for key, kind in schema:
+            _pack_field(kind, packet[key], out)
+    except (KeyError, struct.error) as err:
+        raise ValueError(f"No compact form for {cmd}") from err
+    return bytes(out)
+
+
+def decode(datagram) -> dict:
+    """
+    Returns the packet dict from either a JSON or a compact datagram.
+    Raises ValueError (or one of its subclasses UnicodeDecodeError and
+    JSONDecodeError) if the datagram is garbage.
+    """
+    if datagram[:2] != MAGIC:
+        return loads(bytes(datagram).decode())
+    view = memoryview(datagram)
+    try:
+        _, version, command = HEADER.unpack_from(view)
+        if version > PROTOCOL_VERSION:
+            raise ValueError(f"Unsupported protocol version {version}")
+        cmd = COMMANDS[command]
+        packet = {"cmd": cmd}
+        offset = HEADER.size
+        for key, kind in SCHEMAS[cmd]:
+            packet[key], offset = _unpack_field(kind, view, offset)
+    except (IndexError, struct.error) as err:
+        raise ValueError(f"Malformed compact packet: {err}") from err
+    return packet
+
+
+def _peek_match(pattern, datagram):
+    """Returns the first group of a match as a str, or None."""
+    match = pattern.search(datagram)
+    if match is None:
+        return None
+    return match.group(1).decode("utf-8", "replace")
+
+
+def peek(datagram) -> tuple:
+    """
+    Returns (cmd, station, recipient) of a datagram without decoding all of it.
+    Any of them may be None if the packet doesn't carry it or is garbage.
+    """
+    if datagram[:2] != MAGIC:
+        return (
+            _peek_match(_PEEK_CMD, datagram),
+            _peek_match(_PEEK_STATION, datagram),
+            _peek_match(_PEEK_RECIPIENT, datagram),
+        )
+    try:
+        cmd = COMMANDS[datagram[3]]
+        offset = HEADER.size
+        for key, kind in SCHEMAS[cmd]:
+            if key == "station":
+                return cmd, _unpack_field(kind, datagram, offset)[0], None
+            if kind != "uuid":
+                break
+            offset += 16
+    except (IndexError, ValueError):
+        return None, None, None
+    return cmd, None, None
+
+
+class BufferPool:
+    """
+    Reusable receive buffers, so recv_into() doesn't allocate per datagram.
+    If every buffer is in use a new one is made rather than blocking.
+    """
+
+    def __init__(self, count: int = 32, size: int = 1500) -> None:
+        self.size = size
+        self._free = queue.SimpleQueue()
+        for _ in range(count):
+            self._free.put(bytearray(size))
+
+    def get(self) -> bytearray:
+        """Take a free buffer."""
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            return bytearray(self.size)
+
+    def put(self, buffer: bytearray) -> None:
+        """Hand a buffer back once nothing refers to its contents."""
+        self._free.put(buffer)
+
+
+class WireFormat:
+    """
+    Chooses between JSON and compact framing.
+
+    Set 'compact' to allow compact packets. Call note_peer() with each PING
+    received, compact packets are only used while every known peer speaks
+    PROTOCOL_VERSION 2 or better.
+    """
+
+    def __init__(self, compact: bool = False) -> None:
+        self.compact = compact
+        self.peers = {}
+
+    def note_peer(self, station: str, version) -> None:
+        """Remember the protocol version a peer advertised, 1 if none."""
+        try:
+            self.peers[station] = int(version or 1)
+        except (TypeError, ValueError):
+            self.peers[station] = 1
+
+    def forget_peer(self, station: str) -> None:
+        """Drop a peer that has gone quiet."""
+        self.peers.pop(station, None)
+
+    def negotiated(self) -> bool:
+        """True if compact packets may be sent."""
+        return (
+            self.compact
+            and bool(self.peers)
+            and min(self.peers.values()) >= PROTOCOL_VERSION
+        )
+
+    def encode(self, packet: dict) -> bytes:
+        """Returns the bytes to put on the wire for a packet."""
+        if self.negotiated():
+            try:
+                return encode_compact(packet)
+            except ValueError:
+                pass
+        return bytes(dumps(packet), encoding="ascii")
+
+    @staticmethod
+    def decode(datagram) -> dict:
+        """Returns the packet dict for a received datagram."""
+        return decode(datagram)